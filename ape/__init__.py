@@ -1,9 +1,10 @@
 from __future__ import print_function, unicode_literals
-import featuremonkey
-import inspect
 import sys
 from .exceptions import InvalidAccess, InvalidTask, TaskAlreadyRegistered, TaskNotFound, FeatureNotFound, EnvironmentIncomplete
 
+# featuremonkey and inspect are imported where they are needed:
+# ``ape.complete`` is run on every tab key press and has to start quickly
+
 __version__ = '0.4.0'
 __author__ = 'Hendrik Speidel <hendrik@schnapptack.de>'
 SHORT_HEADER = '''ape - a productive environment
@@ -23,16 +24,36 @@ def _get_invalid_accessor(func_name):
     return invalid_accessor
 
 
-def get_signature(name, func):
+def getargspec(func):
     """
-    Helper to generate a readable signature for a function
-    :param name:
+    Return the tuple (args, varargs, keywords, defaults) of func.
+
+    ``inspect.getargspec`` is not available on newer versions of python 3.
+    Keyword-only arguments are not supported by ape tasks.
     :param func:
     :return:
     """
-    args, varargs, keywords, defaults = inspect.getargspec(func)
-    defaults = defaults or []
-    posargslen = len(args) - len(defaults)
+    import inspect
+
+    if not hasattr(inspect, 'getfullargspec'):
+        return inspect.getargspec(func)
+    spec = inspect.getfullargspec(func)
+    if spec.kwonlyargs:
+        raise InvalidTask('ape tasks may not use keyword-only arguments')
+    return spec.args, spec.varargs, spec.varkw, spec.defaults
+
+
+def format_signature(name, args, varargs, keywords, default_reprs):
+    """
+    Helper to generate a readable signature from the parts of an argspec
+    :param name: name of the function
+    :param args: list of argument names
+    :param varargs: name of the varargs argument or None
+    :param keywords: name of the **kwargs argument or None
+    :param default_reprs: list of reprs of the defaults
+    :return:
+    """
+    posargslen = len(args) - len(default_reprs)
     if varargs is None and keywords is None:
         sig = name + '('
         sigargs = []
@@ -40,16 +61,27 @@ def get_signature(name, func):
             if idx < posargslen:
                 sigargs.append(arg)
             else:
-                default = repr(defaults[idx - posargslen])
+                default = default_reprs[idx - posargslen]
                 sigargs.append(arg + '=' + default)
         sig += ', '.join(sigargs) + ')'
         return sig
-    elif not args and varargs and not keywords and not defaults:
+    elif not args and varargs and not keywords and not default_reprs:
         return name + '(*' + varargs + ')'
     else:
         raise InvalidTask('ape tasks may not use **kwargs')
 
 
+def get_signature(name, func):
+    """
+    Helper to generate a readable signature for a function
+    :param name:
+    :param func:
+    :return:
+    """
+    args, varargs, keywords, defaults = getargspec(func)
+    return format_signature(name, args, varargs, keywords, [repr(default) for default in defaults or []])
+
+
 class TerminalColor:
     """
     Defines available terminal colors.
@@ -89,20 +121,37 @@ class Tasks(object):
         from . import _tasks
         self._tasks = _tasks
         self._helper_names = set()
+        self._dependencies = {}
+        self._flags = {}
 
-    def register(self, func):
+    def register(self, func=None, depends=None, flags=None):
         """
         Register a task. Typically used as a decorator to the task function.
 
+        Tasks the task depends on may be declared using ``@tasks.register(depends=['other_task'])``.
+        ``ape run_graph`` runs them before the task.
+
+        Keyword args that are flags on the command line may be declared using
+        ``@tasks.register(flags=['verbose'])``: ``--verbose`` takes no value and sets the arg to ``True``.
+        A dict maps arg names to the names of their flags, e.g. ``flags=dict(all_products='all')``.
+
         If a task by that name already exists,
         a TaskAlreadyRegistered exception is raised.
         :param func: func to register as an ape task
+        :param depends: optional list of names of tasks the task depends on
+        :param flags: optional list of names of keyword args that are flags or dict mapping them to flag names
         :return: invalid accessor
         """
 
+        if func is None:
+            return lambda func: self.register(func, depends=depends, flags=flags)
         if hasattr(self._tasks, func.__name__):
             raise TaskAlreadyRegistered(func.__name__)
         setattr(self._tasks, func.__name__, func)
+        if depends:
+            self._dependencies[func.__name__] = list(depends)
+        if flags:
+            self._flags[func.__name__] = dict(flags) if isinstance(flags, dict) else dict((arg, arg) for arg in flags)
         return _get_invalid_accessor(func.__name__)
 
     def register_helper(self, func):
@@ -120,12 +169,29 @@ class Tasks(object):
         """
         Return tasks as list of (name, function) tuples.
         """
+        import inspect
 
         def predicate(item):
             return (inspect.isfunction(item) and
                     item.__name__ not in self._helper_names)
         return inspect.getmembers(self._tasks, predicate)
 
+    def get_dependencies(self, name):
+        """
+        Return the names of the tasks the task identified by name depends on.
+        :param name: name of the task
+        :return: list of task names
+        """
+        return list(self._dependencies.get(name, []))
+
+    def get_flags(self, name):
+        """
+        Return the flags of the task identified by name.
+        :param name: name of the task
+        :return: dict mapping arg names to flag names
+        """
+        return dict(self._flags.get(name, {}))
+
     def get_task(self, name, include_helpers=True):
         """
         Get task identified by name or raise TaskNotFound if there
@@ -149,12 +215,22 @@ class Tasks(object):
         :param name: the name of the module.
         :return: None
         """
-        TerminalColor.set('GREEN')
-        print(get_signature(name, task))
+        import inspect
 
         # TODO: print the location does not work properly and sometimes returns None
         # print('    => defined in: {}'.format(inspect.getsourcefile(task)))
-        help_msg = inspect.getdoc(task) or ''
+        self.print_help_entry(get_signature(name, task), inspect.getdoc(task))
+
+    def print_help_entry(self, signature, help_msg):
+        """
+        Prints a help entry consisting of a task signature and its help message.
+        :param signature: the signature of the task
+        :param help_msg: the docstring of the task or None
+        :return: None
+        """
+        TerminalColor.set('GREEN')
+        print(signature)
+        help_msg = help_msg or ''
         TerminalColor.reset()
         print('   ' + help_msg.replace('\n', '\n   '))
         TerminalColor.reset()
@@ -167,6 +243,7 @@ class Tasks(object):
             Otherwise, displays overview of available tasks.
         :return: None
         """
+        import inspect
 
         if not taskname:
             print(inspect.getdoc(self._tasks))
@@ -201,6 +278,8 @@ class Tasks(object):
         :param module: ape tasks module that is superimposed on available ape tasks
         :return: None
         """
+        import featuremonkey
+
         featuremonkey.compose(module, self._tasks)
         self._tasks.FEATURE_SELECTION.append(module.__name__)
 
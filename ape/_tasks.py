@@ -31,78 +31,96 @@ def explain_feature(featurename):
 
     import os
     import featuremonkey
-    import importlib
-    import subprocess
-
-    def guess_version(feature_module):
-        if hasattr(feature_module, '__version__'):
-            return feature_module.__version__
-        if hasattr(feature_module, 'get_version'):
-            return feature_module.get_version()
-        return ('unable to determine version:'
-                ' please add __version__ or get_version()'
-                ' to this feature module!')
-
-    def git_rev(module):
-        stdout, stderr = subprocess.Popen(
-            ["git", "rev-parse", "HEAD"],
-            cwd=os.path.dirname(module.__file__),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        ).communicate()
-        if 'Not a git repo' in stderr:
-            return '-'
-        else:
-            return stdout.strip()
-
-    def git_changes(module):
-        stdout = subprocess.Popen(
-            ["git", "diff", "--name-only"],
-            cwd=os.path.dirname(module.__file__),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        ).communicate()[0]
-        return stdout.strip() or '-'
+    from ape import featureinfo
 
     if featurename in featuremonkey.get_features_from_equation_file(os.environ['PRODUCT_EQUATION_FILENAME']):
-        print()
-        print(featurename)
-        print('-' * 60)
-        print()
-        is_subfeature = '.features.' in featurename
-        try:
-            feature_module = importlib.import_module(featurename)
-        except ImportError:
-            print('Error: unable to import feature "%s"' % featurename)
-
-        print('Location: %s' % os.path.dirname(feature_module.__file__))
-        print()
-        if is_subfeature:
-            print('Version: see parent feature')
-            print()
-        else:
-            print('Version: %s' % str(guess_version(feature_module)))
-            print()
-            print('git: %s' % git_rev(feature_module))
-            print()
-            print('git changed: %s' % '\n\t\t'.join(git_changes(feature_module).split('\n')))
+        featureinfo.print_text(featureinfo.get_feature_infos([featurename])[0])
     else:
         print('No feature named ' + featurename)
 
 
-def explain_features():
+def explain_features(output_format='text', jobs=8):
     '''print the location of each feature and its version
 
     if the feature is located inside a git repository, this will also print the git-rev and modified files
+    output_format: text, table (one line per feature) or json
+    jobs: number of git repositories queried at the same time
     '''
-    from ape import tasks
+    import sys
     import featuremonkey
     import os
+    from ape import featureinfo
+
+    if output_format not in featureinfo.OUTPUT_FORMATS:
+        print('Unknown output format %s - use one of: %s' % (output_format, ', '.join(featureinfo.OUTPUT_FORMATS)))
+        sys.exit(1)
 
     featurenames = featuremonkey.get_features_from_equation_file(os.environ['PRODUCT_EQUATION_FILENAME'])
+    # queries each repository once
+    infos = featureinfo.get_feature_infos(featurenames, jobs=int(jobs))
+    featureinfo.print_infos(infos, output_format)
+
+
+def batch(filename, on_error='stop'):
+    '''run the task invocations listed in a file in one go ("-" reads from stdin)
+
+    one invocation per line: the task name followed by its arguments, quoted like in a shell.
+    Features are composed only once for all of them.
+    on_error: "stop" to skip the remaining tasks after a failure or "continue" to run them anyway
+    '''
+    import sys
+    from ape import tasks
+    from ape.batch import read_script, run_batch, print_report
+
+    results = run_batch(
+        read_script(filename),
+        lambda name: tasks.get_task(name, include_helpers=False),
+        on_error=on_error
+    )
+    print_report(results)
+    if any(result['exit_code'] != 0 for result in results):
+        sys.exit(1)
+
+
+def run_graph(targets, jobs=4):
+    '''run tasks after the tasks they depend on, independent tasks concurrently
 
-    for featurename in featurenames:
-        tasks.explain_feature(featurename)
+    targets: names of the tasks to run, separated by commas
+    jobs: maximum number of tasks running at the same time
+    dependencies are declared using @tasks.register(depends=[...])
+    tasks are run without arguments: targets and dependencies must be registered tasks (no helpers) and must not require any
+    '''
+    import sys
+    from ape import tasks
+    from ape.exceptions import TaskNotFound
+    from ape.main import invoke_task
+    from ape.taskgraph import get_task_graph, get_required_args, run_task_graph, print_result, print_report
+
+    graph = get_task_graph(targets.replace(',', ' ').split(), tasks.get_dependencies)
+    # fail before running anything if a task does not exist or cannot be run without arguments;
+    # the tasks looked up here are the ones that are run
+    graph_tasks = {}
+    for name in sorted(graph):
+        try:
+            graph_tasks[name] = tasks.get_task(name, include_helpers=False)
+        except TaskNotFound:
+            problem = 'is not a registered task'
+        else:
+            required = get_required_args(graph_tasks[name])
+            problem = 'requires the arguments %s' % ', '.join(required) if required else None
+        if problem:
+            print('Task "%s" %s: run_graph can only run tasks without required arguments.' % (name, problem))
+            sys.exit(1)
+
+    results = run_task_graph(
+        graph,
+        lambda name: invoke_task(graph_tasks[name], []),
+        jobs=int(jobs),
+        on_finished=print_result
+    )
+    print_report(results)
+    if any(result['exit_code'] != 0 for result in results):
+        sys.exit(1)
 
 
 def selftest():
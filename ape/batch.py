@@ -0,0 +1,123 @@
+"""
+Batch mode: run many task invocations in a single ape process.
+
+``ape batch <file>`` (or ``ape -f <file>``) reads task invocations from a file,
+``ape batch -`` reads them from stdin. The features are composed once and every
+invocation is run through ``ape.main.invoke_task``. Exit code and run time of
+each invocation are reported at the end.
+
+A batch script contains one invocation per line: the task name followed by its
+arguments, quoted like in a shell. Empty lines and comments starting with ``#`` are ignored::
+
+    # deploy sdox:dev
+    validate_product_equation --poi sdox:dev
+    install_container sdox
+"""
+from __future__ import print_function, unicode_literals
+import shlex
+import sys
+import time
+import traceback
+from .exceptions import InvalidBatchScript, TaskNotFound
+
+# what to do if a task fails
+ON_ERROR_CHOICES = ('stop', 'continue')
+
+
+def parse_script(lines):
+    """
+    Parse the lines of a batch script.
+    :param lines: iterable of lines
+    :raises: InvalidBatchScript if a line cannot be parsed
+    :return: list of (line number, [task name, arg, ...]) tuples
+    """
+    invocations = []
+    for lineno, line in enumerate(lines, 1):
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as e:
+            raise InvalidBatchScript('line %s: %s' % (lineno, e))
+        if args:
+            invocations.append((lineno, args))
+    return invocations
+
+
+def read_script(filename):
+    """
+    Read and parse a batch script.
+    :param filename: path of the script or "-" to read from stdin
+    :return: see ``parse_script``
+    """
+    if filename == '-':
+        return parse_script(sys.stdin)
+    with open(filename) as f:
+        return parse_script(f)
+
+
+def run_invocation(args, get_task):
+    """
+    Run a single task invocation.
+    :param args: list comprised of task name followed by arguments
+    :param get_task: function returning the task for a name, raises TaskNotFound
+    :return: exit code
+    """
+    from .main import get_exit_code, invoke_task
+
+    try:
+        task = get_task(args[0])
+    except TaskNotFound:
+        print('Task "%s" not found! Use "ape help" to get usage information.' % args[0], file=sys.stderr)
+        return 1
+    try:
+        invoke_task(task, args[1:])
+    except SystemExit as e:
+        return get_exit_code(e)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def run_batch(invocations, get_task, on_error='stop'):
+    """
+    Run the given invocations one after another.
+    :param invocations: list of (line number, args) tuples as returned by ``parse_script``
+    :param get_task: function returning the task for a name, raises TaskNotFound
+    :param on_error: "stop" to skip the remaining invocations after a failure, "continue" to run them anyway
+    :return: list of dict(lineno=..., args=..., exit_code=..., duration=...);
+             exit_code and duration are None for skipped invocations
+    """
+    if on_error not in ON_ERROR_CHOICES:
+        raise ValueError('on_error must be one of: %s' % ', '.join(ON_ERROR_CHOICES))
+
+    results = []
+    failed = False
+    for lineno, args in invocations:
+        result = dict(lineno=lineno, args=args, exit_code=None, duration=None)
+        results.append(result)
+        if failed and on_error == 'stop':
+            continue
+        start = time.time()
+        result['exit_code'] = run_invocation(args, get_task)
+        result['duration'] = time.time() - start
+        sys.stdout.flush()
+        failed = failed or result['exit_code'] != 0
+    return results
+
+
+def print_report(results):
+    """
+    Print exit code and run time of each invocation.
+    :param results: as returned by ``run_batch``
+    """
+    print()
+    print('Batch summary:')
+    print()
+    for result in results:
+        command = ' '.join(result['args'])
+        if result['exit_code'] is None:
+            print('   %-10s %7s line %3d: %s' % ('skipped', '', result['lineno'], command))
+        else:
+            status = 'ok' if result['exit_code'] == 0 else 'FAILED(%s)' % result['exit_code']
+            print('   %-10s %6.2fs line %3d: %s' % (status, result['duration'], result['lineno'], command))
+    print()
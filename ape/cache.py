@@ -0,0 +1,123 @@
+"""
+Helpers for ape's on-disk caches.
+
+Caches are stored as json files in a cache directory.
+``APE_CACHE_DIR`` may be set to choose the directory; in container mode
+it defaults to ``<CONTAINER_DIR>/_lib/.ape_cache`` or to
+``<APE_ROOT_DIR>/.ape_cache`` if no container is active.
+If none of these is available, caching is disabled.
+"""
+from __future__ import unicode_literals
+import hashlib
+import json
+import os
+import sys
+
+# environment variables that determine the feature selection
+SELECTION_VARIABLES = (
+    'APE_PREPEND_FEATURES',
+    'PRODUCT_EQUATION',
+    'PRODUCT_EQUATION_FILENAME',
+    'PYTHONPATH',
+)
+
+
+def get_cache_dir():
+    """
+    Return the cache directory (created if necessary) or None if caching is disabled.
+    :return: path or None
+    """
+    cache_dir = os.environ.get('APE_CACHE_DIR')
+    if not cache_dir and os.environ.get('CONTAINER_DIR'):
+        cache_dir = os.path.join(os.environ['CONTAINER_DIR'], '_lib', '.ape_cache')
+    if not cache_dir and os.environ.get('APE_ROOT_DIR'):
+        cache_dir = os.path.join(os.environ['APE_ROOT_DIR'], '.ape_cache')
+    if not cache_dir:
+        return None
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                return None
+    return cache_dir
+
+
+def get_cache_path(name, *key_parts):
+    """
+    Return the path of the cache file for name and the given key.
+    :param name: kind of cache, used as filename prefix
+    :param key_parts: strings identifying the cached entity
+    :return: path or None if caching is disabled
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    key = hashlib.sha1('\n'.join(key_parts).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '%s-%s.json' % (name, key))
+
+
+def get_environment_key(environ=None):
+    """
+    Return a key identifying the feature selection configured in environ.
+    :param environ: environment dict, defaults to os.environ
+    :return: string
+    """
+    environ = os.environ if environ is None else environ
+    key = '\n'.join([sys.executable] + [environ.get(name, '') for name in SELECTION_VARIABLES])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def load_json(path):
+    """
+    Load a json cache file.
+    :param path: path of the cache file
+    :return: the cached data or None if the file is missing or unreadable
+    """
+    if not path:
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def dump_json(path, data):
+    """
+    Atomically write data to a json cache file.
+    Errors are ignored: caches are optional.
+    :param path: path of the cache file
+    :param data: json serializable data
+    """
+    import tempfile
+
+    if not path:
+        return
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+def get_mtime(path):
+    """
+    Return the modification time of path or None if it does not exist.
+    """
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def get_source_file(module):
+    """
+    Return the source file of module (or its compiled file if there is no source).
+    """
+    filename = getattr(module, '__file__', None)
+    if filename and filename.endswith(('.pyc', '.pyo')) and os.path.exists(filename[:-1]):
+        return filename[:-1]
+    return filename
@@ -0,0 +1,183 @@
+"""
+Thin client for the resident ape task server (see ``ape.server``).
+
+Sends argv, working directory and environment to the server responsible
+for the current feature selection and streams the task output back.
+The server is started on demand. If no server can be used, the task is
+run in-process just like ``python -m ape.main`` does.
+
+Use ``python -m ape.client --stop-server`` to stop the server of the
+current feature selection.
+"""
+from __future__ import print_function, unicode_literals
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from ape import server
+
+START_TIMEOUT = 60
+POLL_INTERVAL = 0.02
+MAX_RESTARTS = 3
+# seconds to wait for a server that went away to come back
+RECONNECT_TIMEOUT = 10
+
+
+class ConnectionLost(Exception):
+    """
+    The connection to the server was lost during a request.
+    """
+
+    def __init__(self, started):
+        """
+        Constructor
+        :param started: True if the server already sent output of the task
+        """
+        super(ConnectionLost, self).__init__('connection to the ape server lost')
+        self.started = started
+
+
+def _connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def start_server(socket_path):
+    """
+    Start a server for the current feature selection in the background.
+    Its output is logged to ``<socket_path>.log``.
+    :param socket_path: path of the server socket
+    :return: subprocess.Popen
+    """
+    with open(os.devnull, 'r') as devnull, open(socket_path + '.log', 'a') as log:
+        return subprocess.Popen(
+            [sys.executable, '-u', '-m', 'ape.server'],
+            stdin=devnull,
+            stdout=log,
+            stderr=log,
+            close_fds=True,
+            preexec_fn=os.setsid
+        )
+
+
+def wait_for_server(socket_path, process=None, timeout=START_TIMEOUT):
+    """
+    Wait until the server accepts connections.
+    :param socket_path: path of the server socket
+    :param process: the server process if it was started by this client
+    :param timeout: seconds to wait
+    :return: connected socket or None if the server did not come up
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        sock = _connect(socket_path)
+        if sock:
+            return sock
+        if process is not None and process.poll() is not None:
+            return None
+        time.sleep(POLL_INTERVAL)
+    return None
+
+
+def _write(stream, data):
+    stream = getattr(stream, 'buffer', stream)
+    stream.write(data)
+    stream.flush()
+
+
+def request(sock, payload):
+    """
+    Send a request and stream the response.
+    :param sock: connected socket
+    :param payload: request dict
+    :raises: ConnectionLost if the server went away, e.g. as it restarted itself
+    :return: exit code or None if the server asked for a restart
+    """
+    started = False
+    try:
+        server.send_message(sock, server.MSG_REQUEST, json.dumps(payload).encode('utf-8'))
+        while True:
+            msg_type, data = server.recv_message(sock)
+            if msg_type == server.MSG_STDOUT:
+                started = True
+                _write(sys.stdout, data)
+            elif msg_type == server.MSG_STDERR:
+                started = True
+                _write(sys.stderr, data)
+            elif msg_type == server.MSG_EXIT:
+                return int(data.decode('ascii'))
+            elif msg_type == server.MSG_RESTART:
+                return None
+    except (EOFError, socket.error):
+        raise ConnectionLost(started)
+
+
+def run_locally():
+    from ape.main import main as ape_main
+    ape_main()
+    return 0
+
+
+def main():
+    if not hasattr(socket, 'AF_UNIX'):
+        return run_locally()
+
+    socket_path = server.get_socket_path()
+
+    if sys.argv[1:] == ['--stop-server']:
+        sock = _connect(socket_path)
+        if sock is not None:
+            try:
+                request(sock, dict(command='stop'))
+            except ConnectionLost:
+                pass
+            finally:
+                sock.close()
+        return 0
+
+    payload = dict(argv=sys.argv, cwd=os.getcwd(), env=dict(os.environ))
+
+    sock = _connect(socket_path)
+    reconnected = False
+    for _ in range(MAX_RESTARTS):
+        if sock is None:
+            sock = wait_for_server(socket_path, start_server(socket_path))
+        if sock is None:
+            print('ape server did not start - see %s.log' % socket_path, file=sys.stderr)
+            return run_locally()
+        lost = None
+        try:
+            exit_code = request(sock, payload)
+        except ConnectionLost as e:
+            lost = e
+        finally:
+            sock.close()
+
+        if lost is not None:
+            if lost.started:
+                # running the task again could repeat its side effects
+                print('ape: %s while running the task' % lost, file=sys.stderr)
+                return 1
+            if reconnected:
+                break
+            # the server went away before it ran the task, e.g. as it restarted itself: reconnect once
+            reconnected = True
+            sock = wait_for_server(socket_path, timeout=RECONNECT_TIMEOUT)
+            continue
+        if exit_code is not None:
+            return exit_code
+        # the server restarts itself as the feature selection changed
+        sock = wait_for_server(socket_path)
+
+    return run_locally()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Shell tab completion.
+
+``python -m ape.complete "<command line>"`` (or ``ape _complete "<command line>"``)
+prints the completions of the last word of the given partial command line, one per line.
+Candidates are task names, the ``--options`` of a task and
+``<container>:<product>`` names for ``poi`` and ``doi`` arguments.
+
+Task names and options are read from a completion index in the ape cache directory
+(see ``ape.cache``), so no feature is imported while completing. The index is rebuilt
+by composing the feature selection if it is missing or a task module changed.
+Containers and products are listed from the registry of ``APE_ROOT_DIR`` (see ``ape.registry``).
+
+This module runs on every tab key press: keep its imports light.
+"""
+from __future__ import print_function, unicode_literals
+import os
+import sys
+from . import cache
+from .registry import get_registry
+
+INDEX_VERSION = 3
+
+# task arguments that take a <container>:<product>
+POI_ARGUMENTS = ('poi', 'doi')
+
+
+def get_index_path(environ=None):
+    """
+    Return the path of the completion index for the feature selection configured in environ.
+    :param environ: environment dict, defaults to os.environ
+    :return: path or None if caching is disabled
+    """
+    return cache.get_cache_path('complete', str(INDEX_VERSION), cache.get_environment_key(environ))
+
+
+def describe_task(args, varargs, keywords, defaults, flags=None):
+    """
+    Return the completion info of a task given its argspec.
+    :param flags: optional dict mapping keyword args to flag names, see ``ape.Tasks.register``
+    :return: dict(positional=[names], options=['--name', ...], flags=['--name', ...], varargs=boolean)
+             flags are the options that do not take a value
+    """
+    flags = flags or {}
+    posargslen = len(args) - len(defaults or [])
+    options = ['--' + flags.get(arg, arg) for arg in args[posargslen:]]
+    return dict(
+        positional=list(args[:posargslen]),
+        options=options,
+        flags=['--' + flags[arg] for arg in args[posargslen:] if arg in flags],
+        varargs=bool(varargs),
+    )
+
+
+def build_index(composed_tasks):
+    """
+    Build the completion index of the composed tasks.
+    :param composed_tasks: ``ape.Tasks`` registry
+    :return: dict mapping task names to completion info
+    """
+    from ape import getargspec
+    from ape.exceptions import InvalidTask
+
+    index = {}
+    for name, task in composed_tasks.get_tasks():
+        try:
+            index[name] = describe_task(*getargspec(task), flags=composed_tasks.get_flags(name))
+        except InvalidTask:
+            # cannot be invoked from the command line anyway
+            continue
+    return index
+
+
+def load_index(environ=None):
+    """
+    Load the completion index of the feature selection configured in environ.
+    :param environ: environment dict, defaults to os.environ
+    :return: dict mapping task names to completion info or None if there is no up to date index
+    """
+    data = cache.load_json(get_index_path(environ))
+    if not data:
+        return None
+    for path, mtime in data['mtimes'].items():
+        if cache.get_mtime(path) != mtime:
+            return None
+    return data['tasks']
+
+
+def rebuild_index():
+    """
+    Compose the feature selection configured in the environment and store its completion index.
+    :return: dict mapping task names to completion info
+    """
+    from ape import tasks
+    from ape.main import compose, get_features
+    from ape.server import WatchedFiles
+
+    features = get_features()
+    # the output of feature imports must not end up in the candidates
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        compose(features)
+    finally:
+        sys.stdout = stdout
+    index = build_index(tasks)
+    cache.dump_json(get_index_path(), dict(
+        tasks=index,
+        mtimes=WatchedFiles.for_composition(features).mtimes,
+    ))
+    return index
+
+
+def iter_pois(prefix, environ=None):
+    """
+    Yield the ``<container>:<product>`` names starting with prefix.
+
+    Containers and products are looked up in the registry of ``APE_ROOT_DIR``,
+    like the ``get_containers`` and ``get_products`` helpers of ``ape.container_mode`` do it.
+    Completion does not compose the tasks, so refinements of ``get_container_dir`` do not apply:
+    containers are expected in the root directory.
+    If a container is active, its products are also yielded without the container name.
+
+    :param prefix: the partial name to complete
+    :param environ: environment dict, defaults to os.environ
+    """
+    environ = os.environ if environ is None else environ
+    root = environ.get('APE_ROOT_DIR')
+    if not root or not os.path.isdir(root):
+        return
+    registry = get_registry(root)
+
+    if ':' in prefix:
+        container_names = [prefix.split(':', 1)[0]]
+    else:
+        container_names = registry.get_containers()
+        active = environ.get('CONTAINER_NAME')
+        for product in (registry.get_products(active) or []) if active else []:
+            if product.startswith(prefix):
+                yield product
+
+    for container_name in container_names:
+        for product in registry.get_products(container_name) or []:
+            poi = '%s:%s' % (container_name, product)
+            if poi.startswith(prefix):
+                yield poi
+
+
+def get_completions(words, index, environ=None):
+    """
+    Complete the last word of a command line.
+    :param words: the words of the command line, starting with the program name;
+        the last one is the (possibly empty) word to complete
+    :param index: dict mapping task names to completion info
+    :param environ: environment dict, defaults to os.environ
+    :return: list of candidates
+    """
+    if len(words) < 2:
+        return []
+    current = words[-1]
+    if len(words) == 2:
+        return sorted(name for name in index if name.startswith(current))
+
+    info = index.get(words[1])
+    if info is None:
+        return []
+
+    # find out which argument the current word is
+    positional = 0
+    used_options = set()
+    pending_option = None
+    for word in words[2:-1]:
+        if pending_option:
+            pending_option = None
+        elif word in info['options']:
+            used_options.add(word)
+            if word not in info['flags']:
+                pending_option = word
+        else:
+            positional += 1
+
+    if pending_option:
+        argument = pending_option[2:]
+    elif current.startswith('-') or positional >= len(info['positional']):
+        return [option for option in info['options'] if option not in used_options and option.startswith(current)]
+    else:
+        argument = info['positional'][positional]
+
+    if argument in POI_ARGUMENTS:
+        return list(iter_pois(current, environ))
+    return []
+
+
+def complete(line):
+    """
+    Complete the last word of line for the feature selection configured in the environment.
+    :param line: the command line up to the cursor
+    :return: list of candidates
+    """
+    from ape.exceptions import EnvironmentIncomplete
+
+    words = line.split()
+    if not line or line[-1].isspace():
+        words.append('')
+    if len(words) < 2:
+        return []
+
+    index = load_index()
+    if index is None:
+        try:
+            index = rebuild_index()
+        except EnvironmentIncomplete:
+            index = {}
+    return get_completions(words, index)
+
+
+def main(args=None):
+    """
+    Print the completions of the command line given as first argument.
+    :param args: command line arguments, defaults to ``sys.argv[1:]``
+    """
+    args = sys.argv[1:] if args is None else args
+    for candidate in complete(args[0] if args else ''):
+        print(candidate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Streaming reader of FeatureIDE model.xml files.
+
+model.xml is read with ``iterparse`` and every element is cleared as soon as
+it has been processed, so large models never end up in memory as a tree.
+The feature hierarchy (``struct``), the cross-tree constraints
+(``constraints``) and the feature order (``featureOrder``) are kept in a
+compact, json serializable form.
+Parsed models are cached in the ape cache (see ``ape.cache``), keyed by the
+hash of the file content.
+"""
+from __future__ import unicode_literals, print_function
+import hashlib
+import xml.etree.ElementTree as ElementTree
+from ape import cache
+
+CACHE_VERSION = 1
+
+# elements of the feature hierarchy; and, or and alt group their children
+STRUCT_TAGS = ('feature', 'and', 'or', 'alt')
+
+# elements of constraint expressions and the operators they are stored as
+EXPRESSION_TAGS = {
+    'var': 'var',
+    'not': 'not',
+    'and': 'and',
+    'conj': 'and',
+    'or': 'or',
+    'disj': 'or',
+    'imp': 'imp',
+    'eq': 'eq',
+}
+
+
+class FeatureModel(object):
+    """
+    Features, hierarchy, constraints and feature order of a FeatureIDE model.
+
+    Features are numbered in document order, so parents come before their children.
+    Constraints are nested lists: ``['var', name]``, ``['not', expression]``,
+    ``['and', expression, ...]``, ``['or', expression, ...]``, ``['imp', premise, conclusion]``
+    and ``['eq', expression, expression]``.
+    """
+
+    def __init__(self, features=None, parents=None, groups=None, mandatory=None, abstract=None,
+                 constraints=None, feature_order=None):
+        """
+        Constructor
+        :param features: list of feature names
+        :param parents: index of the parent of each feature, None for the root
+        :param groups: kind of group the children of each feature form: and, or or alt
+        :param mandatory: for each feature, True if it is a mandatory child of an and group
+        :param abstract: for each feature, True if it is abstract
+        :param constraints: list of cross-tree constraints
+        :param feature_order: list of feature names
+        """
+        self.features = features or []
+        self.parents = parents or []
+        self.groups = groups or []
+        self.mandatory = mandatory or []
+        self.abstract = abstract or []
+        self.constraints = constraints or []
+        self.feature_order = feature_order or []
+
+    def to_dict(self):
+        return dict(
+            features=self.features,
+            parents=self.parents,
+            groups=self.groups,
+            mandatory=self.mandatory,
+            abstract=self.abstract,
+            constraints=self.constraints,
+            feature_order=self.feature_order,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def get_children(self):
+        """
+        :return: list with the indices of the children of each feature
+        """
+        children = [[] for _ in self.features]
+        for idx, parent in enumerate(self.parents):
+            if parent is not None:
+                children[parent].append(idx)
+        return children
+
+
+def parse_model_xml(source):
+    """
+    Parse a FeatureIDE model.xml.
+    :param source: path or file object
+    :return: FeatureModel
+    """
+    model = FeatureModel()
+    section = None
+    # indices of the open struct elements
+    struct_stack = []
+    # children of the open constraint expressions
+    expression_stack = []
+
+    for event, elem in ElementTree.iterparse(source, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if section is None and tag in ('struct', 'constraints', 'featureOrder'):
+                section = tag
+            elif section == 'struct' and tag in STRUCT_TAGS:
+                model.features.append(elem.get('name'))
+                model.parents.append(struct_stack[-1] if struct_stack else None)
+                model.groups.append('and' if tag == 'feature' else tag)
+                model.mandatory.append(elem.get('mandatory') == 'true')
+                model.abstract.append(elem.get('abstract') == 'true')
+                struct_stack.append(len(model.features) - 1)
+            elif section == 'constraints' and (tag == 'rule' or tag in EXPRESSION_TAGS):
+                expression_stack.append([])
+            continue
+
+        if tag == section:
+            section = None
+        elif section == 'struct' and tag in STRUCT_TAGS:
+            struct_stack.pop()
+        elif section == 'constraints' and tag == 'rule':
+            children = expression_stack.pop()
+            model.constraints.extend(children)
+        elif section == 'constraints' and tag in EXPRESSION_TAGS:
+            children = expression_stack.pop()
+            if tag == 'var':
+                expression = ['var', (elem.text or '').strip()]
+            else:
+                expression = [EXPRESSION_TAGS[tag]] + children
+            if expression_stack:
+                expression_stack[-1].append(expression)
+        elif section == 'featureOrder' and tag == 'feature':
+            model.feature_order.append(elem.get('name'))
+        elem.clear()
+    return model
+
+
+def get_file_hash(path):
+    """
+    :return: sha1 hex digest of the content of the file
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_model_xml(path):
+    """
+    Return the parsed model.xml at path; parsed models are cached until the content of the file changes.
+    :param path: path of the model.xml
+    :return: FeatureModel
+    """
+    cache_path = cache.get_cache_path('featuremodel', str(CACHE_VERSION), get_file_hash(path))
+    data = cache.load_json(cache_path)
+    if data is not None:
+        return FeatureModel.from_dict(data)
+    model = parse_model_xml(path)
+    cache.dump_json(cache_path, model.to_dict())
+    return model
@@ -0,0 +1,301 @@
+"""
+Validation of the product equations of all products of all containers.
+
+Everything that is shared by the products of a container (feature order
+constraints, product spec index, feature model, repository name) is loaded
+once per container.
+The products are validated in a pool of worker processes or, if numpy is
+installed, the feature orders of all products of a container are checked
+at once by a BulkOrderValidator.
+Results can be written as a JSON or JUnit XML report.
+"""
+from __future__ import unicode_literals, print_function
+import json
+import multiprocessing
+import os
+import xml.etree.ElementTree as ElementTree
+from ape import gitmeta
+from . import utils
+from . import validators
+
+REPORT_FORMATS = ('json', 'junit')
+
+# containers loaded by load_container, set in each worker process
+_worker_containers = {}
+
+
+def load_container(container_dir):
+    """
+    Load the validation data shared by all products of a container.
+    :param container_dir: path of the container
+    :return: dict(container_dir=..., constraints=CompiledConstraints, spec_index=ProductSpecIndex,
+             model=CompiledFeatureModel, error=...);
+             spec_index is None if the container has no product spec,
+             model is None if the container has no model.xml or its model has no features,
+             error is set if the container cannot be validated at all
+    """
+    container = dict(container_dir=container_dir, constraints=None, spec_index=None, model=None, error=None)
+    try:
+        container['constraints'] = validators.CompiledConstraints(utils.get_feature_order_constraints(container_dir))
+    except (IOError, OSError, ValueError) as e:
+        container['error'] = 'unable to load feature order constraints: %s' % e
+        return container
+
+    model_xml_path = utils.get_model_xml_path(container_dir)
+    if os.path.exists(model_xml_path):
+        try:
+            model = validators.CompiledFeatureModel.load(model_xml_path)
+        except (IOError, OSError, ElementTree.ParseError) as e:
+            container['error'] = 'unable to load feature model: %s' % e
+            return container
+        if model.names:
+            container['model'] = model
+
+    try:
+        repo_name = utils.get_repo_name(container_dir)
+    except gitmeta.GitError:
+        # not a git repository or no origin: there is no product spec to check against
+        return container
+    spec_path = utils.get_feature_ide_paths(container_dir, '', repo_name=repo_name).product_spec_path
+    if os.path.exists(spec_path):
+        try:
+            container['spec_index'] = validators.ProductSpecIndex.load(spec_path)
+        except (IOError, OSError, ValueError) as e:
+            container['error'] = 'unable to load product spec: %s' % e
+    return container
+
+
+def _get_result(container_name, product_name, container):
+    return dict(
+        poi='%s:%s' % (container_name, product_name),
+        container=container_name,
+        product=product_name,
+        order_violations=[],
+        missing_features=[],
+        forbidden_features=[],
+        spec_checked=container['spec_index'] is not None,
+        model_violations=[],
+        model_checked=container['model'] is not None,
+        error=container['error'],
+    )
+
+
+def _read_feature_list(container, product_name, result):
+    try:
+        return utils.get_features_from_equation(container['container_dir'], product_name)
+    except (IOError, OSError) as e:
+        result['error'] = 'unable to read product.equation: %s' % e
+
+
+def _check_spec(product_name, feature_list, container, result):
+    if result['spec_checked']:
+        result['missing_features'], result['forbidden_features'] = container['spec_index'].get_errors(
+            product_name, feature_list
+        )
+
+
+def _check_model(feature_list, container, result):
+    if result['model_checked']:
+        result['model_violations'] = container['model'].get_violations(feature_list)
+
+
+def validate_product(container_name, product_name, container):
+    """
+    Validate the product equation of a single product.
+    :param container_name: name of the container
+    :param product_name: name of the product
+    :param container: as returned by load_container
+    :return: result dict
+    """
+    result = _get_result(container_name, product_name, container)
+    if result['error']:
+        return result
+
+    feature_list = _read_feature_list(container, product_name, result)
+    if feature_list is None:
+        return result
+
+    order_validator = validators.FeatureOrderValidator(feature_list, container['constraints'])
+    order_validator.check_order()
+    result['order_violations'] = [message for _, message in order_validator.get_violations()]
+    _check_spec(product_name, feature_list, container, result)
+    _check_model(feature_list, container, result)
+    return result
+
+
+def validate_container(container_name, container, product_names):
+    """
+    Validate the product equations of several products of the same container;
+    the feature orders of all products are checked at once by a BulkOrderValidator.
+    :param container_name: name of the container
+    :param container: as returned by load_container
+    :param product_names: list of product names
+    :return: list of result dicts (see validate_product) in the order of product_names
+    """
+    results = [_get_result(container_name, product_name, container) for product_name in product_names]
+    if container['error']:
+        return results
+
+    feature_lists = [
+        _read_feature_list(container, product_name, result)
+        for product_name, result in zip(product_names, results)
+    ]
+    readable = [idx for idx, feature_list in enumerate(feature_lists) if feature_list is not None]
+    violations = validators.BulkOrderValidator(container['constraints']).get_violations(
+        [feature_lists[idx] for idx in readable]
+    )
+    for idx, product_violations in zip(readable, violations):
+        results[idx]['order_violations'] = [message for _, message in product_violations]
+        _check_spec(product_names[idx], feature_lists[idx], container, results[idx])
+        _check_model(feature_lists[idx], container, results[idx])
+    return results
+
+
+def is_valid(result):
+    """
+    Check if the product of the given result passed the validation.
+    :param result: result dict as returned by validate_product
+    :return: boolean
+    """
+    return not (
+        result['error'] or result['order_violations'] or
+        result['missing_features'] or result['forbidden_features'] or
+        result['model_violations']
+    )
+
+
+def _init_worker(containers):
+    _worker_containers.update(containers)
+
+
+def _validate_in_worker(job):
+    container_name, product_name = job
+    return validate_product(container_name, product_name, _worker_containers[container_name])
+
+
+def validate_products(containers, jobs=None):
+    """
+    Validate the product equations of the given products.
+    :param containers: list of (container_name, container_dir, list of product names) tuples
+    :param jobs: number of worker processes, defaults to the number of cpus;
+        with 1, the products are validated in the current process.
+        If numpy is installed and jobs is not given, the products are validated container
+        by container in the current process (see validate_container).
+    :return: list of result dicts (see validate_product) in the given order
+    """
+    loaded = dict(
+        (container_name, load_container(container_dir))
+        for container_name, container_dir, _ in containers
+    )
+    work = [
+        (container_name, product_name)
+        for container_name, _, product_names in containers
+        for product_name in product_names
+    ]
+
+    if jobs is None and validators.bulk_order_validator.numpy is not None:
+        results = []
+        for container_name, _, product_names in containers:
+            results.extend(validate_container(container_name, loaded[container_name], product_names))
+        return results
+
+    if jobs == 1 or len(work) < 2:
+        return [validate_product(container_name, product_name, loaded[container_name])
+                for container_name, product_name in work]
+
+    pool = multiprocessing.Pool(jobs, _init_worker, (loaded,))
+    try:
+        return pool.map(_validate_in_worker, work)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def get_messages(result):
+    """
+    Return human readable messages describing why a product failed the validation.
+    :param result: result dict as returned by validate_product
+    :return: list of strings
+    """
+    messages = []
+    if result['error']:
+        messages.append(result['error'])
+    messages.extend(result['order_violations'])
+    if result['missing_features']:
+        messages.append('The following features are missing: %s' % ', '.join(result['missing_features']))
+    if result['forbidden_features']:
+        messages.append('The following features are not allowed: %s' % ', '.join(result['forbidden_features']))
+    messages.extend(result['model_violations'])
+    return messages
+
+
+def print_summary(results):
+    """
+    Print the failed products and a summary line.
+    :param results: list of result dicts
+    """
+    failed = [result for result in results if not is_valid(result)]
+    for result in failed:
+        print('xxx %s' % result['poi'])
+        for message in get_messages(result):
+            print('\t', message)
+    print('*** %d products validated, %d failed' % (len(results), len(failed)))
+
+
+def to_json(results):
+    """
+    Build the JSON report.
+    :param results: list of result dicts
+    :return: json serializable dict
+    """
+    return dict(
+        products=len(results),
+        failed=len([result for result in results if not is_valid(result)]),
+        results=[dict(result, valid=is_valid(result)) for result in results],
+    )
+
+
+def to_junit(results):
+    """
+    Build the JUnit XML report: one testsuite per container, one testcase per product.
+    :param results: list of result dicts
+    :return: ElementTree.Element
+    """
+    root = ElementTree.Element('testsuites', name='validate_product_equation')
+    suites = {}
+    for result in results:
+        suite = suites.get(result['container'])
+        if suite is None:
+            suite = suites[result['container']] = ElementTree.SubElement(
+                root, 'testsuite', name=result['container'], tests='0', failures='0', errors='0'
+            )
+        suite.set('tests', str(int(suite.get('tests')) + 1))
+        testcase = ElementTree.SubElement(suite, 'testcase', classname=result['container'], name=result['product'])
+        if result['error']:
+            suite.set('errors', str(int(suite.get('errors')) + 1))
+            ElementTree.SubElement(testcase, 'error', message=result['error'])
+        elif not is_valid(result):
+            suite.set('failures', str(int(suite.get('failures')) + 1))
+            messages = get_messages(result)
+            failure = ElementTree.SubElement(testcase, 'failure', message=messages[0])
+            failure.text = '\n'.join(messages)
+
+    for name in ('tests', 'failures', 'errors'):
+        root.set(name, str(sum(int(suite.get(name)) for suite in suites.values())))
+    return root
+
+
+def write_report(results, path, report_format='json'):
+    """
+    Write the report of results to path.
+    :param results: list of result dicts
+    :param path: path of the report file
+    :param report_format: one of REPORT_FORMATS
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError('report format must be one of: %s' % ', '.join(REPORT_FORMATS))
+    if report_format == 'json':
+        with open(path, 'w') as f:
+            json.dump(to_json(results), f, indent=2)
+    else:
+        ElementTree.ElementTree(to_junit(results)).write(path, encoding='utf-8', xml_declaration=True)
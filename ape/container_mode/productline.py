@@ -0,0 +1,223 @@
+"""
+Conversion of FeatureIDE product configurations to product equations.
+
+A ProductLine loads what the products of a container share only once:
+the repository name, feature_order.json (read and parsed once, for ordering
+as well as for validation), the product spec and the feature model of
+``model.xml``.
+Product configurations are read line by line and product equations are
+only written if their content changes, so caches depending on their
+modification time stay valid.
+"""
+from __future__ import unicode_literals, print_function
+import io
+import json
+import os
+from ape import feaquencer
+from ape.cache import get_cache_dir
+from . import utils
+from . import validators
+
+CONFIG_FILENAME = 'product.equation.config'
+
+
+def read_config(path):
+    """
+    Yield the features selected in a FeatureIDE product configuration.
+    :param path: path of the product.equation.config
+    """
+    with io.open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            feature = line.strip()
+            # in FeatureIDE we cant use '.' for the paths to sub-features so we used '__'
+            # e.g. django_productline__features__development
+            if len(feature.split('__')) > 2:
+                feature = feature.replace('__', '.')
+            # abstract features are skipped; FeatureIDE does not work with abstract sub trees / leafs
+            if feature and not feature.startswith(('abstract_', '_', '#')):
+                yield feature
+
+
+def write_if_changed(path, feature_list):
+    """
+    Write a product equation unless it already has the same content.
+    :param path: path of the product.equation
+    :param feature_list: list of features
+    :return: True if the file was written
+    """
+    content = ''.join(feature + '\n' for feature in feature_list)
+    try:
+        with io.open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except (IOError, OSError):
+        pass
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return True
+
+
+class ProductLine(object):
+    """
+    The feature model data of a container, loaded on first use.
+    """
+
+    def __init__(self, container_dir, repo_name=None):
+        """
+        Constructor
+        :param container_dir: path of the container
+        :param repo_name: optional; the repository name of the container, see utils.get_repo_name
+        """
+        self.container_dir = container_dir
+        self._repo_name = repo_name
+        self._constraints = None
+        self._feature_order = None
+        self._spec_index = False
+        self._model = False
+
+    @property
+    def repo_name(self):
+        if self._repo_name is None:
+            self._repo_name = utils.get_repo_name(self.container_dir)
+        return self._repo_name
+
+    def get_paths(self, product_name):
+        """
+        :return: see utils.get_feature_ide_paths
+        """
+        return utils.get_feature_ide_paths(self.container_dir, product_name, repo_name=self.repo_name)
+
+    def _load_feature_order(self):
+        with open(utils.get_feature_order_path(self.container_dir), 'rb') as f:
+            content = f.read()
+        constraints = json.loads(content.decode('utf-8'))
+        self._constraints = validators.CompiledConstraints(constraints)
+        self._feature_order = feaquencer.CompiledFeatureOrder.from_content(
+            content, cache_dir=get_cache_dir(), feature_dependencies=constraints
+        )
+
+    @property
+    def constraints(self):
+        """
+        validators.CompiledConstraints of feature_order.json
+        """
+        if self._constraints is None:
+            self._load_feature_order()
+        return self._constraints
+
+    @property
+    def feature_order(self):
+        """
+        feaquencer.CompiledFeatureOrder of feature_order.json
+        """
+        if self._feature_order is None:
+            self._load_feature_order()
+        return self._feature_order
+
+    @property
+    def spec_index(self):
+        """
+        validators.ProductSpecIndex or None if there is no product spec
+        """
+        if self._spec_index is False:
+            try:
+                spec_path = self.get_paths('').product_spec_path
+            except Exception:
+                # not a git repository or no origin: there is no product spec to check against
+                spec_path = None
+            self._spec_index = None
+            if spec_path and os.path.exists(spec_path):
+                self._spec_index = validators.ProductSpecIndex.load(spec_path)
+        return self._spec_index
+
+    @property
+    def model(self):
+        """
+        validators.CompiledFeatureModel of model.xml or None if there is no model.xml or it has no features
+        """
+        if self._model is False:
+            self._model = None
+            model_xml_path = utils.get_model_xml_path(self.container_dir)
+            if os.path.exists(model_xml_path):
+                model = validators.CompiledFeatureModel.load(model_xml_path)
+                if model.names:
+                    self._model = model
+        return self._model
+
+    def get_configured_products(self):
+        """
+        :return: sorted list of the products having a product configuration in the productline directory
+        """
+        # the product spec is kept next to the product configurations
+        products_dir = os.path.dirname(self.get_paths('').product_spec_path)
+        if not os.path.isdir(products_dir):
+            return []
+        return sorted(
+            product_name for product_name in os.listdir(products_dir)
+            if os.path.isfile(os.path.join(products_dir, product_name, CONFIG_FILENAME))
+        )
+
+    def print_validation(self, product_name, feature_list):
+        """
+        Validate the feature order, the product spec and the feature model of a product and print the result.
+        :param product_name: name of the product
+        :param feature_list: list of features
+        :return: True if the product is valid
+        """
+        print('*** Starting product.equation validation')
+
+        # --------------------------------------------------------
+        # Validate the feature order
+        print('\tChecking feature order')
+
+        feature_order_validator = validators.FeatureOrderValidator(feature_list, self.constraints)
+        feature_order_validator.check_order()
+
+        if feature_order_validator.has_errors():
+            print('\t\txxx ERROR in your product.equation feature order xxx')
+            for error in feature_order_validator.get_violations():
+                print('\t\t\t', error[1])
+        else:
+            print('\t\tOK')
+
+        # --------------------------------------------------------
+        # Validate the functional product specification
+        print('\tChecking functional product spec')
+
+        spec_errors = False
+        if self.spec_index is None:
+            print(
+                '\t\tSkipped - No product spec exists.\n'
+                '\t\tYou may create a product spec if you want to ensure that\n'
+                '\t\trequired functional features are represented in the product equation\n'
+                '\t\t=> Create spec file featuremodel/productline/<container>/product_spec.json'
+            )
+        else:
+            spec_validator = validators.ProductSpecValidator(None, product_name, feature_list, spec_index=self.spec_index)
+            if not spec_validator.is_valid():
+                if spec_validator.get_errors_mandatory():
+                    print('\t\tERROR: The following feature are missing', spec_validator.get_errors_mandatory())
+                if spec_validator.get_errors_never():
+                    print('\t\tERROR: The following feature are not allowed', spec_validator.get_errors_never())
+            else:
+                print('\t\tOK')
+            spec_errors = spec_validator.has_errors()
+
+        # --------------------------------------------------------
+        # Validate the feature model
+        print('\tChecking feature model')
+
+        model_errors = False
+        if self.model is None:
+            print('\t\tSkipped - No feature model exists in featuremodel/productline/model.xml')
+        else:
+            model_validator = validators.FeatureModelValidator(feature_list, self.model)
+            if not model_validator.check():
+                print('\t\txxx ERROR the product.equation is not a valid configuration of the feature model xxx')
+                for violation in model_validator.get_violations():
+                    print('\t\t\t', violation)
+            else:
+                print('\t\tOK')
+            model_errors = model_validator.has_errors()
+
+        return not (feature_order_validator.has_errors() or spec_errors or model_errors)
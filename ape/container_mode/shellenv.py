@@ -0,0 +1,172 @@
+"""
+Shell payload of ``ape switch``, ``ape teleport`` and ``ape zap``.
+
+The environment of a product is resolved in python at once: the paths of the
+product, the PYTHONPATH including the extra paths of ``_lib/paths.json`` (see
+``ape.installtools.pypath``), the virtualenv to activate and the ``initenv``
+file to source. The payload does not start python or ape again; the extra paths
+are exported as ``APE_EXTRA_PYTHONPATH``, so ``initenv`` files can use them
+instead of running ``python -m ape.installtools.pypath``.
+"""
+from __future__ import unicode_literals, print_function
+import os
+import sys
+import time
+from collections import OrderedDict
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+PATH_SEPARATOR = ';' if os.name == 'nt' else ':'
+ACTIVATE_SCRIPTS = ('bin/activate', 'Scripts/activate')
+
+
+def get_activate_script(venv_dir):
+    """
+    :return: path of the activate script of the virtualenv or None if there is no virtualenv
+    """
+    for script in ACTIVATE_SCRIPTS:
+        path = os.path.join(venv_dir, script)
+        if os.path.isfile(path):
+            return path
+
+
+def get_extra_pythonpath(container_dir):
+    """
+    :return: the paths generate_pypath_for_initenv adds for the container; empty if it is not installed
+    """
+    from ape.installtools import pypath
+
+    if not os.path.exists(os.path.join(container_dir, '_lib', 'paths.json')):
+        return []
+    return pypath.get_extra_pypath(container_dir)[1:]
+
+
+def get_pythonpath(container_dir, extra_paths, environ):
+    """
+    :param extra_paths: the extra paths of the container, see get_extra_pythonpath
+    :return: PYTHONPATH of the product: the global PYTHONPATH of ape, the products and features
+        directories of the container and its extra paths, without duplicates
+    """
+    base = environ.get('APE_GLOBAL_PYTHONPATH', environ.get('PYTHONPATH', ''))
+    paths = base.split(PATH_SEPARATOR) + [
+        os.path.join(container_dir, 'products'),
+        os.path.join(container_dir, 'features'),
+    ] + extra_paths
+    unique = []
+    for path in paths:
+        if path and path not in unique:
+            unique.append(path)
+    return PATH_SEPARATOR.join(unique)
+
+
+def get_environment(container_name, product_name, container_dir, product_dir, environ=None):
+    """
+    Resolve the shell environment of a product.
+    :param container_name: name of the container
+    :param product_name: name of the product
+    :param container_dir: directory of the container, see tasks.get_container_dir
+    :param product_dir: directory of the product, see tasks.get_product_dir
+    :param environ: environment dict of the shell, defaults to os.environ
+    :return: dict(variables=OrderedDict, pythonpath=string, venv=path or None,
+        activate_script=path or None, initenv=path or None, product_dir=path)
+    """
+    environ = os.environ if environ is None else environ
+    extra_paths = get_extra_pythonpath(container_dir)
+
+    variables = OrderedDict()
+    variables['CONTAINER_NAME'] = container_name
+    variables['PRODUCT_NAME'] = product_name
+    variables['APE_ENVIRONMENT'] = '%s:%s' % (container_name, product_name)
+    variables['CONTAINER_DIR'] = container_dir
+    variables['PRODUCT_DIR'] = product_dir
+    variables['PRODUCT_EQUATION_FILENAME'] = os.path.join(product_dir, 'product.equation')
+    variables['PRODUCT_CONTEXT_FILENAME'] = os.path.join(product_dir, 'context.json')
+    variables['APE_EXTRA_PYTHONPATH'] = PATH_SEPARATOR.join(extra_paths)
+
+    venv = os.path.join(container_dir, '_lib', 'venv')
+    activate_script = get_activate_script(venv)
+
+    initenv = None
+    for path in (os.path.join(product_dir, 'initenv'), os.path.join(container_dir, 'initenv')):
+        if os.path.isfile(path):
+            initenv = path
+            break
+
+    return dict(
+        variables=variables,
+        pythonpath=get_pythonpath(container_dir, extra_paths, environ),
+        venv=venv if activate_script else None,
+        activate_script=activate_script,
+        initenv=initenv,
+        product_dir=product_dir,
+    )
+
+
+def render_payload(environment, source_header, environ=None, cd=True):
+    """
+    Render the shell code switching to the environment.
+    :param environment: as returned by get_environment
+    :param source_header: first line, recognized by the ape shell function
+    :param environ: environment dict of the shell, defaults to os.environ
+    :param cd: change to the product directory at the end
+    :return: string
+    """
+    environ = os.environ if environ is None else environ
+    lines = [source_header]
+    for name, value in environment['variables'].items():
+        lines.append('export %s=%s' % (name, quote(value)))
+
+    active_venv = environ.get('APE_CONTAINER_VENV', '')
+    venv = environment['venv']
+    if venv and active_venv != venv:
+        lines.extend([
+            'deactivate',
+            'export APE_CONTAINER_VENV=%s' % quote(venv),
+            'source %s' % quote(environment['activate_script']),
+        ])
+    elif not venv and active_venv:
+        # leave the virtualenv of the previous container
+        lines.extend([
+            'deactivate',
+            'export APE_CONTAINER_VENV=""',
+            'source "${APE_VIRTUALENV}${ACTIVATE_SCRIPT}"',
+        ])
+    if venv:
+        message = 'echo %s' % quote('=> switched to virtualenv: %s' % venv)
+    else:
+        message = 'echo "=> using global virtualenv: ${APE_VIRTUALENV}"'
+    lines.extend(['echo ""', message, 'echo ""'])
+
+    lines.append('export PYTHONPATH=%s' % quote(environment['pythonpath']))
+    if environment['initenv']:
+        lines.append('source %s' % quote(environment['initenv']))
+    lines.append('set_prompt')
+    if cd:
+        lines.append('cd %s' % quote(environment['product_dir']))
+    return '\n'.join(lines)
+
+
+class PhaseTimer(object):
+    """
+    Measures the time spent in consecutive phases.
+    """
+
+    def __init__(self):
+        self.phases = []
+        self.last = time.time()
+
+    def done(self, phase):
+        now = time.time()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def print_report(self, stream=None):
+        """
+        Print the duration of each phase; to stderr by default, so the shell payload stays intact.
+        """
+        stream = sys.stderr if stream is None else stream
+        for phase, duration in self.phases:
+            print('# %-12s %8.2fms' % (phase, duration * 1000), file=stream)
+        print('# %-12s %8.2fms' % ('total', sum(duration for _, duration in self.phases) * 1000), file=stream)
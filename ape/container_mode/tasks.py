@@ -3,7 +3,6 @@ from __future__ import unicode_literals, print_function
 import os
 import sys
 import subprocess
-import json
 from ape import feaquencer
 from ape import tasks
 from .exceptions import ContainerError, ContainerNotFound, ProductNotFound
@@ -28,26 +27,23 @@ def get_product_dir(container_name, product_name):
 
 
 @tasks.register_helper
-def get_containers():
-    entries = os.listdir(tasks.conf.APE_ROOT)
-    containers = []
-    for entry in entries:
-        if os.path.isdir(tasks.get_container_dir(entry) + '/products'):
-            containers.append(entry)
-    return containers
+def get_container_registry():
+    """
+    Returns the ape.registry.ContainerRegistry of the root directory;
+    container directories are looked up with get_container_dir, so refinements of it apply.
+    """
+    from ape import registry
+    return registry.get_registry(tasks.conf.APE_ROOT, get_container_dir=tasks.get_container_dir)
 
 
 @tasks.register_helper
-def get_products(container_name):
-    products_dir = tasks.get_container_dir(container_name) + '/products'
-    if not os.path.isdir(products_dir):
-        return []
-    products = os.listdir(products_dir)
+def get_containers():
+    return tasks.get_container_registry().get_containers()
 
-    def is_product(p):
-        return not p.startswith('.') and not p.startswith('_')
 
-    return [p for p in products if is_product(p)]
+@tasks.register_helper
+def get_products(container_name):
+    return tasks.get_container_registry().get_products(container_name) or []
 
 
 @tasks.register
@@ -115,14 +111,6 @@ def cd(doi):
             print('cd ' + tasks.get_container_dir(container_name))
 
 
-SWITCH_TEMPLATE = '''{source_header}
-
-export CONTAINER_NAME={container_name}
-export PRODUCT_NAME={product_name}
-update_ape_env
-'''
-
-
 @tasks.register
 def switch(poi):
     """
@@ -138,46 +126,91 @@ def switch(poi):
     that are relevant to sdox:dev
     :param poi: product of interest, string: <container_name>:<product_name> or <product_name>.
     """
+    from . import shellenv
+
+    environment = tasks.get_product_environment(*tasks.resolve_poi(poi))
+    print(shellenv.render_payload(environment, tasks.conf.SOURCE_HEADER, cd=False))
+
+
+@tasks.register
+def teleport(poi):
+    """
+    switch and cd in one operation
+    :param poi: product of interest, see switch
+    """
+    from . import shellenv
 
+    environment = tasks.get_product_environment(*tasks.resolve_poi(poi))
+    print(shellenv.render_payload(environment, tasks.conf.SOURCE_HEADER))
+
+
+@tasks.register_helper
+def resolve_poi(poi):
+    """
+    Takes a poi as accepted by switch and returns the container and product name.
+    :param poi: <container_name>:<product_name> or <product_name> if a container is active
+    :raises: ContainerNotFound, ProductNotFound
+    :return: tuple of the container name and the product name
+    """
     parts = poi.split(':')
     if len(parts) == 2:
         container_name, product_name = parts
     elif len(parts) == 1 and os.environ.get('CONTAINER_NAME'):
-        # interpret poi as product name if already zapped into a product in order
-        # to enable simply switching products by doing ape zap prod.
         container_name = os.environ.get('CONTAINER_NAME')
         product_name = parts[0]
     else:
         print('unable to find poi: ', poi)
         sys.exit(1)
 
-    if container_name not in tasks.get_containers():
+    products = tasks.get_container_registry().get_product_set(container_name)
+    if products is None:
         raise ContainerNotFound('No such container %s' % container_name)
-    elif product_name not in tasks.get_products(container_name):
+    if product_name not in products:
         raise ProductNotFound('No such product %s' % product_name)
-    else:
-        print(SWITCH_TEMPLATE.format(
-            source_header=tasks.conf.SOURCE_HEADER,
-            container_name=container_name,
-            product_name=product_name
-        ))
+    return container_name, product_name
 
 
-@tasks.register
-def teleport(poi):
+@tasks.register_helper
+def get_product_environment(container_name, product_name):
     """
-    switch and cd in one operation
-    :param poi:
-    :return:
+    Resolves the shell environment of the product (see shellenv.get_environment):
+    its paths, PYTHONPATH, virtualenv and initenv. Shared by switch, teleport and zap;
+    the directories are looked up with get_container_dir and get_product_dir, so refinements of them apply.
+    :param container_name: name of the container, see resolve_poi
+    :param product_name: name of the product
+    :return: dict as returned by shellenv.get_environment
     """
-    tasks.switch(poi)
-    tasks.cd(poi)
+    from . import shellenv
 
+    return shellenv.get_environment(
+        container_name,
+        product_name,
+        tasks.get_container_dir(container_name),
+        tasks.get_product_dir(container_name, product_name)
+    )
 
-@tasks.register
-def zap(poi):
-    '''alias for "teleport"'''
-    tasks.teleport(poi)
+
+@tasks.register(flags=['timing'])
+def zap(poi, timing=False):
+    """
+    teleport in a single pass
+
+    Resolves the poi once and prints the payload of teleport.
+    :param poi: product of interest, see switch
+    :param timing: print the time spent in each phase to stderr
+    """
+    from . import shellenv
+
+    timer = shellenv.PhaseTimer()
+    container_name, product_name = tasks.resolve_poi(poi)
+    timer.done('resolve')
+    environment = tasks.get_product_environment(container_name, product_name)
+    timer.done('environment')
+    payload = shellenv.render_payload(environment, tasks.conf.SOURCE_HEADER)
+    timer.done('render')
+    print(payload)
+    if timing:
+        timer.print_report()
 
 
 @tasks.register
@@ -237,123 +270,296 @@ def get_poi_tuple(poi=None):
     return container_dir, product_name
 
 
-@tasks.register
-def validate_product_equation(poi=None):
+@tasks.register(flags=dict(all_products='all'))
+def validate_product_equation(poi=None, all_products=False, report=None, report_format='json', jobs=None):
     """
     Validates the product equation.
     * Validates the feature order
     * Validates the product spec (mandatory functional features)
     :param poi: optional product of interest
+    :param all_products: validate the products of all containers in parallel (``--all``)
+    :param report: with --all: optional path of a report file
+    :param report_format: with --all: json or junit
+    :param jobs: with --all: number of worker processes, defaults to the number of cpus
     """
     from . import utils
-    from . import validators
+    from .productline import ProductLine
+
+    if all_products:
+        tasks.validate_all_product_equations(report=report, report_format=report_format, jobs=jobs)
+        return
 
     container_dir, product_name = tasks.get_poi_tuple(poi=poi)
     feature_list = utils.get_features_from_equation(container_dir, product_name)
-    ordering_constraints = utils.get_feature_order_constraints(container_dir)
-    spec_path = utils.get_feature_ide_paths(container_dir, product_name).product_spec_path
+    if not ProductLine(container_dir).print_validation(product_name, feature_list):
+        sys.exit(1)
 
-    print('*** Starting product.equation validation')
 
-    # --------------------------------------------------------
-    # Validate the feature order
-    print('\tChecking feature order')
+@tasks.register_helper
+def validate_all_product_equations(report=None, report_format='json', jobs=None):
+    """
+    Validates the product equations of all products of all containers.
+    Exits with status 1 if any product failed.
+    :param report: optional path of a report file
+    :param report_format: json or junit
+    :param jobs: number of worker processes, defaults to the number of cpus
+    """
+    from . import fleet
 
-    feature_order_validator = validators.FeatureOrderValidator(feature_list, ordering_constraints)
-    feature_order_validator.check_order()
+    if report_format not in fleet.REPORT_FORMATS:
+        print('Unknown report format %s - use one of: %s' % (report_format, ', '.join(fleet.REPORT_FORMATS)))
+        sys.exit(1)
+
+    containers = [
+        (container_name, tasks.get_container_dir(container_name), sorted(tasks.get_products(container_name)))
+        for container_name in sorted(tasks.get_containers())
+    ]
+    print('*** Validating product.equation of all products')
+    results = fleet.validate_products(containers, jobs=int(jobs) if jobs else None)
+    fleet.print_summary(results)
+    if report:
+        fleet.write_report(results, report, report_format)
+        print('*** Report written to %s' % report)
+
+    if not all(fleet.is_valid(result) for result in results):
+        sys.exit(1)
 
-    if feature_order_validator.has_errors():
-        print('\t\txxx ERROR in your product.equation feature order xxx')
-        for error in feature_order_validator.get_violations():
-            print('\t\t\t', error[1])
-    else:
-        print('\t\tOK')
 
-    # --------------------------------------------------------
-    # Validate the functional product specification
-    print('\tChecking functional product spec')
+@tasks.register(flags=['product'])
+def feature_graph(poi=None, output='-', graph_format='dot', product=False, feature=None, depth=1):
+    """
+    Writes the feature order constraints of a container as graph:
+    an edge a -> b means that b has to come after a.
+    The graph is streamed to the output, so this works for large feature models, too.
+    :param poi: optional product of interest, selects the container
+    :param output: path of the output file or "-" for stdout
+    :param graph_format: dot, graphml or json (adjacency lists)
+    :param product: only the features of the product and the features they have to come after
+    :param feature: only the features connected to this feature by at most --depth constraints
+    :param depth: with --feature: maximum number of constraints between the features
+    """
+    import io
+    from . import utils
 
-    if not os.path.exists(spec_path):
+    if graph_format not in feaquencer.GRAPH_FORMATS:
+        print('Unknown graph format %s - use one of: %s' % (graph_format, ', '.join(feaquencer.GRAPH_FORMATS)))
+        sys.exit(1)
 
-        print(
-            '\t\tSkipped - No product spec exists.\n'
-            '\t\tYou may create a product spec if you want to ensure that\n'
-            '\t\trequired functional features are represented in the product equation\n'
-            '\t\t=> Create spec file featuremodel/productline/<container>/product_spec.json'
+    container_dir, product_name = tasks.get_poi_tuple(poi=poi)
+    graph = feaquencer.get_feature_graph(utils.get_feature_order_constraints(container_dir))
+    if product:
+        features = utils.get_features_from_equation(container_dir, product_name)
+        graph = feaquencer.get_subgraph(
+            graph, feaquencer.get_reachable(feaquencer.get_reversed_graph(graph), features)
         )
-        return
+    if feature:
+        if feature not in graph:
+            print('No feature order constraints for feature %s' % feature)
+            sys.exit(1)
+        graph = feaquencer.get_subgraph(graph, feaquencer.get_neighborhood(graph, feature, int(depth)))
 
-    spec_validator = validators.ProductSpecValidator(spec_path, product_name, feature_list)
-    if not spec_validator.is_valid():
-        if spec_validator.get_errors_mandatory():
-            print('\t\tERROR: The following feature are missing', spec_validator.get_errors_mandatory())
-        if spec_validator.get_errors_never():
-            print('\t\tERROR: The following feature are not allowed', spec_validator.get_errors_never())
+    if output == '-':
+        feaquencer.write_graph(graph, sys.stdout, graph_format)
     else:
-        print('\t\tOK')
+        with io.open(output, 'w', encoding='utf-8') as f:
+            feaquencer.write_graph(graph, f, graph_format)
+        print('*** Feature graph written to %s' % output)
 
-    if feature_order_validator.has_errors() or spec_validator.has_errors():
+
+@tasks.register_helper
+def get_feature_order(container_dir):
+    """
+    Returns the compiled feature order constraints of the container (feaquencer.CompiledFeatureOrder);
+    the compiled constraints are cached until feature_order.json changes.
+    :param container_dir:
+    :return:
+    """
+    from ape.cache import get_cache_dir
+    from . import utils
+
+    return feaquencer.CompiledFeatureOrder.from_file(utils.get_feature_order_path(container_dir), cache_dir=get_cache_dir())
+
+
+@tasks.register_helper
+def get_feature_order_query(poi=None):
+    """
+    Returns a feaquencer.FeatureOrderQuery for the container of the given or the active product.
+    :param poi: optional product of interest
+    :return:
+    """
+    container_dir, _ = tasks.get_poi_tuple(poi=poi)
+    return feaquencer.FeatureOrderQuery(tasks.get_feature_order(container_dir))
+
+
+@tasks.register
+def explain_order(feature, other, poi=None):
+    """
+    Explains why feature comes before other (or the other way round):
+    prints a shortest chain of feature order constraints between them.
+    :param feature:
+    :param other:
+    :param poi: optional product of interest, selects the container
+    """
+    query = tasks.get_feature_order_query(poi=poi)
+    try:
+        steps = query.explain(feature, other) or query.explain(other, feature)
+    except feaquencer.UnknownFeatureError as e:
+        print(e)
+        sys.exit(1)
+
+    if not steps:
+        print('%s and %s may come in any order' % (feature, other))
+        return
+    print('%s has to come before %s:' % (steps[0][0], steps[-1][1]))
+    for earlier, later, reason in steps:
+        if reason == 'first':
+            print('\t%s is the first feature' % earlier)
+        elif reason == 'last':
+            print('\t%s is the last feature' % later)
+        else:
+            print('\t%s after %s' % (later, earlier))
+
+
+@tasks.register
+def constrained_by(feature, poi=None):
+    """
+    Lists the features that have to come before and after feature,
+    directly or through a chain of feature order constraints.
+    :param feature:
+    :param poi: optional product of interest, selects the container
+    """
+    query = tasks.get_feature_order_query(poi=poi)
+    try:
+        before, after = query.get_before(feature), query.get_after(feature)
+    except feaquencer.UnknownFeatureError as e:
+        print(e)
+        sys.exit(1)
+
+    print('%s has to come after:' % feature)
+    for other in before:
+        print('\t' + other)
+    print('%s has to come before:' % feature)
+    for other in after:
+        print('\t' + other)
+
+
+@tasks.register
+def constraint_impact(feature, after, poi=None):
+    """
+    Shows what changes if the feature order constraint "feature after <after>" is dropped:
+    the features that would no longer be ordered and the features that would move
+    in the product equation of the given or the active product.
+    :param feature:
+    :param after:
+    :param poi: optional product of interest
+    """
+    from . import utils
+
+    container_dir, product_name = tasks.get_poi_tuple(poi=poi)
+    query = tasks.get_feature_order_query(poi=poi)
+    try:
+        impact = query.get_impact(feature, after)
+    except (feaquencer.UnknownFeatureError, feaquencer.UnknownConstraintError) as e:
+        print(e)
         sys.exit(1)
 
+    print('*** Features that would no longer have to come before other features: %d' % len(impact))
+    for other, unordered in impact:
+        print('\t%s: %s' % (other, ', '.join(unordered)))
+
+    if product_name:
+        feature_list = utils.get_features_from_equation(container_dir, product_name)
+        _, _, moved = query.get_moved(feature, after, feature_list)
+        if moved:
+            print('*** Features that would move in the product equation of %s: %s' % (product_name, ', '.join(moved)))
+        else:
+            print('*** No feature would move in the product equation of %s' % product_name)
+
 
 @tasks.register_helper
-def get_ordered_feature_list(info_object, feature_list):
+def get_ordered_feature_list(info_object, feature_list, previous_order=None, feature_order=None):
     """
     Orders the passed feature list by the given, json-formatted feature
     dependency file using feaquencer's topsort algorithm.
+    The compiled dependency graph is cached until the file changes.
+    If previous_order is given, it is updated incrementally: features are only
+    inserted and dropped, unless this violates the dependencies. A previous order that
+    violates the dependencies itself is sorted again.
     :param feature_list:
     :param info_object:
+    :param previous_order: optional list of features, e.g. of the current product.equation
+    :param feature_order: optional feaquencer.CompiledFeatureOrder of info_object.feature_order_json
     :return:
     """
-    feature_dependencies = json.load(open(info_object.feature_order_json))
+    from ape.cache import get_cache_dir
+
+    if feature_order is None:
+        feature_order = feaquencer.CompiledFeatureOrder.from_file(info_object.feature_order_json, cache_dir=get_cache_dir())
     feature_selection = [feature for feature in [feature.strip().replace('\n', '') for feature in feature_list]
                          if len(feature) > 0 and not feature.startswith('_') and not feature.startswith('#')]
-    return [feature + '\n' for feature in feaquencer.get_total_order(feature_selection, feature_dependencies)]
-
-
-@tasks.register
-def config_to_equation(poi=None):
+    if previous_order is None:
+        return [feature + '\n' for feature in feature_order.get_total_order(feature_selection)]
+
+    selected = set(feature_selection)
+    previous = set(previous_order)
+    order, moved = feature_order.update_order(
+        previous_order,
+        added=[feature for feature in feature_selection if feature not in previous],
+        removed=[feature for feature in previous_order if feature not in selected]
+    )
+    if moved:
+        print('*** Features moved to satisfy the feature order: %s' % ', '.join(moved))
+    return [feature + '\n' for feature in order]
+
+
+@tasks.register(flags=dict(incremental='incremental', all_products='all'))
+def config_to_equation(poi=None, incremental=False, all_products=False):
     """
     Generates a product.equation file for the given product name.
     It generates it from the <product_name>.config file in the products folder.
     For that you need to have your project imported to featureIDE and set the correct settings.
+    With --incremental, the existing product.equation is updated: added features are inserted and
+    removed features are dropped, the other features keep their order where possible.
+    With --all, the product.equation of every product with a config in the productline directory is generated.
+    product.equation files are only written if they change. Each generated product.equation is validated.
     """
     from . import utils
+    from .productline import ProductLine, read_config, write_if_changed
 
     container_dir, product_name = tasks.get_poi_tuple(poi=poi)
-    info_object = utils.get_feature_ide_paths(container_dir, product_name)
-    feature_list = list()
+    productline = ProductLine(container_dir)
+    product_names = productline.get_configured_products() if all_products else [product_name]
 
-    try:
+    valid = True
+    for product_name in product_names:
+        info_object = productline.get_paths(product_name)
         print('*** Processing ', info_object.config_file_path)
-        with open(info_object.config_file_path, 'r') as config_file:
-
-            config_file = config_file.readlines()
-            for line in config_file:
-                # in FeatureIDE we cant use '.' for the paths to sub-features so we used '__'
-                # e.g. django_productline__features__development
-                if len(line.split('__')) <= 2:
-                    line = line
-                else:
-                    line = line.replace('__', '.')
-
-                if line.startswith('abstract_'):
-                    # we skipp abstract features; this is a special case as featureIDE does not work with abstract
-                    # sub trees / leafs.
-                    line = ''
-
-                feature_list.append(line)
-    except IOError:
-        print('{} does not exist. Make sure your config file exists.'.format(info_object.config_file_path))
+        try:
+            feature_list = list(read_config(info_object.config_file_path))
+        except IOError:
+            print('{} does not exist. Make sure your config file exists.'.format(info_object.config_file_path))
+            valid = False
+            continue
+
+        previous_order = None
+        if incremental and os.path.exists(info_object.equation_file_path):
+            previous_order = utils.get_features_from_equation(container_dir, product_name)
+        feature_list = [feature.strip() for feature in tasks.get_ordered_feature_list(
+            info_object, feature_list, previous_order=previous_order, feature_order=productline.feature_order
+        )]
+
+        try:
+            if write_if_changed(info_object.equation_file_path, feature_list):
+                print('*** Successfully generated product.equation')
+            else:
+                print('*** product.equation is up to date')
+        except IOError:
+            print('product.equation file not found. Please make sure you have a valid product.equation in your chosen product')
+            valid = False
+            continue
 
-    feature_list = tasks.get_ordered_feature_list(info_object, feature_list)
+        # finally performing the validation of the product equation
+        valid = productline.print_validation(product_name, feature_list) and valid
 
-    try:
-        with open(info_object.equation_file_path, 'w') as eq_file:
-            eq_file.writelines(feature_list)
-        print('*** Successfully generated product.equation')
-    except IOError:
-        print('product.equation file not found. Please make sure you have a valid product.equation in your chosen product')
-
-    # finally performing the validation of the product equation
-    tasks.validate_product_equation()
+    if not valid:
+        sys.exit(1)
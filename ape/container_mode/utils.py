@@ -1,19 +1,19 @@
 from __future__ import print_function, unicode_literals
-import git
-import xml.etree.ElementTree
 import os.path
+from ape import gitmeta
 
 
 def get_repo_name(repo_dir):
     """
     Takes a directory (which must be a git repo) and returns the repository name, derived from
     remote.origin.url; <domain>/foo/bar.git => bar
+    The url is memoized until the git config changes, see ape.gitmeta.
     :param repo_dir: path of the directory
+    :raises: gitmeta.GitError if repo_dir is not a git repo or has no origin
     :return: string
     """
 
-    repo = git.Repo(repo_dir)
-    url = repo.remotes.origin.url
+    url = gitmeta.get_remote_url(repo_dir, search_parent_directories=False)
 
     return url.split('/')[-1].split('.git')[0]
 
@@ -21,18 +21,31 @@ def get_repo_name(repo_dir):
 def extract_feature_order_from_model_xml(file_path):
     """
     Takes the path to a FeatureIDE model.xml file and extracts the feature order.
+    The model is parsed incrementally and cached, see featuremodel.load_model_xml.
     :param file_path: path to the model file
     :return: list of features as strings
     """
+    from .featuremodel import load_model_xml
 
-    root = xml.etree.ElementTree.parse(file_path).getroot()
-    feature_order_node = root.find('featureOrder')
+    return load_model_xml(file_path).feature_order
 
-    features = []
-    for child in feature_order_node:
-        features.append(child.attrib['name'])
 
-    return features
+def get_feature_order_path(container_dir):
+    """
+    Returns the path of featuremodel/productline/feature_order.json
+    :param container_dir: the container dir.
+    :return: path
+    """
+    return os.path.join(container_dir, '_lib/featuremodel/productline/feature_order.json')
+
+
+def get_model_xml_path(container_dir):
+    """
+    Returns the path of featuremodel/productline/model.xml
+    :param container_dir: the container dir.
+    :return: path
+    """
+    return os.path.join(container_dir, '_lib/featuremodel/productline/model.xml')
 
 
 def get_feature_order_constraints(container_dir):
@@ -43,7 +56,7 @@ def get_feature_order_constraints(container_dir):
     """
     import json
 
-    file_path = os.path.join(container_dir, '_lib/featuremodel/productline/feature_order.json')
+    file_path = get_feature_order_path(container_dir)
     with open(file_path, 'r') as f:
         ordering_constraints = json.loads(f.read())
 
@@ -62,19 +75,21 @@ def get_features_from_equation(container_dir, product_name):
     return featuremonkey.get_features_from_equation_file(file_path)
 
 
-def get_feature_ide_paths(container_dir, product_name):
+def get_feature_ide_paths(container_dir, product_name, repo_name=None):
     """
     Takes the container_dir and the product name and returns all relevant paths from the
     feature_order_json to the config_file_path.
     :param container_dir: the full path of the container dir
     :param product_name: the name of the product
+    :param repo_name: optional; the repository name of the container, see get_repo_name
     :return: object with divert path attributes
     """
-    repo_name = get_repo_name(container_dir)
+    if repo_name is None:
+        repo_name = get_repo_name(container_dir)
 
     class Paths(object):
-        feature_order_json = os.path.join(container_dir, '_lib/featuremodel/productline/feature_order.json')
-        model_xml_path = os.path.join(container_dir, '_lib/featuremodel/productline/model.xml')
+        feature_order_json = get_feature_order_path(container_dir)
+        model_xml_path = get_model_xml_path(container_dir)
         config_file_path = os.path.join(container_dir, '_lib/featuremodel/productline/products/', repo_name, product_name, 'product.equation.config')
         equation_file_path = os.path.join(container_dir, 'products', product_name, 'product.equation')
         product_spec_path = os.path.join(container_dir, '_lib/featuremodel/productline/products/', repo_name, 'product_spec.json')
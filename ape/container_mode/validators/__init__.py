@@ -1,2 +1,4 @@
 from .feature_order_validator import *
-from .product_spec_validator import *
\ No newline at end of file
+from .product_spec_validator import *
+from .bulk_order_validator import *
+from .feature_model_validator import *
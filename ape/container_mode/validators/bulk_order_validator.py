@@ -0,0 +1,141 @@
+from __future__ import print_function, unicode_literals
+from .feature_order_validator import (
+    CompiledConstraints,
+    FeatureOrderValidator,
+    get_order_message,
+    get_position_message,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['BulkOrderValidator']
+
+# number of feature lists checked at once; bounds the size of the intermediate matrices
+CHUNK_SIZE = 256
+
+
+class BulkOrderValidator(object):
+    """
+    Validates the feature order of many feature lists against the same constraints.
+
+    If numpy is installed, the feature lists are encoded as a matrix of positions
+    (feature lists x constrained features, -1 for absent features) and all constraints
+    are evaluated at once for all feature lists.
+    Otherwise, FeatureOrderValidator.check_many is used.
+    Either way, the violations are the same as those of FeatureOrderValidator.get_violations.
+    """
+
+    def __init__(self, constraints, use_numpy=None):
+        """
+        Constructor;
+        :param constraints: dict(<featurename>=dict(before=[], after=[])) or CompiledConstraints
+        :param use_numpy: defaults to True if numpy is installed
+        :return:
+        """
+        if not isinstance(constraints, CompiledConstraints):
+            constraints = CompiledConstraints(constraints)
+        self.compiled = constraints
+        self.use_numpy = numpy is not None if use_numpy is None else use_numpy
+        if self.use_numpy and numpy is None:
+            raise ImportError('numpy is not installed')
+
+        # (feature, mode, other feature or forced position) in the order of FeatureOrderValidator's violations
+        self.checks = []
+        for feature, before, after, position in constraints.entries:
+            self.checks.extend((feature, 'before', other) for other in before)
+            self.checks.extend((feature, 'after', other) for other in after)
+            if position is not None:
+                self.checks.append((feature, 'position', position))
+
+        # column of each constrained feature in the position matrix
+        self.columns = {}
+        for feature, mode, other in self.checks:
+            self.columns.setdefault(feature, len(self.columns))
+            if mode != 'position':
+                self.columns.setdefault(other, len(self.columns))
+
+        if self.use_numpy:
+            self._features = numpy.array([self.columns[check[0]] for check in self.checks], dtype=numpy.intp)
+            self._others = numpy.array([
+                self.columns[other if mode != 'position' else feature] for feature, mode, other in self.checks
+            ], dtype=numpy.intp)
+            # before: feature_pos - other_pos must not be positive, after: must not be negative
+            self._signs = numpy.array([
+                dict(before=1, after=-1, position=0)[mode] for _, mode, _ in self.checks
+            ], dtype=numpy.int64)
+            self._positions = numpy.array([
+                other if mode == 'position' else 0 for _, mode, other in self.checks
+            ], dtype=numpy.int64)
+
+    def get_violations(self, feature_lists):
+        """
+        Validates the feature lists.
+        :param feature_lists: iterable of lists of feature names
+        :return: list with the violations of each feature list, see FeatureOrderValidator.get_violations
+        """
+        feature_lists = list(feature_lists)
+        if not self.use_numpy:
+            return [
+                validator.get_violations()
+                for validator in FeatureOrderValidator.check_many(feature_lists, self.compiled)
+            ]
+
+        violations = []
+        for start in range(0, len(feature_lists), CHUNK_SIZE):
+            violations.extend(self._check_chunk(feature_lists[start:start + CHUNK_SIZE]))
+        return violations
+
+    def _get_positions(self, feature_lists):
+        """
+        :return: matrix of the positions of the constrained features in each feature list
+        """
+        matrix = numpy.full((len(feature_lists), len(self.columns)), -1, dtype=numpy.int64)
+        lengths = numpy.array([len(feature_list) for feature_list in feature_lists], dtype=numpy.intp)
+        if not lengths.sum():
+            return matrix
+
+        # map each distinct feature name to its column (-1 if not constrained)
+        names, inverse = numpy.unique(
+            numpy.array([feature for feature_list in feature_lists for feature in feature_list]),
+            return_inverse=True
+        )
+        name_columns = numpy.array(
+            [self.columns.get(name.replace('__', '.'), -1) for name in names.tolist()], dtype=numpy.int64
+        )
+        columns = name_columns[inverse.ravel()]
+        rows = numpy.repeat(numpy.arange(len(feature_lists)), lengths)
+        starts = numpy.cumsum(lengths) - lengths
+        positions = numpy.arange(len(columns)) - numpy.repeat(starts, lengths)
+
+        constrained = columns >= 0
+        cells = rows[constrained] * len(self.columns) + columns[constrained]
+        # the first occurrence counts, just like in FeatureOrderValidator
+        cells, first = numpy.unique(cells, return_index=True)
+        matrix.flat[cells] = positions[constrained][first]
+        return matrix
+
+    def _check_chunk(self, feature_lists):
+        positions = self._get_positions(feature_lists)
+        feature_pos = positions[:, self._features]
+        other_pos = positions[:, self._others]
+        violated = (feature_pos >= 0) & numpy.where(
+            self._signs == 0,
+            feature_pos != self._positions,
+            (other_pos >= 0) & (self._signs * (feature_pos - other_pos) > 0)
+        )
+
+        violations = [[] for _ in feature_lists]
+        # row major: the violations of each feature list come in the order of the checks
+        for row, check in zip(*numpy.nonzero(violated)):
+            feature, mode, other = self.checks[check]
+            if mode == 'position':
+                message = get_position_message(feature, int(feature_pos[row, check]), other)
+            else:
+                message = get_order_message(
+                    feature, int(feature_pos[row, check]), mode, other, int(other_pos[row, check])
+                )
+            violations[row].append((feature, message))
+        return violations
@@ -0,0 +1,231 @@
+from __future__ import unicode_literals, print_function
+
+__all__ = ['FeatureModelValidator', 'CompiledFeatureModel']
+
+# how the binary operators of constraints are rendered
+OPERATORS = {
+    'and': ' and ',
+    'or': ' or ',
+    'imp': ' => ',
+    'eq': ' <=> ',
+}
+
+
+def _iter_bits(mask):
+    """
+    Yields the indices of the bits set in mask, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _render(expression):
+    """
+    Returns the text of a constraint of featuremodel.FeatureModel, e.g. "a => (b or c)".
+    """
+    op = expression[0]
+    if op == 'var':
+        return expression[1].replace('__', '.')
+    operands = [
+        _render(operand) if operand[0] == 'var' else '(%s)' % _render(operand)
+        for operand in expression[1:]
+    ]
+    if op == 'not':
+        return 'not %s' % operands[0]
+    return OPERATORS[op].join(operands)
+
+
+class CompiledFeatureModel(object):
+    """
+    A feature model compiled for validating many feature lists.
+    Each feature is a bit of an int, a selection is the mask of its selected features:
+    the tree constraints are checked group by group with mask operations and the
+    cross-tree constraints are evaluated on the mask.
+    Feature names are compared with __ replaced by dots.
+    """
+
+    def __init__(self, model):
+        """
+        Constructor;
+        :param model: featuremodel.FeatureModel
+        """
+        self.names = [name.replace('__', '.') for name in model.features]
+        self.bits = dict((name, idx) for idx, name in reversed(list(enumerate(self.names))))
+        self.root = 1 if self.names else 0
+        self.concrete = 0
+        for idx, abstract in enumerate(model.abstract):
+            if not abstract:
+                self.concrete |= 1 << idx
+
+        children = model.get_children()
+        # (bit, children mask) of the abstract features, children first:
+        # abstract features are selected if one of their children is
+        self.derived = [
+            (1 << idx, sum(1 << child for child in children[idx]))
+            for idx in reversed(range(len(self.names))) if model.abstract[idx]
+        ]
+        # (bit, parent bit) of the mandatory abstract children of and groups, parents first:
+        # abstract features can't be selected in a product equation, they are selected with their parent
+        self.implied = [
+            (1 << idx, 1 << parent)
+            for idx, parent in enumerate(model.parents)
+            if parent is not None and model.abstract[idx] and model.mandatory[idx] and model.groups[parent] == 'and'
+        ]
+
+        # (index, bit, children mask, mandatory children mask, group) of the features having children
+        self.groups = []
+        for idx, feature_children in enumerate(children):
+            if not feature_children:
+                continue
+            mandatory = 0
+            if model.groups[idx] == 'and':
+                mandatory = sum(1 << child for child in feature_children if model.mandatory[child])
+            self.groups.append((
+                idx, 1 << idx, sum(1 << child for child in feature_children), mandatory, model.groups[idx]
+            ))
+
+        # (compiled expression, text) of the cross-tree constraints
+        self.constraints = [
+            (self._compile(expression), _render(expression)) for expression in model.constraints
+        ]
+
+    @classmethod
+    def load(cls, model_xml_path):
+        """
+        Reads the model.xml (see featuremodel.load_model_xml) and compiles it.
+        :param model_xml_path: path of the model.xml
+        :return: CompiledFeatureModel
+        """
+        from ..featuremodel import load_model_xml
+
+        return cls(load_model_xml(model_xml_path))
+
+    def _compile(self, expression):
+        """
+        Compiles a constraint to nested tuples evaluated by _evaluate;
+        conjunctions and disjunctions of variables become a single mask test.
+        """
+        op = expression[0]
+        if op == 'var':
+            idx = self.bits.get(expression[1].replace('__', '.'))
+            # an unknown feature can't be selected
+            return 'all', 0 if idx is None else 1 << idx, idx is not None
+        operands = [self._compile(operand) for operand in expression[1:]]
+        if op in ('and', 'or') and all(operand[0] == 'all' and operand[2] for operand in operands):
+            mask = sum(operand[1] for operand in operands)
+            return ('all' if op == 'and' else 'any'), mask, True
+        return (op,) + tuple(operands)
+
+    def _evaluate(self, compiled, selection):
+        op = compiled[0]
+        if op == 'all':
+            return compiled[2] and selection & compiled[1] == compiled[1]
+        if op == 'any':
+            return selection & compiled[1] != 0
+        if op == 'not':
+            return not self._evaluate(compiled[1], selection)
+        if op == 'and':
+            return all(self._evaluate(operand, selection) for operand in compiled[1:])
+        if op == 'or':
+            return any(self._evaluate(operand, selection) for operand in compiled[1:])
+        if op == 'imp':
+            return not self._evaluate(compiled[1], selection) or self._evaluate(compiled[2], selection)
+        if op == 'eq':
+            return self._evaluate(compiled[1], selection) == self._evaluate(compiled[2], selection)
+        raise ValueError('unknown constraint operator: %s' % op)
+
+    def get_selection(self, feature_list):
+        """
+        Returns the mask of the selected features: the features of feature_list,
+        the abstract features above them, the root and the implied abstract features.
+        :param feature_list: list of feature names
+        :return: (selection mask, list of the features that are not part of the model)
+        """
+        selection = 0
+        unknown = []
+        for feature in feature_list:
+            idx = self.bits.get(feature.replace('__', '.'))
+            if idx is None:
+                unknown.append(feature)
+            else:
+                selection |= 1 << idx
+        for bit, children in self.derived:
+            if selection & children:
+                selection |= bit
+        if not self.concrete & self.root:
+            selection |= self.root
+        for bit, parent in self.implied:
+            if selection & parent:
+                selection |= bit
+        return selection, unknown
+
+    def _get_names(self, mask):
+        return ', '.join(self.names[idx] for idx in _iter_bits(mask))
+
+    def get_violations(self, feature_list):
+        """
+        Checks the feature list against the tree and cross-tree constraints of the model.
+        :param feature_list: list of feature names
+        :return: list of messages, empty if the feature list is a valid configuration
+        """
+        selection, unknown = self.get_selection(feature_list)
+        violations = ['%s is not part of the feature model.' % feature for feature in unknown]
+        if self.root and not selection & self.root:
+            violations.append('the root feature %s is not selected.' % self.names[0])
+
+        for idx, bit, children, mandatory, group in self.groups:
+            selected = selection & children
+            if not selection & bit:
+                for child in _iter_bits(selected):
+                    violations.append('%s requires its parent feature %s, which is not selected.' % (
+                        self.names[child], self.names[idx]
+                    ))
+                continue
+            for child in _iter_bits(mandatory & ~selection):
+                violations.append('%s is mandatory for %s but not selected.' % (self.names[child], self.names[idx]))
+            if group == 'or' and not selected:
+                violations.append('%s requires at least one of %s.' % (self.names[idx], self._get_names(children)))
+            elif group == 'alt' and (not selected or selected & (selected - 1)):
+                violations.append('%s requires exactly one of %s but %s selected.' % (
+                    self.names[idx], self._get_names(children),
+                    '%s are' % self._get_names(selected) if selected else 'none is'
+                ))
+
+        for compiled, text in self.constraints:
+            if not self._evaluate(compiled, selection):
+                violations.append('constraint %s is violated.' % text)
+        return violations
+
+
+class FeatureModelValidator(object):
+    """
+    This class provides an API to validate a list of feature names against a feature model.
+    """
+
+    def __init__(self, feature_list, model):
+        """
+        Constructor;
+        :param feature_list: list of feature names
+        :param model: featuremodel.FeatureModel or CompiledFeatureModel
+        """
+        if not isinstance(model, CompiledFeatureModel):
+            model = CompiledFeatureModel(model)
+        self.compiled = model
+        self.feature_list = feature_list
+        self.violations = []
+
+    def check(self):
+        """
+        Performs the check and stores the violations in self.violations.
+        :return: boolean indicating the error state
+        """
+        self.violations = self.compiled.get_violations(self.feature_list)
+        return not self.has_errors()
+
+    def has_errors(self):
+        return len(self.violations) > 0
+
+    def get_violations(self):
+        return self.violations
@@ -1,7 +1,53 @@
 from __future__ import print_function, unicode_literals
 import operator
 
-__all__ = ['FeatureOrderValidator', ]
+__all__ = ['FeatureOrderValidator', 'CompiledConstraints']
+
+
+def get_order_message(feature, feature_pos, mode, other, other_pos):
+    """
+    Returns the message of a violated before or after constraint.
+    :param mode: after | before string
+    """
+    return '{feature} (pos {feature_pos}) must be {mode} feature {other} (pos {other_pos}) but isn\'t.'.format(
+        feature=feature,
+        feature_pos=feature_pos,
+        other=other,
+        other_pos=other_pos,
+        mode=mode.upper()
+    )
+
+
+def get_position_message(feature, feature_pos, pos):
+    """
+    Returns the message of a violated forced position.
+    """
+    return '{feature} has a forced position on ({pos}) but is on position {feature_pos}.'.format(
+        feature=feature,
+        pos=pos,
+        feature_pos=feature_pos
+    )
+
+
+class CompiledConstraints(object):
+    """
+    Feature order constraints preprocessed for validating many feature lists.
+    Features without any before, after or position constraint are dropped.
+    """
+
+    def __init__(self, constraints):
+        """
+        Constructor;
+        :param constraints: dict(<featurename>=dict(before=[], after=[], position=None))
+        :return:
+        """
+        self.constraints = constraints
+        # (feature, before, after, position) in the iteration order of constraints
+        self.entries = []
+        for feature, info in constraints.items():
+            entry = (feature, tuple(info.get('before', [])), tuple(info.get('after', [])), info.get('position'))
+            if entry[1] or entry[2] or entry[3] is not None:
+                self.entries.append(entry)
 
 
 class FeatureOrderValidator(object):
@@ -14,13 +60,38 @@ class FeatureOrderValidator(object):
         """
         Constructor;
         :param feature_list: list of feature names
-        :param constraints: dict(<featurename>=dict(before=[], after=[]))
+        :param constraints: dict(<featurename>=dict(before=[], after=[])) or CompiledConstraints
         :return:
         """
         # replace potential __ syntax with dots (may come from model.xml)
         self.feature_list = [fn.replace('__', '.') for fn in feature_list]
-        self.constraints = constraints
+        if not isinstance(constraints, CompiledConstraints):
+            constraints = CompiledConstraints(constraints)
+        self.compiled = constraints
+        self.constraints = constraints.constraints
         self.violations = []
+        # the first occurrence counts, just like with list.index
+        self.positions = {}
+        for pos, feature in enumerate(self.feature_list):
+            self.positions.setdefault(feature, pos)
+
+    @classmethod
+    def check_many(cls, feature_lists, constraints):
+        """
+        Validates many feature lists against the same constraints;
+        the constraints are preprocessed only once.
+        :param feature_lists: iterable of lists of feature names
+        :param constraints: dict(<featurename>=dict(before=[], after=[])) or CompiledConstraints
+        :return: list of validators in the order of feature_lists, each with check_order performed
+        """
+        if not isinstance(constraints, CompiledConstraints):
+            constraints = CompiledConstraints(constraints)
+        validators = []
+        for feature_list in feature_lists:
+            validator = cls(feature_list, constraints)
+            validator.check_order()
+            validators.append(validator)
+        return validators
 
     def check_order(self):
         """
@@ -28,18 +99,23 @@ class FeatureOrderValidator(object):
         :return: boolean indicating the error state
         """
 
-        for feature, info in self.constraints.items():
-            self._check_feature(feature, info, 'before')
-            self._check_feature(feature, info, 'after')
-            self._check_position(feature, info)
+        for feature, before, after, position in self.compiled.entries:
+            feature_pos = self.positions.get(feature)
+            if feature_pos is None:
+                # only proceed if the the feature exists in the current feature list
+                continue
+            self._check_feature(feature, feature_pos, before, 'before')
+            self._check_feature(feature, feature_pos, after, 'after')
+            self._check_position(feature, feature_pos, position)
 
         return not self.has_errors()
 
-    def _check_feature(self, feature, info, mode):
+    def _check_feature(self, feature, feature_pos, others, mode):
         """
         Private helper method performing the order check.
         :param feature: the feature to check.
-        :param info: the info dict containing the before and after constraints
+        :param feature_pos: the position of the feature
+        :param others: the features of the before or after constraint
         :param mode: after | before string
         :return: None
         """
@@ -49,44 +125,25 @@ class FeatureOrderValidator(object):
             after=operator.lt
         )[mode]
 
-        feature_pos = self.get_feature_position(feature)
-
-        if feature_pos is not None:
-            # only proceed if the the feature exists in the current feature list
+        for other in others:
+            other_pos = self.positions.get(other)
 
-            for other in info.get(mode, []):
-                other_pos = self.get_feature_position(other)
-
-                if other_pos is not None:
-                    # only proceed if the the other feature exists in the current feature list
-                    if op(feature_pos, other_pos):
-                        message = '{feature} (pos {feature_pos}) must be {mode} feature {other} (pos {other_pos}) but isn\'t.'.format(
-                            feature=feature,
-                            feature_pos=feature_pos,
-                            other=other,
-                            other_pos=other_pos,
-                            mode=mode.upper()
-                        )
-                        self.violations.append((feature, message))
+            if other_pos is not None:
+                # only proceed if the the other feature exists in the current feature list
+                if op(feature_pos, other_pos):
+                    message = get_order_message(feature, feature_pos, mode, other, other_pos)
+                    self.violations.append((feature, message))
 
-    def _check_position(self, feature, info):
+    def _check_position(self, feature, feature_pos, pos):
         """
-        Takes the featur and the info dict and checks for the forced position
+        Takes the feature, its position and checks for the forced position
         :param feature:
-        :param info:
+        :param feature_pos:
+        :param pos: the forced position or None
         :return:
         """
-        pos = info.get('position')
-        if pos is not None:
-            feature_pos = self.get_feature_position(feature)
-            if feature_pos is not None:
-                if feature_pos != pos:
-                    message = '{feature} has a forced position on ({pos}) but is on position {feature_pos}.'.format(
-                        feature=feature,
-                        pos=pos,
-                        feature_pos=feature_pos
-                    )
-                    self.violations.append((feature, message))
+        if pos is not None and feature_pos != pos:
+            self.violations.append((feature, get_position_message(feature, feature_pos, pos)))
 
     def get_feature_position(self, feature):
         """
@@ -94,10 +151,7 @@ class FeatureOrderValidator(object):
         :param feature:
         :return:
         """
-        try:
-            return self.feature_list.index(feature)
-        except ValueError:
-            return None
+        return self.positions.get(feature)
 
     def has_errors(self):
         return len(self.violations) > 0
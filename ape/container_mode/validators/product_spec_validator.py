@@ -2,18 +2,81 @@ from __future__ import unicode_literals, print_function
 import codecs
 import json
 
-__all__ = ['ProductSpecValidator']
+__all__ = ['ProductSpecValidator', 'ProductSpecIndex']
+
+
+class ProductSpecIndex(object):
+    """
+    Product spec preprocessed for validating many products:
+    maps each product to its mandatory and never features.
+    """
+
+    def __init__(self, spec_entries):
+        """
+        Constructor
+        :param spec_entries: content of the product spec json
+        """
+        # product name -> list of (feature as in the spec, feature name with __ replaced by dots)
+        self.mandatory = {}
+        self.never = {}
+        # product name -> set of normalized feature names, for the common case of no errors
+        self.mandatory_sets = {}
+        self.never_sets = {}
+        for entry in spec_entries:
+            mandatory = [(feature, feature.replace('__', '.')) for feature in entry.get('mandatory', [])]
+            never = [(feature, feature.replace('__', '.')) for feature in entry.get('never', [])]
+            for product_name in entry.get('products') or []:
+                self.mandatory.setdefault(product_name, []).extend(mandatory)
+                self.never.setdefault(product_name, []).extend(never)
+        for product_name, features in self.mandatory.items():
+            self.mandatory_sets[product_name] = set(normalized for _, normalized in features)
+        for product_name, features in self.never.items():
+            self.never_sets[product_name] = set(normalized for _, normalized in features)
+
+    @classmethod
+    def load(cls, spec_path):
+        """
+        Reads the spec file and builds the index.
+        :param spec_path:
+        :return: ProductSpecIndex
+        """
+        return cls(ProductSpecValidator.load(spec_path))
+
+    def get_errors(self, product_name, feature_list):
+        """
+        Checks the feature list against the spec of the product.
+        :param product_name: the name of the product
+        :param feature_list: list or set of feature names
+        :return: (missing mandatory features, contained never features) in the order of the spec
+        """
+        features = feature_list if isinstance(feature_list, (set, frozenset)) else set(feature_list)
+        missing = []
+        if not self.mandatory_sets.get(product_name, set()) <= features:
+            missing = [feature for feature, normalized in self.mandatory[product_name] if normalized not in features]
+        forbidden = []
+        if not self.never_sets.get(product_name, set()).isdisjoint(features):
+            forbidden = [feature for feature, normalized in self.never[product_name] if normalized in features]
+        return missing, forbidden
 
 
 class ProductSpecValidator(object):
-    def __init__(self, spec_path, product_name, feature_list):
+    def __init__(self, spec_path, product_name, feature_list, spec_entries=None, spec_index=None):
         """
         Constructor
         :param spec_path: file path to the product spec json
         :param product_name: the name of the product to extract the concrete spec
         :param feature_list: the list of features that will be checked
+        :param spec_entries: optional, already loaded content of the product spec json;
+            if given, spec_path is not read
+        :param spec_index: optional ProductSpecIndex, e.g. shared by all products of a container;
+            if given, neither spec_path nor spec_entries are used
         """
-        self.product_specs = self._read(spec_path, product_name)
+        if spec_index is None:
+            if spec_entries is None:
+                spec_entries = self.load(spec_path)
+            spec_index = ProductSpecIndex(spec_entries)
+        self.spec_index = spec_index
+        self.product_name = product_name
         self.feature_list = feature_list
         self.errors_mandatory = []
         self.errors_never = []
@@ -25,16 +88,7 @@ class ProductSpecValidator(object):
         Checks that all "never" features are not contained
         :return: boolean
         """
-        for spec in self.product_specs:
-
-            for feature in spec.get('mandatory', []):
-                if feature.replace('__', '.') not in self.feature_list:
-                    self.errors_mandatory.append(feature)
-
-            for feature in spec.get('never', []):
-                if feature.replace('__', '.') in self.feature_list:
-                    self.errors_never.append(feature)
-
+        self.errors_mandatory, self.errors_never = self.spec_index.get_errors(self.product_name, self.feature_list)
         return not self.has_errors()
 
     def get_errors_mandatory(self):
@@ -58,16 +112,12 @@ class ProductSpecValidator(object):
         """
         return len(self.get_errors_mandatory()) > 0 or len(self.get_errors_never()) > 0
 
-    def _read(self, spec_path, product_name):
+    @staticmethod
+    def load(spec_path):
         """
-        Reads the spec files and extracts the concrete product spec.
+        Reads the spec file.
         :param spec_path:
-        :param product_name:
-        :return:
+        :return: list of spec entries
         """
-        matches = []
         with codecs.open(spec_path, 'r') as f:
-            for entry in json.loads(f.read()):
-                if product_name in entry.get('products'):
-                    matches.append(entry)
-        return matches
+            return json.loads(f.read())
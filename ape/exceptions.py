@@ -22,3 +22,11 @@ class InvalidAccess(Exception):
 
 class InvalidTask(Exception):
     pass
+
+
+class InvalidBatchScript(Exception):
+    pass
+
+
+class CyclicTaskDependency(Exception):
+    pass
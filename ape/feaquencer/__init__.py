@@ -1,2 +1,3 @@
 from .graph import *
 from .check_order import *
+from .query import *
@@ -1,11 +1,17 @@
 # coding: utf-8
 from __future__ import unicode_literals, print_function
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
-import copy
+import array
+import bisect
+import hashlib
+import heapq
+import json
+import os
+import pickle
+import tempfile
 
-from . import topsort
-from . import detect_cycle
+from . import find_cycles
 
 C_TYPES = (
     'first',
@@ -32,6 +38,23 @@ class MultipleLastConditionsError(Exception):
         self.occurences = [occ1, occ2]
 
 
+class CyclicDependencyError(Exception):
+    """
+    Raised if the ordering conditions contradict each other.
+    ``cycles`` contains the features of each cycle,
+    ``conflicts`` contains for each cycle the conflicting (feature, after feature) pairs.
+    """
+    def __init__(self, cycles, conflicts):
+        lines = ['Found cyclic ordering conditions:']
+        for cycle, cycle_conflicts in zip(cycles, conflicts):
+            lines.append('  cycle of %s' % ', '.join(cycle))
+            for feature, other in cycle_conflicts:
+                lines.append('    %s after %s' % (feature, other))
+        super(CyclicDependencyError, self).__init__('\n'.join(lines))
+        self.cycles = cycles
+        self.conflicts = conflicts
+
+
 class OrderingCondition(object):
     name = None
     subject = None
@@ -148,29 +171,493 @@ def _get_condition_instances(data):
     return conditions
 
 
-def get_total_order(feature_selection, feature_dependencies):
-    feature_set = set(feature_selection)
-    condition_list = _get_condition_instances(_get_formatted_feature_dependencies(feature_dependencies))
+def _get_ordering_conditions(feature_dependencies):
     oc = OrderingConditions()
-    for condition in condition_list:
+    for condition in _get_condition_instances(_get_formatted_feature_dependencies(feature_dependencies)):
         oc.add_condition(condition)
-    first = copy.deepcopy(oc.first)
-    last = copy.deepcopy(oc.last)
-    graph = copy.deepcopy(oc.before)
-    for feature in feature_selection:
-        if feature not in graph.keys():
-            graph[feature] = list()
-    for feature in graph.keys():
-        if first:
-            if feature != first:
-                graph[feature].append(first)
-        if last:
-            if feature != last:
-                graph[last].append(feature)
-    if not detect_cycle(graph):
-        total_order_with_too_many_features = reversed(topsort(graph))
-        total_order_with_selected_features = list()
-        for feature in total_order_with_too_many_features:
-            if feature in feature_set:
-                total_order_with_selected_features.append(feature)
-        return total_order_with_selected_features
+    return oc
+
+
+def _get_pruned_conditions(feature_dependencies, feature_selection):
+    """
+    Return the ordering conditions of the selected features and the features that have to come before them.
+    The conditions of all other features do not influence the order of the selection,
+    so they are not even parsed.
+    :param feature_dependencies: contents of a feature_order.json
+    :param feature_selection: list of features
+    :raises: MultipleFirstConditionsError, MultipleLastConditionsError
+    :return: OrderingConditions
+    """
+    firsts = [feature for feature, info in feature_dependencies.items() if info.get(FIRST, False)]
+    lasts = [feature for feature, info in feature_dependencies.items() if info.get(LAST, False)]
+    if len(firsts) > 1 or len(lasts) > 1:
+        # raises the error
+        return _get_ordering_conditions(feature_dependencies)
+    first = firsts[0] if firsts else None
+    last = lasts[0] if lasts else None
+
+    closure = set()
+    pending = list(feature_selection)
+    if first and feature_selection:
+        pending.append(first)
+    while pending:
+        feature = pending.pop()
+        if feature not in closure:
+            closure.add(feature)
+            if feature not in (first, last):
+                # the after conditions of the first and the last feature are ignored
+                pending.extend(feature_dependencies.get(feature, {}).get(AFTER, ()))
+
+    pruned = OrderingConditions()
+    pruned.first = first if first in closure else None
+    pruned.last = last if last in closure else None
+    for feature in sorted(closure):
+        if feature in (pruned.first, pruned.last):
+            pruned.before[feature] = list()
+        elif feature in feature_dependencies and feature_dependencies[feature].get(AFTER):
+            pruned.before[feature] = list(feature_dependencies[feature][AFTER])
+    return pruned
+
+
+def _check_cycles(oc, features=()):
+    """
+    Raises CyclicDependencyError if the ordering conditions contain a cycle.
+    The check includes the implicit conditions of the first and the last feature.
+    :param oc: OrderingConditions
+    :param features: additional features the implicit conditions apply to
+    :return: None
+    """
+    graph = dict((feature, list(others)) for feature, others in oc.before.items())
+    for feature in features:
+        graph.setdefault(feature, [])
+    for feature in list(graph):
+        if oc.first and feature != oc.first:
+            graph[feature].append(oc.first)
+        if oc.last and feature != oc.last:
+            graph[oc.last].append(feature)
+    cycles = find_cycles(graph)
+    if cycles:
+        conflicts = []
+        for cycle in cycles:
+            members = set(cycle)
+            conflicts.append([
+                (feature, other) for feature in cycle for other in graph[feature] if other in members
+            ])
+        raise CyclicDependencyError(cycles, conflicts)
+
+
+def _to_csr(adjacency):
+    """
+    :param adjacency: list of lists of node ids
+    :return: (offsets, targets) arrays
+    """
+    offsets = array.array(str('l'), [0])
+    targets = array.array(str('l'))
+    for node_targets in adjacency:
+        targets.extend(node_targets)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def _get_moved(previous_order, order):
+    """
+    Return the features of order that changed their relative order compared to previous_order:
+    all features except a longest sequence that keeps its order.
+    :param previous_order: list of features
+    :param order: list of the same features
+    :return: list of features in the order of order
+    """
+    positions = dict((feature, pos) for pos, feature in enumerate(previous_order))
+    sequence = [positions[feature] for feature in order]
+    # longest increasing subsequence: tails[k] is the index of the smallest end of a subsequence of length k + 1
+    tails = []
+    tail_values = []
+    links = [None] * len(sequence)
+    for idx, value in enumerate(sequence):
+        k = bisect.bisect_left(tail_values, value)
+        links[idx] = tails[k - 1] if k else None
+        if k == len(tails):
+            tails.append(idx)
+            tail_values.append(value)
+        else:
+            tails[k] = idx
+            tail_values[k] = value
+    kept = set()
+    idx = tails[-1] if tails else None
+    while idx is not None:
+        kept.add(idx)
+        idx = links[idx]
+    return [feature for idx, feature in enumerate(order) if idx not in kept]
+
+
+class CompiledFeatureOrder(object):
+    """
+    Feature order constraints compiled into an array-backed graph (CSR format)
+    that can order many feature selections.
+
+    Features are numbered by name. For feature ``i``, the features that have to come
+    after it are ``targets[offsets[i]:offsets[i + 1]]``, the features that have to come
+    before it are ``sources[source_offsets[i]:source_offsets[i + 1]]``.
+    Features with ordering conditions (``constrained``) come after the first and before
+    the last feature; when ordering, selected features are added to them.
+
+    Compiled orders can be stored using ``dump`` and loaded using ``load``.
+    """
+
+    VERSION = 2
+
+    def __init__(self, feature_dependencies):
+        """
+        :param feature_dependencies: contents of a feature_order.json or OrderingConditions
+        :raises: MultipleFirstConditionsError, MultipleLastConditionsError, CyclicDependencyError
+        """
+        if isinstance(feature_dependencies, OrderingConditions):
+            oc = feature_dependencies
+        else:
+            oc = _get_ordering_conditions(feature_dependencies)
+        if not (oc.first and oc.first == oc.last):
+            _check_cycles(oc)
+        self.conditions = oc
+
+        names = set(oc.before)
+        for others in oc.before.values():
+            names.update(others)
+        self.features = sorted(names)
+        self.ids = dict((feature, idx) for idx, feature in enumerate(self.features))
+        self.first = self.ids.get(oc.first)
+        self.last = self.ids.get(oc.last)
+
+        successors = [[] for _ in self.features]
+        for feature, others in oc.before.items():
+            node = self.ids[feature]
+            for other in others:
+                successors[self.ids[other]].append(node)
+            if self.first is not None and node != self.first:
+                successors[self.first].append(node)
+            if self.last is not None and node != self.last:
+                successors[node].append(self.last)
+
+        predecessors = [[] for _ in self.features]
+        for node, feature_targets in enumerate(successors):
+            for target in feature_targets:
+                predecessors[target].append(node)
+
+        self.constrained = array.array(str('b'), [feature in oc.before for feature in self.features])
+        self.offsets, self.targets = _to_csr(successors)
+        self.source_offsets, self.sources = _to_csr(predecessors)
+        self.indegree = array.array(str('l'), [len(sources) for sources in predecessors])
+
+    def get_total_order(self, feature_selection):
+        """
+        Order the given feature selection.
+
+        Among the features that may come next, the feature that comes first
+        in feature_selection is chosen; features that are not selected are
+        chosen last, by name. So the result is deterministic.
+        :param feature_selection: list of features
+        :raises: CyclicDependencyError
+        :return: list of the selected features in a valid order
+        """
+        count = len(self.features)
+        ids = self.ids
+        selection_index = {}
+        extra = []
+        for idx, feature in enumerate(feature_selection):
+            node = ids.get(feature)
+            if node is None:
+                if feature in extra:
+                    continue
+                node = count + len(extra)
+                extra.append(feature)
+            selection_index.setdefault(node, idx)
+
+        unconstrained = self._get_unconstrained(selection_index, feature_selection)
+
+        # only the selected features and the features that have to come before them are sorted;
+        # the last feature comes after all constrained features, but only the selected ones matter
+        closure = self._get_reachable(selection_index, unconstrained, forward=False, skip=self.last)
+        closure.update(selection_index)
+        indegree = {}
+        for node in closure:
+            if node == self.last:
+                # one edge from each constrained feature and from each unconstrained selected
+                # feature, a second one from the first feature (it is the first of all features)
+                indegree[node] = len(unconstrained) + (self.first not in (None, node) and self.first in closure) + sum(
+                    1 for other in closure if other < count and other != node and self.constrained[other]
+                )
+            elif node < count:
+                indegree[node] = self.indegree[node] + (node in unconstrained and self.first is not None)
+            else:
+                indegree[node] = int(self.first is not None)
+
+        no_index = len(feature_selection)
+        offsets = self.offsets
+        targets = self.targets
+        free_nodes = [(selection_index.get(node, no_index), node) for node, degree in indegree.items() if not degree]
+        heapq.heapify(free_nodes)
+
+        def release(node):
+            if node not in indegree:
+                return
+            indegree[node] -= 1
+            if not indegree[node]:
+                heapq.heappush(free_nodes, (selection_index.get(node, no_index), node))
+
+        order = []
+        while free_nodes:
+            node = heapq.heappop(free_nodes)[1]
+            if node in selection_index:
+                order.append(self.features[node] if node < count else extra[node - count])
+            if node < count:
+                for target in targets[offsets[node]:offsets[node + 1]]:
+                    release(target)
+            if node == self.first:
+                for target in unconstrained:
+                    release(target)
+            if node in unconstrained and self.last is not None:
+                release(self.last)
+        return order
+
+    def _get_unconstrained(self, nodes, feature_selection):
+        """
+        Selected features without ordering conditions only get the implicit ones:
+        they come after the first and before the last feature.
+        :param nodes: ids of the selected features
+        :param feature_selection: list of the selected features
+        :raises: CyclicDependencyError
+        :return: set of ids
+        """
+        count = len(self.features)
+        unconstrained = set(node for node in nodes if node >= count or not self.constrained[node])
+        unconstrained.discard(self.first)
+        unconstrained.discard(self.last)
+        if self.first is not None and self.first == self.last:
+            # every other feature is in a cycle with it: the cycles depend on the selection
+            _check_cycles(self.conditions, feature_selection)
+        return unconstrained
+
+    def _get_reachable(self, nodes, unconstrained, forward=True, skip=None):
+        """
+        Return the ids of the features that have to come after (forward)
+        or before (not forward) any of nodes.
+        :param nodes: ids of features
+        :param unconstrained: as returned by _get_unconstrained
+        :param forward: direction
+        :param skip: optional id of a feature whose neighbours are not followed
+        :return: set of ids
+        """
+        count = len(self.features)
+        if forward:
+            offsets, targets, start, end = self.offsets, self.targets, self.first, self.last
+        else:
+            offsets, targets, start, end = self.source_offsets, self.sources, self.last, self.first
+        reachable = set()
+        pending = list(nodes)
+        while pending:
+            current = pending.pop()
+            if current == skip:
+                continue
+            neighbours = list(targets[offsets[current]:offsets[current + 1]]) if current < count else []
+            if current == start:
+                neighbours.extend(unconstrained)
+            if current in unconstrained and end is not None:
+                neighbours.append(end)
+            for neighbour in neighbours:
+                if neighbour not in reachable:
+                    reachable.add(neighbour)
+                    pending.append(neighbour)
+        return reachable
+
+    def is_valid_order(self, order):
+        """
+        Check whether order satisfies the ordering conditions between its features
+        (like validators.FeatureOrderValidator does), including the implicit
+        conditions of the first and the last feature.
+        :param order: list of features
+        :return: boolean
+        """
+        positions = {}
+        for pos, feature in enumerate(order):
+            node = self.ids.get(feature)
+            if node is not None:
+                positions.setdefault(node, pos)
+        if self.first in positions and positions[self.first] != 0:
+            return False
+        if self.last in positions and positions[self.last] != len(order) - 1:
+            return False
+        for node, pos in positions.items():
+            for target in self.targets[self.offsets[node]:self.offsets[node + 1]]:
+                if positions.get(target, pos) < pos:
+                    return False
+        return True
+
+    def update_order(self, previous_order, added=(), removed=()):
+        """
+        Repair a total order after features were added to or removed from the selection,
+        changing as few positions as possible.
+
+        Removed features are dropped. An added feature is inserted right before the first
+        feature that has to come after it. If the previous order has such a feature in front
+        of a feature that has to come before the added one, only this region is reordered
+        (dynamic topological sort of Pearce and Kelly): the features of the region that have
+        to come before the added feature are moved in front of it, the features that have to
+        come after it are moved behind it; all other features keep their positions.
+        If the previous order itself violates the ordering conditions, the whole selection is
+        ordered again with get_total_order.
+        :param previous_order: total order of the previous selection, e.g. as returned by get_total_order
+        :param added: features to add
+        :param removed: features to remove
+        :raises: CyclicDependencyError
+        :return: (order, moved): the new order and the list of features of previous_order that
+            changed their relative order (empty if the features were only inserted or dropped)
+        """
+        removed = set(removed)
+        order = []
+        for feature in previous_order:
+            if feature not in removed:
+                order.append(feature)
+                removed.add(feature)
+        added = [feature for feature in added if feature not in order]
+        selection = order + [feature for idx, feature in enumerate(added) if feature not in added[:idx]]
+        if not self.is_valid_order(order):
+            repaired = self.get_total_order(selection)
+            kept = set(order)
+            return repaired, _get_moved(order, [feature for feature in repaired if feature in kept])
+
+        count = len(self.features)
+        nodes = {}
+        for feature in selection:
+            if feature not in nodes:
+                nodes[feature] = self.ids.get(feature, count + len(nodes))
+        unconstrained = self._get_unconstrained(nodes.values(), selection)
+
+        moved = set()
+        for feature in selection[len(order):]:
+            node = nodes[feature]
+            before = self._get_reachable([node], unconstrained, forward=False)
+            after = self._get_reachable([node], unconstrained)
+            positions = [pos for pos, other in enumerate(order) if nodes[other] in before]
+            lower = max(positions) if positions else -1
+            positions = [pos for pos, other in enumerate(order) if nodes[other] in after]
+            upper = min(positions) if positions else len(order)
+            if lower < upper:
+                order.insert(upper, feature)
+                continue
+
+            region = order[upper:lower + 1]
+            backward = [other for other in region if nodes[other] in before]
+            forward = [other for other in region if nodes[other] in after]
+            slots = sorted(upper + region.index(other) for other in backward + forward)
+            sequence = backward + [feature] + forward
+            for slot, other in zip(slots, sequence):
+                order[slot] = other
+            order.insert(slots[-1] + 1, sequence[-1])
+            moved.update(backward + forward)
+        return order, [feature for feature in order if feature in moved]
+
+    def dump(self, path):
+        """
+        Store the compiled order at path.
+        :param path:
+        :return: None
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(self, f, 2)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a compiled order stored with dump.
+        :param path:
+        :return: CompiledFeatureOrder
+        :raises: ValueError if the file does not contain a compiled order of this version
+        """
+        with open(path, 'rb') as f:
+            compiled = pickle.load(f)
+        if not isinstance(compiled, cls) or getattr(compiled, 'version', None) != cls.VERSION:
+            raise ValueError('%s does not contain a compiled feature order' % path)
+        return compiled
+
+    @classmethod
+    def from_file(cls, path, cache_dir=None):
+        """
+        Compile the feature_order.json at path.
+        If cache_dir is given, the compiled order is stored there and reused
+        as long as the content of the file does not change.
+        :param path: path of the feature_order.json
+        :param cache_dir: optional directory to keep compiled orders in
+        :return: CompiledFeatureOrder
+        """
+        with open(path, 'rb') as f:
+            return cls.from_content(f.read(), cache_dir=cache_dir)
+
+    @classmethod
+    def from_content(cls, content, cache_dir=None, feature_dependencies=None):
+        """
+        Compile the content of a feature_order.json, see from_file.
+        :param content: content of the feature_order.json (bytes)
+        :param cache_dir: optional directory to keep compiled orders in
+        :param feature_dependencies: optional, the already parsed content
+        :return: CompiledFeatureOrder
+        """
+        cache_path = None
+        if cache_dir:
+            cache_path = os.path.join(cache_dir, 'feature-order-%s.pickle' % hashlib.sha1(content).hexdigest())
+            try:
+                return cls.load(cache_path)
+            except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+                pass
+        if feature_dependencies is None:
+            feature_dependencies = json.loads(content.decode('utf-8'))
+        compiled = cls(feature_dependencies)
+        if cache_path:
+            try:
+                compiled.dump(cache_path)
+            except (IOError, OSError):
+                pass
+        return compiled
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['version'] = self.VERSION
+        # ids can be derived from features
+        del state['ids']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.ids = dict((feature, idx) for idx, feature in enumerate(self.features))
+
+
+def get_total_order(feature_selection, feature_dependencies):
+    """
+    Order the feature selection according to the feature dependencies.
+    Only the conditions of the selected features and the features that have to come before them
+    are compiled and checked for cycles.
+    Use CompiledFeatureOrder to order many selections with the same dependencies.
+    :param feature_selection: list of features
+    :param feature_dependencies: contents of a feature_order.json
+    :raises: MultipleFirstConditionsError, MultipleLastConditionsError, CyclicDependencyError
+    :return: list of the selected features in a valid order
+    """
+    oc = _get_pruned_conditions(feature_dependencies, feature_selection)
+    return CompiledFeatureOrder(oc).get_total_order(feature_selection)
+
+
+def get_feature_graph(feature_dependencies):
+    """
+    Return the graph of the after conditions in feature_dependencies:
+    an edge a -> b means that b has to come after a.
+    The implicit conditions of the first and the last feature are not included.
+    :param feature_dependencies: contents of a feature_order.json
+    :return: OrderedDict mapping each feature to the features that have to come after it, sorted by name
+    """
+    graph = {}
+    for feature, info in feature_dependencies.items():
+        graph.setdefault(feature, [])
+        for other in info.get(AFTER, ()):
+            graph.setdefault(other, []).append(feature)
+    return OrderedDict((feature, sorted(graph[feature])) for feature in sorted(graph))
@@ -1,45 +1,243 @@
-from collections import defaultdict
+from __future__ import unicode_literals
+import heapq
+import io
+import json
+from collections import defaultdict, deque, OrderedDict
+from xml.sax.saxutils import quoteattr
+
+GRAPH_FORMATS = ('dot', 'graphml', 'json')
+
+
+def _quote_dot(name):
+    return '"%s"' % name.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def write_graphviz(graph, stream):
+    """
+    Write graph to stream in the DOT format of graphviz.
+    Node by node is written, so nothing but the current line is kept in memory.
+    :param graph: dict mapping nodes to lists of target nodes
+    :param stream: file like object
+    :return: None
+    """
+    stream.write('digraph g {\n')
+    for node in graph:
+        quoted = _quote_dot(node)
+        stream.write('  %s;\n' % quoted)
+        for target in graph[node]:
+            stream.write('  %s -> %s;\n' % (quoted, _quote_dot(target)))
+    stream.write('}\n')
+
+
+def write_graphml(graph, stream):
+    """
+    Write graph to stream as GraphML.
+    All targets need to be nodes of graph.
+    :param graph: dict mapping nodes to lists of target nodes
+    :param stream: file like object
+    :return: None
+    """
+    stream.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+        '  <graph id="g" edgedefault="directed">\n'
+    )
+    for node in graph:
+        stream.write('    <node id=%s/>\n' % quoteattr(node))
+    for node in graph:
+        source = quoteattr(node)
+        for target in graph[node]:
+            stream.write('    <edge source=%s target=%s/>\n' % (source, quoteattr(target)))
+    stream.write('  </graph>\n</graphml>\n')
+
+
+def write_json(graph, stream):
+    """
+    Write graph to stream as JSON object mapping each node to the list of its targets.
+    :param graph: dict mapping nodes to lists of target nodes
+    :param stream: file like object
+    :return: None
+    """
+    separator = '\n'
+    stream.write('{')
+    for node in graph:
+        stream.write('%s  %s: %s' % (separator, json.dumps(node), json.dumps(list(graph[node]))))
+        separator = ',\n'
+    stream.write('\n}\n')
+
+
+def write_graph(graph, stream, graph_format='dot'):
+    """
+    Write graph to stream.
+    :param graph: dict mapping nodes to lists of target nodes
+    :param stream: file like object
+    :param graph_format: one of GRAPH_FORMATS
+    :return: None
+    """
+    writers = dict(dot=write_graphviz, graphml=write_graphml, json=write_json)
+    if graph_format not in writers:
+        raise ValueError('graph format must be one of: %s' % ', '.join(GRAPH_FORMATS))
+    writers[graph_format](graph, stream)
 
 
 def to_graphviz(graph):
     """
+    Return graph in the DOT format of graphviz.
+    Use write_graphviz to write large graphs to a file.
+    :param graph: dict mapping nodes to lists of target nodes
+    :return: string
+    """
+    stream = io.StringIO()
+    write_graphviz(graph, stream)
+    return stream.getvalue()
 
-    :param graph:
-    :return:
+
+def get_subgraph(graph, nodes):
+    """
+    Return the subgraph of graph induced by nodes.
+    :param graph: dict mapping nodes to lists of target nodes
+    :param nodes: set of nodes
+    :return: OrderedDict mapping nodes to lists of target nodes, in the order of graph
     """
-    ret = ['digraph g {']
-    vertices = []
+    return OrderedDict(
+        (node, [target for target in graph[node] if target in nodes])
+        for node in graph if node in nodes
+    )
 
-    node_ids = dict([(name, 'node' + idx) for (idx, name) in enumerate(list(graph))])
 
-    for node in list(graph):
-        ret.append('  "%s" [label="%s"];' % (node_ids[node], node))
+def get_reversed_graph(graph):
+    """
+    Return graph with all edges reversed.
+    :param graph: dict mapping nodes to lists of target nodes
+    :return: dict mapping nodes to lists of source nodes
+    """
+    reversed_graph = dict((node, []) for node in graph)
+    for node in graph:
         for target in graph[node]:
-            vertices.append('  "%s" -> "%s";' % (node_ids[node], node_ids[target]))
+            reversed_graph.setdefault(target, []).append(node)
+    return reversed_graph
+
+
+def get_reachable(graph, nodes, depth=None):
+    """
+    Return the nodes reachable from nodes (including nodes).
+    :param graph: dict mapping nodes to lists of target nodes
+    :param nodes: iterable of start nodes
+    :param depth: optional maximum number of edges to follow
+    :return: set of nodes
+    """
+    reachable = set(nodes)
+    current = list(reachable)
+    distance = 0
+    while current and (depth is None or distance < depth):
+        following = []
+        for node in current:
+            for target in graph.get(node, ()):
+                if target not in reachable:
+                    reachable.add(target)
+                    following.append(target)
+        current = following
+        distance += 1
+    return reachable
+
+
+def get_neighborhood(graph, node, depth=1):
+    """
+    Return the nodes connected to node by a path of at most depth edges, in any direction.
+    :param graph: dict mapping nodes to lists of target nodes
+    :param node: the center node
+    :param depth: maximum number of edges
+    :return: set of nodes
+    """
+    reversed_graph = get_reversed_graph(graph)
+    undirected = dict(
+        (other, list(graph.get(other, ())) + reversed_graph.get(other, []))
+        for other in reversed_graph
+    )
+    return get_reachable(undirected, [node], depth)
+
+
+def find_cycles(graph):
+    """
+    search the given directed graph for all cycles
 
-    ret += vertices
-    ret.append('}')
-    return '\n'.join(ret)
+    Uses an iterative version of Tarjan's algorithm for strongly connected components,
+    so it runs in O(V+E) and does not recurse.
+    Returns the list of strongly connected components that contain a cycle
+    (more than one node or a node with a reflexive vertex).
+    Each component is a list of nodes in the order they were discovered.
+    :param graph:
+    :return:
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    cycles = []
+
+    for root in list(graph):
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root, ())))]
+        while work:
+            node, targets = work[-1]
+            for target in targets:
+                if target not in index:
+                    # descend into target, continue with the remaining targets of node later
+                    index[target] = lowlink[target] = len(index)
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(graph.get(target, ()))))
+                    break
+                elif target in on_stack:
+                    lowlink[node] = min(lowlink[node], index[target])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in graph.get(node, ()):
+                        cycles.append(list(reversed(component)))
+    return cycles
 
 
-def _dfs_cycle_detect(graph, node, path, visited_nodes):
+def _get_cycle_path(graph, component, start):
     """
-    search graph for cycle using DFS continuing from node
-    path contains the list of visited nodes currently on the stack
-    visited_nodes is the set of already visited nodes
+    find a shortest path from start back to start within component
+    using breadth first search
     :param graph:
-    :param node:
-    :param path:
-    :param visited_nodes:
+    :param component: strongly connected component containing start
+    :param start:
     :return:
     """
-    visited_nodes.add(node)
-    for target in graph[node]:
-        if target in path:
-            # cycle found => return current path
-            return path + [target]
-        else:
-            return _dfs_cycle_detect(graph, target, path + [target], visited_nodes)
+    members = set(component)
+    predecessors = {}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        for target in graph.get(node, ()):
+            if target == start:
+                path = [start]
+                while node != start:
+                    path.append(node)
+                    node = predecessors[node]
+                path.append(start)
+                path.reverse()
+                return path
+            if target in members and target not in predecessors:
+                predecessors[target] = node
+                queue.append(target)
     return None
 
 
@@ -49,43 +247,53 @@ def detect_cycle(graph):
 
     returns None if the given graph is cycle free
     otherwise it returns a path through the graph that contains a cycle
+    (starting at the first node of the graph that is part of a cycle).
+    Use find_cycles to get all cycles.
     :param graph:
     :return:
     """
 
-    visited_nodes = set()
-
+    components = dict((node, component) for component in find_cycles(graph) for node in component)
     for node in list(graph):
-        if node not in visited_nodes:
-            cycle = _dfs_cycle_detect(graph, node, [node], visited_nodes)
-            if cycle:
-                return cycle
+        if node in components:
+            return _get_cycle_path(graph, components[node], node)
     return None
 
 
-def topsort(graph):
-    """
-    For the given graph, returns a list of nodes in topological order
-    In py3 the behaviour of this function differs from py2,
-    the resulting order will change with every execution in py3
-    while in py2 the order stays the same
-    :param graph:
-    :return:
+def topsort(graph, key=None):
     """
+    For the given graph, returns a list of nodes in topological order:
+    each node comes before all of its targets.
+
+    Among the nodes that are ready at the same time, the node with the smallest key
+    comes first (a heap is used, so this takes O((V+E) log V)).
+    key defaults to the node itself; ties between equal keys are broken by the
+    iteration order of graph. So with unique keys, the result only depends on
+    the nodes and edges of the graph, not on the order of dict iteration:
+    it is the same in every run and on every python version.
 
+    Nodes that are part of a cycle (and nodes reachable from them) are left out.
+    :param graph: dict mapping nodes to lists of target nodes
+    :param key: optional function returning the priority of a node
+    :return: list of nodes
+    """
+    key = key or (lambda node: node)
     count = defaultdict(int)
-    for feature, node in graph.items():
-        for target in node:
+    sequence = {}
+    for node in graph:
+        sequence.setdefault(node, len(sequence))
+        for target in graph[node]:
             count[target] += 1
-    # convert for list is necessary for py3 as in py3 the filter
-    # function creates a filter object, in py2 it returns a list
-    free_nodes = list(filter(lambda x: count[x] == 0, graph))
+            sequence.setdefault(target, len(sequence))
+
+    free_nodes = [(key(node), sequence[node], node) for node in sequence if count[node] == 0]
+    heapq.heapify(free_nodes)
     result = []
     while free_nodes:
-        node = free_nodes.pop()
+        node = heapq.heappop(free_nodes)[2]
         result.append(node)
-        for target in graph[node]:
+        for target in graph.get(node, ()):
             count[target] -= 1
             if count[target] == 0:
-                free_nodes.append(target)
+                heapq.heappush(free_nodes, (key(target), sequence[target], target))
     return result
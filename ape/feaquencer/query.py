@@ -0,0 +1,224 @@
+# coding: utf-8
+"""
+Queries about feature order decisions, answered from a CompiledFeatureOrder.
+
+For each feature, the sets of features that have to come before and after it
+(directly or through a chain of constraints) are precomputed as bitsets
+(python ints, bit ``i`` stands for the feature with id ``i``), so checking
+whether two features are ordered takes constant time and explanations only
+search the relevant part of the graph.
+"""
+from __future__ import unicode_literals, print_function
+from collections import deque
+from .check_order import CompiledFeatureOrder, OrderingConditions, _check_cycles
+
+__all__ = ['FeatureOrderQuery', 'UnknownFeatureError', 'UnknownConstraintError']
+
+# reasons of the constraints between two features
+AFTER = 'after'
+FIRST = 'first'
+LAST = 'last'
+
+
+class UnknownFeatureError(Exception):
+    pass
+
+
+class UnknownConstraintError(Exception):
+    pass
+
+
+def _iter_bits(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class FeatureOrderQuery(object):
+    """
+    Answers questions like "why does A come before B" or
+    "what happens if the constraint A after B is dropped".
+    Only the explicit and the implicit (first and last feature) conditions of
+    feature_order.json are considered: features without conditions are not part of the graph.
+    """
+
+    def __init__(self, compiled):
+        """
+        :param compiled: CompiledFeatureOrder or contents of a feature_order.json
+        :raises: CyclicDependencyError
+        """
+        if not isinstance(compiled, CompiledFeatureOrder):
+            compiled = CompiledFeatureOrder(compiled)
+        self.compiled = compiled
+        count = len(compiled.features)
+        offsets, targets = compiled.offsets, compiled.targets
+        source_offsets, sources = compiled.source_offsets, compiled.sources
+
+        # topological order of all features
+        indegree = compiled.indegree.tolist()
+        order = [node for node in range(count) if not indegree[node]]
+        for node in order:
+            for target in targets[offsets[node]:offsets[node + 1]]:
+                indegree[target] -= 1
+                if not indegree[target]:
+                    order.append(target)
+        if len(order) != count:
+            _check_cycles(compiled.conditions, compiled.features)
+        self.rank = dict((node, idx) for idx, node in enumerate(order))
+
+        self.after = [0] * count
+        for node in reversed(order):
+            bits = 0
+            for target in targets[offsets[node]:offsets[node + 1]]:
+                bits |= self.after[target] | (1 << target)
+            self.after[node] = bits
+        self.before = [0] * count
+        for node in order:
+            bits = 0
+            for source in sources[source_offsets[node]:source_offsets[node + 1]]:
+                bits |= self.before[source] | (1 << source)
+            self.before[node] = bits
+
+    def _get_id(self, feature):
+        try:
+            return self.compiled.ids[feature]
+        except KeyError:
+            raise UnknownFeatureError('No feature order conditions for feature %s' % feature)
+
+    def _get_features(self, bits):
+        return sorted(self.compiled.features[node] for node in _iter_bits(bits))
+
+    def is_before(self, feature, other):
+        """
+        :return: True if feature has to come before other
+        """
+        return bool(self.after[self._get_id(feature)] >> self._get_id(other) & 1)
+
+    def get_after(self, feature):
+        """
+        :return: sorted list of the features that have to come after feature
+        """
+        return self._get_features(self.after[self._get_id(feature)])
+
+    def get_before(self, feature):
+        """
+        :return: sorted list of the features that have to come before feature
+        """
+        return self._get_features(self.before[self._get_id(feature)])
+
+    def get_path(self, feature, other):
+        """
+        Return a shortest chain of constraints putting feature before other.
+        :param feature:
+        :param other:
+        :return: list of features from feature to other or None if feature does not have to come before other
+        """
+        start, end = self._get_id(feature), self._get_id(other)
+        if not self.after[start] >> end & 1:
+            return None
+        compiled = self.compiled
+        predecessors = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for target in compiled.targets[compiled.offsets[node]:compiled.offsets[node + 1]]:
+                # only follow features leading to other
+                if target in predecessors or (target != end and not self.after[target] >> end & 1):
+                    continue
+                predecessors[target] = node
+                if target == end:
+                    path = []
+                    while target is not None:
+                        path.append(compiled.features[target])
+                        target = predecessors[target]
+                    return path[::-1]
+                queue.append(target)
+
+    def explain(self, feature, other):
+        """
+        Explain why feature has to come before other.
+        :param feature:
+        :param other:
+        :return: list of (earlier feature, later feature, reason) tuples along a shortest chain of constraints;
+            reason is "after" for conditions of the later feature, "first" or "last" for the implicit conditions of the
+            first or the last feature. None if feature does not have to come before other.
+        """
+        path = self.get_path(feature, other)
+        if path is None:
+            return None
+        conditions = self.compiled.conditions
+        steps = []
+        for earlier, later in zip(path, path[1:]):
+            if earlier in conditions.before.get(later, ()):
+                reason = AFTER
+            elif earlier == conditions.first:
+                reason = FIRST
+            else:
+                reason = LAST
+            steps.append((earlier, later, reason))
+        return steps
+
+    def get_impact(self, feature, after):
+        """
+        Return the pairs of features that would no longer be ordered if the constraint
+        "feature after <after>" was dropped.
+        Only the features that have to come before <after> are recomputed.
+        :param feature:
+        :param after:
+        :raises: UnknownConstraintError if there is no such constraint
+        :return: list of (feature, list of features that would no longer have to come after it)
+        """
+        node, subject = self._get_id(feature), self._get_id(after)
+        explicit = list(self.compiled.conditions.before.get(feature, ())).count(after)
+        if not explicit:
+            raise UnknownConstraintError('There is no constraint %s after %s' % (feature, after))
+
+        compiled = self.compiled
+        new_after = {}
+        affected = [source for source in _iter_bits(self.before[subject])] + [subject]
+        for source in sorted(affected, key=self.rank.get, reverse=True):
+            skip = explicit if source == subject else 0
+            bits = 0
+            for target in compiled.targets[compiled.offsets[source]:compiled.offsets[source + 1]]:
+                if target == node and skip:
+                    skip -= 1
+                    continue
+                bits |= new_after.get(target, self.after[target]) | (1 << target)
+            new_after[source] = bits
+
+        impact = []
+        for source in sorted(new_after, key=lambda source: compiled.features[source]):
+            lost = self.after[source] & ~new_after[source]
+            if lost:
+                impact.append((compiled.features[source], self._get_features(lost)))
+        return impact
+
+    def get_moved(self, feature, after, feature_selection):
+        """
+        Return the features of feature_selection that would change their position in the total order
+        if the constraint "feature after <after>" was dropped.
+        :param feature:
+        :param after:
+        :param feature_selection: list of features
+        :raises: UnknownConstraintError if there is no such constraint
+        :return: (order, new order, list of moved features)
+        """
+        conditions = self.compiled.conditions
+        if after not in conditions.before.get(feature, ()):
+            raise UnknownConstraintError('There is no constraint %s after %s' % (feature, after))
+        dropped = OrderingConditions()
+        dropped.first = conditions.first
+        dropped.last = conditions.last
+        for other, others in conditions.before.items():
+            if other == feature:
+                others = [subject for subject in others if subject != after]
+                if not others and feature not in (conditions.first, conditions.last):
+                    # no conditions left
+                    continue
+            dropped.before[other] = list(others)
+
+        order = self.compiled.get_total_order(feature_selection)
+        new_order = CompiledFeatureOrder(dropped).get_total_order(feature_selection)
+        moved = [other for idx, other in enumerate(new_order) if order[idx] != other]
+        return order, new_order, moved
@@ -0,0 +1,161 @@
+"""
+Location, version and git state of the features of a product.
+
+Features are grouped by the git repository they live in, so each repository
+is queried only once (sub-features share the repository of their parent),
+and the repositories are queried concurrently in a pool of threads.
+Git metadata is memoized by ``ape.gitmeta``.
+"""
+from __future__ import print_function, unicode_literals
+import importlib
+import json
+import os
+from multiprocessing.pool import ThreadPool
+from . import gitmeta
+
+OUTPUT_FORMATS = ('text', 'table', 'json')
+
+VERSION_UNKNOWN = ('unable to determine version:'
+                   ' please add __version__ or get_version()'
+                   ' to this feature module!')
+
+
+def guess_version(feature_module):
+    """
+    :return: version of the feature module or None
+    """
+    if hasattr(feature_module, '__version__'):
+        return feature_module.__version__
+    if hasattr(feature_module, 'get_version'):
+        return feature_module.get_version()
+
+
+def _get_module_info(featurename):
+    info = dict(
+        name=featurename,
+        subfeature='.features.' in featurename,
+        location=None,
+        version=None,
+        repository=None,
+        rev=None,
+        changes=[],
+        error=None,
+    )
+    try:
+        feature_module = importlib.import_module(featurename)
+    except ImportError:
+        info['error'] = 'unable to import feature "%s"' % featurename
+        return info
+    info['location'] = os.path.dirname(feature_module.__file__)
+    if not info['subfeature']:
+        version = guess_version(feature_module)
+        info['version'] = None if version is None else str(version)
+    return info
+
+
+def _query_repository(root):
+    return root, gitmeta.get_head_rev(root), gitmeta.get_changed_files(root)
+
+
+def get_feature_infos(featurenames, jobs=8):
+    """
+    Collect location, version and git state of features.
+    :param featurenames: list of feature names
+    :param jobs: number of repositories queried at the same time
+    :return: list of dicts (name, subfeature, location, version, repository, rev, changes, error)
+        in the order of featurenames; version and git state are only set for top-level features,
+        version is None if the feature module does not declare it
+    """
+    infos = [_get_module_info(featurename) for featurename in featurenames]
+
+    repositories = {}
+    for info in infos:
+        if info['location'] is None or info['subfeature']:
+            continue
+        repository = gitmeta.find_repository(info['location'])
+        if repository is not None:
+            info['repository'] = repository[0]
+            repositories.setdefault(repository[0], []).append(info)
+
+    roots = sorted(repositories)
+    if jobs == 1 or len(roots) < 2:
+        results = [_query_repository(root) for root in roots]
+    else:
+        pool = ThreadPool(min(jobs, len(roots)))
+        try:
+            results = pool.map(_query_repository, roots)
+        finally:
+            pool.close()
+            pool.join()
+
+    for root, rev, changes in results:
+        for info in repositories[root]:
+            info['rev'] = rev
+            info['changes'] = changes
+    return infos
+
+
+def print_text(info):
+    """
+    Print the info of a single feature as explain_feature does.
+    :param info: as returned by get_feature_infos
+    """
+    print()
+    print(info['name'])
+    print('-' * 60)
+    print()
+    if info['error']:
+        print('Error: %s' % info['error'])
+        return
+    print('Location: %s' % info['location'])
+    print()
+    if info['subfeature']:
+        print('Version: see parent feature')
+        print()
+    else:
+        print('Version: %s' % (info['version'] or VERSION_UNKNOWN))
+        print()
+        print('git: %s' % (info['rev'] or '-'))
+        print()
+        print('git changed: %s' % '\n\t\t'.join(info['changes'] or ['-']))
+
+
+def print_table(infos):
+    """
+    Print one line per feature.
+    :param infos: as returned by get_feature_infos
+    """
+    rows = [('feature', 'version', 'git', 'changed', 'location')]
+    for info in infos:
+        if info['error']:
+            rows.append((info['name'], info['error'], '', '', ''))
+        elif info['subfeature']:
+            rows.append((info['name'], '(parent)', '', '', info['location']))
+        else:
+            rows.append((
+                info['name'],
+                info['version'] or '?',
+                (info['rev'] or '-')[:10],
+                str(len(info['changes'])) if info['repository'] else '-',
+                info['location'],
+            ))
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]) - 1)]
+    for row in rows:
+        print('  '.join([cell.ljust(width) for cell, width in zip(row, widths)] + [row[-1]]).rstrip())
+
+
+def print_infos(infos, output_format='text'):
+    """
+    Print the infos in one of OUTPUT_FORMATS.
+    :param infos: as returned by get_feature_infos
+    :param output_format: text, table or json
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError('output format must be one of: %s' % ', '.join(OUTPUT_FORMATS))
+    if output_format == 'json':
+        print(json.dumps(infos, indent=2))
+    elif output_format == 'table':
+        print_table(infos)
+    else:
+        for info in infos:
+            print_text(info)
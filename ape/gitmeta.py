@@ -0,0 +1,187 @@
+"""
+Memoized git metadata of the repositories ape works with.
+
+Remote urls, HEAD revisions and changed files are looked up once per
+repository and kept in memory until one of the files git changes when
+they change (``HEAD``, ``index``, ``config``, the checked out ref and
+``packed-refs``) is modified.
+Changes to the working tree do not touch any of these files, so the list of
+changed files is additionally looked up again after ``CHANGES_TTL`` seconds.
+"""
+from __future__ import unicode_literals
+import os
+import subprocess
+import threading
+import time
+
+# seconds the list of changed files is reused
+CHANGES_TTL = 5
+
+# git dir -> dict(stamp=..., values=dict(key=(value, time)))
+_cache = {}
+_lock = threading.Lock()
+
+
+class GitError(Exception):
+    pass
+
+
+def find_repository(path, search_parent_directories=True):
+    """
+    Return the repository containing path.
+    :param path: a directory
+    :param search_parent_directories: if False, path must be the root of the working tree
+    :return: (path of the working tree, path of the git dir) or None if path is not inside a git repository
+    """
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return path, dot_git
+        if os.path.isfile(dot_git):
+            # worktrees and submodules: .git is a file pointing to the git dir
+            with open(dot_git) as f:
+                content = f.read().strip()
+            if content.startswith('gitdir:'):
+                return path, os.path.normpath(os.path.join(path, content[len('gitdir:'):].strip()))
+        parent = os.path.dirname(path)
+        if not search_parent_directories or parent == path:
+            return None
+        path = parent
+
+
+def _get_mtime(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size
+
+
+def _get_stamp(git_dir):
+    """
+    :return: tuple identifying the state of the metadata files of the repository
+    """
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, 'commondir')
+    if os.path.isfile(commondir_file):
+        with open(commondir_file) as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+
+    paths = [
+        os.path.join(git_dir, 'HEAD'),
+        os.path.join(git_dir, 'index'),
+        os.path.join(common_dir, 'config'),
+        os.path.join(common_dir, 'packed-refs'),
+    ]
+    try:
+        with open(paths[0]) as f:
+            head = f.read().strip()
+    except (IOError, OSError):
+        head = ''
+    if head.startswith('ref:'):
+        ref = head[len('ref:'):].strip()
+        paths.extend([os.path.join(git_dir, ref), os.path.join(common_dir, ref)])
+    return tuple([head] + [_get_mtime(path) for path in paths])
+
+
+def _run_git(work_tree, args):
+    """
+    :return: (exit code, stripped stdout)
+    """
+    process = subprocess.Popen(
+        ['git'] + list(args),
+        cwd=work_tree,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    stdout = process.communicate()[0]
+    return process.returncode, stdout.decode('utf-8', 'replace').strip()
+
+
+def _get_cached(repository, key, compute, ttl=None):
+    """
+    Return the cached value of key for the repository or compute and cache it.
+    """
+    git_dir = repository[1]
+    stamp = _get_stamp(git_dir)
+    now = time.time()
+    with _lock:
+        entry = _cache.get(git_dir)
+        if entry is None or entry['stamp'] != stamp:
+            entry = _cache[git_dir] = dict(stamp=stamp, values={})
+        if key in entry['values']:
+            value, created = entry['values'][key]
+            if ttl is None or now - created < ttl:
+                return value
+
+    value = compute()
+    with _lock:
+        entry['values'][key] = (value, now)
+    return value
+
+
+def clear_cache():
+    """
+    Forget all memoized metadata.
+    """
+    with _lock:
+        _cache.clear()
+
+
+def get_remote_url(path, remote='origin', search_parent_directories=True):
+    """
+    Return the url of a remote of the repository containing path.
+    :param path: a directory
+    :param remote: name of the remote
+    :param search_parent_directories: if False, path must be the root of the working tree
+    :raises: GitError if path is not inside a git repository or the remote does not exist
+    :return: string
+    """
+    repository = find_repository(path, search_parent_directories)
+    if repository is None:
+        raise GitError('%s is not a git repository' % path)
+
+    def compute():
+        returncode, stdout = _run_git(repository[0], ['config', '--get', 'remote.%s.url' % remote])
+        return stdout if returncode == 0 else None
+
+    url = _get_cached(repository, ('remote', remote), compute)
+    if url is None:
+        raise GitError('%s has no remote named %s' % (repository[0], remote))
+    return url
+
+
+def get_head_rev(path):
+    """
+    Return the revision checked out in the repository containing path.
+    :param path: a directory
+    :return: string or None if path is not inside a git repository or there are no commits
+    """
+    repository = find_repository(path)
+    if repository is None:
+        return None
+
+    def compute():
+        returncode, stdout = _run_git(repository[0], ['rev-parse', 'HEAD'])
+        return stdout if returncode == 0 else None
+
+    return _get_cached(repository, 'head', compute)
+
+
+def get_changed_files(path):
+    """
+    Return the files with unstaged changes in the repository containing path.
+    :param path: a directory
+    :return: list of paths relative to the root of the working tree;
+        empty if path is not inside a git repository
+    """
+    repository = find_repository(path)
+    if repository is None:
+        return []
+
+    def compute():
+        returncode, stdout = _run_git(repository[0], ['diff', '--name-only'])
+        return stdout.splitlines() if returncode == 0 and stdout else []
+
+    return list(_get_cached(repository, 'changes', compute, ttl=CHANGES_TTL))
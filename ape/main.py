@@ -1,13 +1,12 @@
 from __future__ import print_function
 import argparse
-import inspect
 import importlib
 import sys
 import os
 import traceback
 from featuremonkey import get_features_from_equation_file
 from ape.exceptions import TaskNotFound, FeatureNotFound, EnvironmentIncomplete, InvalidTask
-from ape import tasks
+from ape import tasks, getargspec
 
 
 ERRMSG_UNSUPPORTED_SIG = '''Task "%s" has an unsupported signature.
@@ -18,7 +17,7 @@ Supported signatures are:
 '''
 
 
-def get_task_parser(task):
+def get_task_parser(task, flags=None):
     """
     Construct an ArgumentParser for the given task.
 
@@ -26,8 +25,12 @@ def get_task_parser(task):
     If task accepts varargs only, proxy_args is True.
     If task accepts only positional and explicit keyword args,
     proxy args is False.
+
+    :param flags: optional dict mapping keyword args to flag names, see ``ape.Tasks.register``;
+        passing ``--<flag name>`` sets the arg to ``True``
     """
-    args, varargs, keywords, defaults = inspect.getargspec(task)
+    flags = flags or {}
+    args, varargs, keywords, defaults = getargspec(task)
     defaults = defaults or []
     parser = argparse.ArgumentParser(
         prog='ape ' + task.__name__,
@@ -42,7 +45,10 @@ def get_task_parser(task):
                 parser.add_argument(arg)
             else:
                 default = defaults[idx - posargslen]
-                parser.add_argument('--' + arg, default=default)
+                if arg in flags:
+                    parser.add_argument('--' + flags[arg], dest=arg, action='store_true')
+                else:
+                    parser.add_argument('--' + arg, default=default)
         return parser, False
     elif not args and varargs and not keywords and not defaults:
         return parser, True
@@ -59,7 +65,7 @@ def invoke_task(task, args):
     :return: result of task function
     :rtype: object
     """
-    parser, proxy_args = get_task_parser(task)
+    parser, proxy_args = get_task_parser(task, flags=tasks.get_flags(task.__name__))
     if proxy_args:
         return task(*args)
     else:
@@ -67,61 +73,118 @@ def invoke_task(task, args):
         return task(**vars(pargs))
 
 
-def get_task_module(feature):
+def get_exit_code(exc):
     """
-    Return imported task module of feature.
+    Return the exit code of the process for the given SystemExit,
+    like the python interpreter would do it.
+
+    :param exc: SystemExit
+    :return: int
+    """
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def get_task_modules(feature):
+    """
+    Return the imported task modules of feature.
 
     This function first tries to import the feature and raises FeatureNotFound
     if that is not possible.
-    Thereafter, it looks for a submodules called ``apetasks`` and ``tasks`` in that order.
-    If such a submodule exists, it is imported and returned.
+    Thereafter, it tries to import the submodules ``apetasks`` and ``tasks`` in that order.
 
-    :param feature: name of feature to fet task module for.
+    :param feature: name of feature to get task modules for.
     :raises: FeatureNotFound if feature_module could not be imported.
-    :return: imported module containing the ape tasks of feature or None,
-                if module cannot be imported.
+    :return: list of the imported task modules; the last one is the module
+                containing the ape tasks of feature.
     """
     try:
         importlib.import_module(feature)
     except ImportError:
         raise FeatureNotFound(feature)
 
-    tasks_module = None
+    tasks_modules = []
 
     # ape tasks may be located in a module called apetasks
     # or (if no apetasks module exists) in a module called tasks
     try:
-        tasks_module = importlib.import_module(feature + '.apetasks')
+        tasks_modules.append(importlib.import_module(feature + '.apetasks'))
     except ImportError:
         # No apetasks module in feature ... try tasks
         pass
 
     try:
-        tasks_module = importlib.import_module(feature + '.tasks')
+        tasks_modules.append(importlib.import_module(feature + '.tasks'))
     except ImportError:
         # No tasks module in feature ... skip it
         pass
 
-    return tasks_module
+    return tasks_modules
 
 
-def run(args, features=None):
+def get_task_module(feature):
     """
-    Run an ape task.
+    Return imported task module of feature.
 
-    Composes task modules out of the selected features and calls the
-    task with arguments.
+    See ``get_task_modules`` for how task modules are looked up.
 
+    :param feature: name of feature to get task module for.
+    :raises: FeatureNotFound if feature_module could not be imported.
+    :return: imported module containing the ape tasks of feature or None,
+                if module cannot be imported.
+    """
+    tasks_modules = get_task_modules(feature)
+    return tasks_modules[-1] if tasks_modules else None
+
+
+def compose(features, taskname=None):
+    """
+    Superimpose the task modules of the given features on ``ape.tasks``.
+
+    Task modules are looked up using the cached composition plan, see ``ape.plan``.
+
+    :param features: list of features in composition order
+    :param taskname: if given, only the task modules needed to
+        run this task are composed (lazy composition)
+    """
+    from ape import plan
+
+    for tasks_module in plan.iter_task_modules(features, taskname=taskname, composed_tasks=tasks):
+        tasks.superimpose(tasks_module)
+
+
+def is_help_request(args):
+    """
+    Check if args request the overview of available tasks.
     :param args: list comprised of task name followed by arguments
-    :param features: list of features to compose before invoking the task
+    :return: boolean
     """
-    features = features or []
-    for feature in features:
-        tasks_module = get_task_module(feature)
-        if tasks_module:
-            tasks.superimpose(tasks_module)
+    return len(args) < 2 or (len(args) == 2 and args[1] == 'help')
+
+
+def expand_args(args):
+    """
+    Expand command line shortcuts: ``ape -f <file>`` is short for ``ape batch <file>``.
+    :param args: list comprised of task name followed by arguments
+    :return: list comprised of task name followed by arguments
+    """
+    if args[1:2] == ['-f']:
+        return args[:1] + ['batch'] + args[2:]
+    return args
 
-    if len(args) < 2 or (len(args) == 2 and args[1] == 'help'):
+
+def dispatch(args):
+    """
+    Invoke the task named in ``args`` on the already composed tasks.
+
+    :param args: list comprised of task name followed by arguments
+    """
+    args = expand_args(args)
+    if is_help_request(args):
         tasks.help()
     else:
         taskname = args[1]
@@ -134,9 +197,38 @@ def run(args, features=None):
             invoke_task(task, remaining_args)
 
 
-def main():
+def run(args, features=None, lazy=False):
     """
-    Entry point when used via command line.
+    Run an ape task.
+
+    Composes task modules out of the selected features and calls the
+    task with arguments.
+
+    :param args: list comprised of task name followed by arguments
+    :param features: list of features to compose before invoking the task
+    :param lazy: if True, only compose the features needed for the task
+    """
+    from ape import plan
+
+    args = expand_args(args)
+    features = features or []
+    if is_help_request(args):
+        # serve the overview from the static task index if possible
+        index = plan.load_task_index(features)
+        if index is not None and index.exact:
+            index.print_help()
+            return
+
+    taskname = None
+    if lazy and not is_help_request(args):
+        taskname = args[1]
+    compose(features, taskname=taskname)
+    dispatch(args)
+
+
+def get_features():
+    """
+    Return the feature selection configured in the environment.
 
     Features are given using the environment variable ``PRODUCT_EQUATION``.
     If it is not set, ``PRODUCT_EQUATION_FILENAME`` is tried: if it points
@@ -167,9 +259,27 @@ def main():
                     'PRODUCT_EQUATION_FILENAME environment '
                     'variable needs to be set!'
                 )
+    return features
+
+
+def main():
+    """
+    Entry point when used via command line.
+
+    The feature selection is taken from the environment,
+    see ``get_features``.
+    If ``APE_LAZY_COMPOSITION`` is set, only the features needed
+    for the invoked task are composed.
+
+    ``ape _complete "<command line>"`` prints shell completions, see ``ape.complete``.
+    """
+    if sys.argv[1:2] == ['_complete']:
+        from ape import complete
+        complete.main(sys.argv[2:])
+        return
 
     # run ape with features selected
-    run(sys.argv, features=features)
+    run(sys.argv, features=get_features(), lazy=bool(os.environ.get('APE_LAZY_COMPOSITION')))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,304 @@
+"""
+Cached composition plans.
+
+Looking up the task modules of a feature takes up to three imports
+(the feature, ``feature.apetasks`` and ``feature.tasks``). Failed imports
+scan the complete ``sys.path``, which is expensive on network file systems.
+
+A composition plan records for each feature of a selection which task modules
+exist, so that later runs import exactly those modules. Plans are stored in
+the ape cache directory (see ``ape.cache``). An entry is resolved again
+if the feature package or one of its task modules changed on disk.
+
+Entries also contain the static scan of the task modules (see ``ape.taskindex``).
+It is used for lazy composition: only the features that provide
+the requested task (or anything it uses), and the features providing the base
+of everything their task modules refine or introduce, are imported and composed.
+"""
+from __future__ import unicode_literals
+import importlib
+import os
+import sys
+from . import cache
+from . import taskindex
+
+PLAN_VERSION = 4
+
+
+def get_selection_key(features):
+    """
+    Return the key parts identifying the plan of the given feature selection.
+    :param features: list of features
+    :return: list of strings
+    """
+    # the working directory is left out: it is on sys.path when running ``python -m ape.main``
+    search_path = [entry for entry in sys.path if entry not in ('', os.getcwd())]
+    return [str(PLAN_VERSION), sys.executable] + search_path + [''] + list(features)
+
+
+def get_plan_path(features):
+    """
+    Return the path of the cached plan for the given feature selection.
+    :param features: list of features
+    :return: path or None if caching is disabled
+    """
+    return cache.get_cache_path('plan', *get_selection_key(features))
+
+
+def _get_watched_paths(feature, tasks_modules):
+    paths = []
+    feature_file = cache.get_source_file(sys.modules.get(feature))
+    if feature_file:
+        if os.path.basename(feature_file).startswith('__init__.'):
+            # task modules added to the package change the directory mtime
+            paths.append(os.path.dirname(feature_file))
+        paths.append(feature_file)
+    for tasks_module in tasks_modules:
+        tasks_file = cache.get_source_file(tasks_module)
+        if tasks_file:
+            paths.append(tasks_file)
+    return paths
+
+
+def _scan_tasks_module(tasks_module, previous_modules):
+    module = dict(name=tasks_module.__name__, file=cache.get_source_file(tasks_module))
+    if not module['file'] or not module['file'].endswith('.py'):
+        return module
+    previous = previous_modules.get(module['name'])
+    try:
+        module.update(taskindex.scan_file_incrementally(module['file'], previous))
+    except (IOError, OSError, SyntaxError, ValueError):
+        pass
+    return module
+
+
+def _summarize(modules):
+    provides = {}
+    uses = set()
+    opaque = False
+    for module in modules:
+        scan = module.get('scan')
+        if scan is None:
+            opaque = True
+            continue
+        for name, info in scan['provides'].items():
+            provides.setdefault(name, set()).update(info['uses'])
+        uses.update(scan['uses'])
+        opaque = opaque or scan['opaque']
+    return dict(
+        provides=dict((name, sorted(names)) for name, names in provides.items()),
+        uses=sorted(uses),
+        opaque=opaque,
+    )
+
+
+def make_entry(feature, tasks_modules, previous=None):
+    """
+    Create the plan entry for feature.
+
+    Task modules are scanned statically (see ``ape.taskindex``); scans of
+    modules whose content did not change are taken from the previous entry.
+
+    :param feature: name of the feature
+    :param tasks_modules: list of the imported task modules of feature
+    :param previous: outdated plan entry of feature
+    :return: dict
+    """
+    previous_modules = dict((module['name'], module) for module in (previous or {}).get('modules', []))
+    modules = [_scan_tasks_module(tasks_module, previous_modules) for tasks_module in tasks_modules]
+    entry = dict(
+        feature=feature,
+        modules=modules,
+        mtimes=dict((path, cache.get_mtime(path)) for path in _get_watched_paths(feature, tasks_modules)),
+    )
+    entry.update(_summarize(modules))
+    return entry
+
+
+def is_fresh(entry):
+    """
+    Check that none of the files recorded in entry changed.
+    :param entry: plan entry
+    :return: boolean
+    """
+    for path, mtime in entry['mtimes'].items():
+        if cache.get_mtime(path) != mtime:
+            return False
+    return True
+
+
+def load_plan_data(path):
+    """
+    Load a cached plan.
+    :param path: path of the cached plan
+    :return: tuple (dict mapping feature names to plan entries, verified)
+             verified is True if the static scans of the plan matched the composed tasks,
+             False if they did not and None if that is unknown
+    """
+    data = cache.load_json(path)
+    if not data or data.get('version') != PLAN_VERSION:
+        return {}, None
+    return dict((entry['feature'], entry) for entry in data['entries']), data['verified']
+
+
+def load_plan(path):
+    """
+    Load the fresh entries of a cached plan.
+    :param path: path of the cached plan
+    :return: dict mapping feature names to plan entries
+    """
+    entries, _ = load_plan_data(path)
+    return dict((feature, entry) for feature, entry in entries.items() if is_fresh(entry))
+
+
+def get_task_index(features, entries):
+    """
+    Build the task index of a feature selection from its plan entries.
+    :param features: list of features in composition order
+    :param entries: dict mapping feature names to plan entries
+    :return: ``ape.taskindex.TaskIndex``
+    """
+    scans = []
+    for feature in features:
+        for module in entries[feature]['modules']:
+            scans.append(module.get('scan') or dict(provides={}, opaque=True))
+    return taskindex.TaskIndex.from_scans(taskindex.get_base_scan(), scans)
+
+
+def load_task_index(features):
+    """
+    Load the stored task index of a feature selection.
+    :param features: list of features in composition order
+    :return: ``ape.taskindex.TaskIndex`` or None if there is no up to date index
+    """
+    if cache.get_cache_dir() is None:
+        return None
+    return taskindex.load_index(get_selection_key(features))
+
+
+def _store(features, entries, composed_tasks=None):
+    """
+    Store the plan and the task index of a feature selection.
+    If the tasks composed from all features are passed, the index is verified against them.
+    """
+    from ape import _tasks
+
+    index = get_task_index(features, dict((entry['feature'], entry) for entry in entries))
+    verified = None
+    if composed_tasks is not None:
+        verified = index.matches(composed_tasks)
+        index.exact = index.exact and verified
+    cache.dump_json(get_plan_path(features), dict(version=PLAN_VERSION, entries=entries, verified=verified))
+
+    mtimes = {}
+    for entry in entries:
+        mtimes.update(entry['mtimes'])
+    base_file = cache.get_source_file(_tasks)
+    mtimes[base_file] = cache.get_mtime(base_file)
+    taskindex.dump_index(get_selection_key(features), index, mtimes)
+
+
+def _import_planned(entry):
+    try:
+        importlib.import_module(entry['feature'])
+        return [importlib.import_module(module['name']) for module in entry['modules']]
+    except ImportError:
+        return None
+
+
+def select_features(features, planned, taskname):
+    """
+    Determine the features needed to run taskname.
+
+    A feature is needed if it provides taskname or any name used by a needed
+    provider, by the import of a needed task module or by its helper functions.
+    A needed task module is composed as a whole: all names it provides (refines or
+    introduces) are needed as well, so the features providing their base are composed, too.
+
+    :param features: list of features in composition order
+    :param planned: dict mapping feature names to plan entries
+    :param taskname: name of the task to run
+    :return: set of needed features or None if all features are needed
+    """
+    if any(feature not in planned for feature in features):
+        return None
+    if any(planned[feature]['opaque'] for feature in features):
+        # the names an opaque task module refines are unknown
+        return None
+
+    base_provides = taskindex.get_base_scan()['provides']
+    providers = {}
+    for feature in features:
+        for name in planned[feature]['provides']:
+            providers.setdefault(name, []).append(feature)
+
+    selected = set()
+    needed = set()
+    pending = [taskname]
+    while pending:
+        name = pending.pop()
+        if name in needed:
+            continue
+        if name == taskindex.DYNAMIC:
+            return None
+        needed.add(name)
+        if name in base_provides:
+            pending.extend(base_provides[name]['uses'])
+        for feature in providers.get(name, []):
+            entry = planned[feature]
+            pending.extend(entry['provides'][name])
+            if feature not in selected:
+                selected.add(feature)
+                pending.extend(entry['uses'])
+                pending.extend(entry['provides'])
+    return selected
+
+
+def iter_task_modules(features, taskname=None, composed_tasks=None):
+    """
+    Yield the task module of each feature that has one, in composition order.
+
+    Features are imported one by one while iterating, just like
+    ``ape.main.get_task_module`` would do it. The cached plan is updated
+    once all features have been processed.
+
+    If taskname is given and the cached plan is complete, only the task modules
+    needed to run that task are imported (lazy composition).
+
+    :param features: list of features in composition order
+    :param taskname: optional name of the task that is about to be run
+    :param composed_tasks: the ``ape.Tasks`` registry the yielded modules are superimposed on.
+        It is used to verify the static scans after a complete composition.
+    :raises: FeatureNotFound if a feature could not be imported.
+    """
+    from .main import get_task_modules
+
+    path = get_plan_path(features)
+    previous, verified = load_plan_data(path)
+    planned = dict((feature, entry) for feature, entry in previous.items() if is_fresh(entry))
+    selected = None
+    if taskname and verified is not False:
+        selected = select_features(features, planned, taskname)
+    entries = []
+    changed = False
+
+    for feature in features:
+        entry = planned.get(feature)
+        if selected is not None and feature not in selected:
+            entries.append(entry)
+            continue
+        tasks_modules = _import_planned(entry) if entry else None
+        if tasks_modules is None:
+            tasks_modules = get_task_modules(feature)
+            entry = make_entry(feature, tasks_modules, previous.get(feature))
+            changed = True
+        entries.append(entry)
+        if tasks_modules:
+            yield tasks_modules[-1]
+
+    if not path:
+        return
+    if selected is None and composed_tasks is not None and (changed or verified is None):
+        _store(features, entries, composed_tasks)
+    elif changed:
+        _store(features, entries)
@@ -0,0 +1,189 @@
+"""
+Registry of the containers and products in ``APE_ROOT_DIR``.
+
+A container is an entry of the root directory whose container directory
+contains a ``products`` directory; its products are the entries of ``products``
+not starting with ``.`` or ``_``. The container directory of a name is looked
+up with the given function, e.g. the refinable ``get_container_dir`` helper of
+``ape.container_mode``; by default it is the directory of that name in the
+root directory.
+The root directory is scanned once and a snapshot is kept in memory and in
+the ape cache (see ``ape.cache``). The snapshot is checked against the
+modification times of the root directory, the container directories and the
+``products`` directories, so only what changed is scanned again.
+Directories are listed with ``os.scandir`` where available; the products of
+each container are kept as a set, too, so membership tests are cheap.
+
+This module is used by the shell completion: keep its imports light.
+"""
+from __future__ import unicode_literals
+import os
+from . import cache
+
+try:
+    from os import scandir
+except ImportError:
+    # python 2.7
+    scandir = None
+
+SNAPSHOT_VERSION = 2
+
+# (root directory, get_container_dir) -> ContainerRegistry
+_registries = {}
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _list_dir(path):
+    if scandir is None:
+        return os.listdir(path)
+    return [entry.name for entry in scandir(path)]
+
+
+def is_product(name):
+    return not name.startswith('.') and not name.startswith('_')
+
+
+class ContainerRegistry(object):
+    """
+    Containers and products of a root directory.
+    """
+
+    def __init__(self, root, get_container_dir=None, persist=True):
+        """
+        Constructor
+        :param root: the root directory
+        :param get_container_dir: optional function returning the container directory of a name
+        :param persist: load the snapshot from and store it in the ape cache
+        """
+        self.root = root
+        self.get_container_dir = get_container_dir or (lambda name: os.path.join(root, name))
+        self.cache_path = cache.get_cache_path('registry', str(SNAPSHOT_VERSION), root) if persist else None
+        self.snapshot = cache.load_json(self.cache_path)
+        if self.snapshot is not None and self.snapshot.get('root') != root:
+            self.snapshot = None
+        # container name -> (products list of the entry, frozenset of it)
+        self.product_sets = {}
+
+    def _scan_entry(self, name):
+        """
+        :return: dict(path=container directory, mtime=..., products_mtime=..., products=sorted list of products or None)
+        """
+        path = self.get_container_dir(name)
+        entry = dict(path=path, mtime=_get_mtime(path), products_mtime=None, products=None)
+        products_dir = os.path.join(path, 'products')
+        products_mtime = _get_mtime(products_dir)
+        if products_mtime is not None and os.path.isdir(products_dir):
+            entry['products_mtime'] = products_mtime
+            entry['products'] = sorted(name for name in _list_dir(products_dir) if is_product(name))
+        return entry
+
+    def _save(self):
+        cache.dump_json(self.cache_path, self.snapshot)
+
+    def _is_current(self, name, entry):
+        path = self.get_container_dir(name)
+        return path == entry['path'] and _get_mtime(path) == entry['mtime'] and (
+            entry['products'] is None or
+            _get_mtime(os.path.join(path, 'products')) == entry['products_mtime']
+        )
+
+    def _get_entries(self):
+        """
+        Return the entries of the root directory, rescanning it if it changed;
+        entries of unchanged directories are kept.
+        :return: (entries, boolean indicating that all entries were checked)
+        """
+        mtime = _get_mtime(self.root)
+        if self.snapshot is not None and self.snapshot['mtime'] == mtime:
+            return self.snapshot['entries'], False
+
+        previous = self.snapshot['entries'] if self.snapshot is not None else {}
+        entries = {}
+        if mtime is not None:
+            for name in _list_dir(self.root):
+                entry = previous.get(name)
+                if entry is None or not self._is_current(name, entry):
+                    entry = self._scan_entry(name)
+                entries[name] = entry
+        self.snapshot = dict(root=self.root, mtime=mtime, entries=entries)
+        self._save()
+        return entries, True
+
+    def _get_entry(self, name):
+        """
+        Return the entry of a directory of the root directory, rescanning it if it changed.
+        :return: entry or None if there is no such directory
+        """
+        entries, checked = self._get_entries()
+        entry = entries.get(name)
+        if entry is not None and not checked and not self._is_current(name, entry):
+            entry = entries[name] = self._scan_entry(name)
+            self._save()
+        return entry
+
+    def get_containers(self):
+        """
+        :return: sorted list of container names
+        """
+        entries, checked = self._get_entries()
+        if not checked:
+            # a directory turns into a container (or stops being one) by changing its products directory
+            changed = [
+                name for name, entry in entries.items()
+                if self.get_container_dir(name) != entry['path'] or _get_mtime(entry['path']) != entry['mtime']
+            ]
+            for name in changed:
+                entries[name] = self._scan_entry(name)
+            if changed:
+                self._save()
+        return sorted(name for name, entry in entries.items() if entry['products'] is not None)
+
+    def has_container(self, container_name):
+        entry = self._get_entry(container_name)
+        return entry is not None and entry['products'] is not None
+
+    def get_products(self, container_name):
+        """
+        :return: sorted list of product names or None if there is no such container
+        """
+        entry = self._get_entry(container_name)
+        if entry is None or entry['products'] is None:
+            return None
+        return list(entry['products'])
+
+    def get_product_set(self, container_name):
+        """
+        :return: frozenset of product names or None if there is no such container
+        """
+        entry = self._get_entry(container_name)
+        if entry is None or entry['products'] is None:
+            return None
+        products, product_set = self.product_sets.get(container_name, (None, None))
+        if products is not entry['products']:
+            # the entry was rescanned
+            product_set = frozenset(entry['products'])
+            self.product_sets[container_name] = (entry['products'], product_set)
+        return product_set
+
+    def has_product(self, container_name, product_name):
+        return product_name in (self.get_product_set(container_name) or ())
+
+
+def get_registry(root, get_container_dir=None):
+    """
+    Return the registry of root, shared by all callers in this process.
+    :param root: the root directory
+    :param get_container_dir: optional function returning the container directory of a name
+    :return: ContainerRegistry
+    """
+    key = (root, get_container_dir)
+    registry = _registries.get(key)
+    if registry is None:
+        registry = _registries[key] = ContainerRegistry(root, get_container_dir=get_container_dir)
+    return registry
@@ -0,0 +1,315 @@
+"""
+Resident ape task server.
+
+Every call of ``python -m ape.main`` imports the task modules of all
+selected features and composes them before the task is invoked.
+The task server does that once and keeps the composed ``ape._tasks``
+module warm. Task invocations are received over a unix domain socket from
+the thin client in ``ape.client``; stdout and stderr of the task are
+streamed back to the client.
+
+There is one server per feature selection, so typically one per
+``<container>:<product>``. A server restarts itself as soon as the product
+equation or one of the composed task modules changes on disk and exits
+after being idle for ``APE_SERVER_IDLE_TIMEOUT`` seconds.
+
+Please note: tasks run by the server have no access to the terminal's
+stdin, so interactive tasks should be run without the server.
+"""
+from __future__ import print_function, unicode_literals
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import traceback
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+from .cache import get_environment_key, get_mtime, get_source_file
+
+# message types of the wire protocol
+# every message is a header (type, payload length) followed by the payload
+MSG_REQUEST = b'Q'
+MSG_STDOUT = b'O'
+MSG_STDERR = b'E'
+MSG_EXIT = b'X'
+MSG_RESTART = b'R'
+
+HEADER = struct.Struct(str('!cI'))
+
+DEFAULT_IDLE_TIMEOUT = 3600
+
+
+def send_message(sock, msg_type, payload=b''):
+    """
+    Send a single message over sock.
+    :param sock: connected socket
+    :param msg_type: one of the MSG_* constants
+    :param payload: bytes
+    """
+    sock.sendall(HEADER.pack(msg_type, len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise EOFError('connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    """
+    Receive a single message from sock.
+    :param sock: connected socket
+    :return: tuple (msg_type, payload)
+    """
+    msg_type, size = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    return msg_type, _recv_exactly(sock, size)
+
+
+def get_server_key(environ=None):
+    """
+    Return a key identifying the feature selection configured in environ.
+    :param environ: environment dict, defaults to os.environ
+    :return: string
+    """
+    return get_environment_key(environ)
+
+
+def get_socket_path(environ=None):
+    """
+    Return the path of the server socket for the feature selection configured in environ.
+    The directory may be changed by setting ``APE_SERVER_DIR``.
+    :param environ: environment dict, defaults to os.environ
+    :return: string
+    """
+    environ = os.environ if environ is None else environ
+    directory = environ.get('APE_SERVER_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, 'ape-%s-%s.sock' % (os.getuid(), get_server_key(environ)))
+
+
+class WatchedFiles(object):
+    """
+    Snapshot of modification times of a set of files and directories.
+    """
+
+    def __init__(self, paths):
+        self.mtimes = dict((path, get_mtime(path)) for path in paths)
+
+    def is_stale(self):
+        """
+        Returns True if any of the watched paths changed since the snapshot was taken.
+        :return: boolean
+        """
+        for path, mtime in self.mtimes.items():
+            if get_mtime(path) != mtime:
+                return True
+        return False
+
+    @classmethod
+    def for_composition(cls, features):
+        """
+        Watch the product equation, the packages of the given features and
+        all task modules composed into ``ape.tasks``.
+        :param features: list of composed features
+        :return: WatchedFiles
+        """
+        from ape import tasks
+
+        paths = []
+        if not os.environ.get('PRODUCT_EQUATION') and os.environ.get('PRODUCT_EQUATION_FILENAME'):
+            paths.append(os.environ['PRODUCT_EQUATION_FILENAME'])
+        for name in list(features) + list(tasks.FEATURE_SELECTION):
+            filename = get_source_file(sys.modules.get(name))
+            if not filename:
+                continue
+            if os.path.basename(filename).startswith('__init__.'):
+                # watch the package directory so that newly added task modules are noticed
+                paths.append(os.path.dirname(filename))
+            paths.append(filename)
+        return cls(paths)
+
+
+class _Pump(threading.Thread):
+    """
+    Redirects a file descriptor into a pipe and forwards everything
+    written to it to the client.
+    """
+
+    def __init__(self, conn, lock, fd, msg_type):
+        super(_Pump, self).__init__()
+        self.daemon = True
+        self.conn = conn
+        self.lock = lock
+        self.msg_type = msg_type
+        self.read_fd, write_fd = os.pipe()
+        os.dup2(write_fd, fd)
+        os.close(write_fd)
+
+    def run(self):
+        try:
+            while True:
+                data = os.read(self.read_fd, 65536)
+                if not data:
+                    break
+                with self.lock:
+                    send_message(self.conn, self.msg_type, data)
+        except (EOFError, socket.error):
+            # client went away; keep draining so writers do not block
+            while os.read(self.read_fd, 65536):
+                pass
+        finally:
+            os.close(self.read_fd)
+
+
+class TaskRequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        msg_type, payload = recv_message(self.request)
+        if msg_type != MSG_REQUEST:
+            return
+        request = json.loads(payload.decode('utf-8'))
+
+        if request.get('command') == 'stop':
+            self.server.done = True
+            send_message(self.request, MSG_EXIT, b'0')
+        elif self.server.watched.is_stale():
+            self.server.restart_requested = True
+            send_message(self.request, MSG_RESTART)
+        else:
+            exit_code = self.server.execute(self.request, request['argv'], request['cwd'], request['env'])
+            send_message(self.request, MSG_EXIT, str(exit_code).encode('ascii'))
+
+
+class TaskServer(socketserver.UnixStreamServer):
+    """
+    Serves task invocations for the composed feature selection.
+    """
+
+    def __init__(self, socket_path, watched, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.socket_path = socket_path
+        self.watched = watched
+        self.timeout = idle_timeout
+        self.done = False
+        self.restart_requested = False
+        socketserver.UnixStreamServer.__init__(self, socket_path, TaskRequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def handle_timeout(self):
+        self.done = True
+
+    def execute(self, conn, argv, cwd, env):
+        """
+        Run a task with the client's working directory and environment.
+        stdout and stderr are streamed to the client.
+        :param conn: connection to the client
+        :param argv: the client's sys.argv
+        :param cwd: the client's working directory
+        :param env: the client's environment
+        :return: exit code
+        """
+        from ape.main import dispatch, get_exit_code
+
+        lock = threading.Lock()
+        saved_environ = dict(os.environ)
+        saved_cwd = os.getcwd()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_fds = [(fd, os.dup(fd)) for fd in (1, 2)]
+        pumps = [_Pump(conn, lock, 1, MSG_STDOUT), _Pump(conn, lock, 2, MSG_STDERR)]
+        for pump in pumps:
+            pump.start()
+
+        try:
+            os.environ.clear()
+            os.environ.update(env)
+            os.chdir(cwd)
+            dispatch(argv)
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = get_exit_code(e)
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            # restoring the descriptors closes the write ends of the pipes
+            for fd, saved_fd in saved_fds:
+                os.dup2(saved_fd, fd)
+                os.close(saved_fd)
+            for pump in pumps:
+                pump.join()
+            os.environ.clear()
+            os.environ.update(saved_environ)
+            os.chdir(saved_cwd)
+
+        return exit_code
+
+    def serve_until_idle(self):
+        """
+        Handle requests until the server is stopped, idle for too long or
+        needs to be restarted.
+        """
+        while not self.done and not self.restart_requested:
+            self.handle_request()
+
+    def shutdown_socket(self):
+        self.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def is_server_running(socket_path):
+    """
+    Check if a server is accepting connections on socket_path.
+    :param socket_path: path of the server socket
+    :return: boolean
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+def main():
+    """
+    Compose the feature selection configured in the environment and serve tasks.
+    """
+    from ape.main import compose, get_features
+
+    socket_path = get_socket_path()
+    if is_server_running(socket_path):
+        print('ape server already running on %s' % socket_path)
+        return
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    features = get_features()
+    compose(features)
+    idle_timeout = float(os.environ.get('APE_SERVER_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT))
+    server = TaskServer(socket_path, WatchedFiles.for_composition(features), idle_timeout=idle_timeout)
+    try:
+        server.serve_until_idle()
+    finally:
+        server.shutdown_socket()
+
+    if server.restart_requested:
+        # the product equation or a task module changed: start over with a fresh interpreter
+        os.execv(sys.executable, [sys.executable, '-u', '-m', 'ape.server'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Run tasks along their declared dependencies.
+
+Tasks may declare the tasks they depend on using ``@tasks.register(depends=[...])``.
+``ape run_graph <targets>`` runs the targets and everything they depend on:
+a task is started as soon as all of its dependencies succeeded, so independent
+tasks run concurrently in a pool of ``--jobs`` threads.
+
+The output a task prints to ``sys.stdout`` and ``sys.stderr`` is captured
+per task and printed as one block once the task finished.
+Output of subprocesses is not captured.
+
+Tasks are run without arguments, so tasks with required arguments are rejected
+before anything runs.
+
+Please note: tasks run in the same process, so tasks that change the working
+directory or the environment should not run concurrently (use ``--jobs 1``).
+"""
+from __future__ import print_function, unicode_literals
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.pool import ThreadPool
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from .exceptions import CyclicTaskDependency
+from .feaquencer import detect_cycle, topsort
+
+
+def get_task_graph(targets, get_dependencies):
+    """
+    Build the dependency graph of targets.
+    :param targets: list of task names
+    :param get_dependencies: function returning the list of dependencies of a task name
+    :raises: CyclicTaskDependency if the dependencies contain a cycle
+    :return: dict mapping each needed task name to the list of tasks that depend on it
+        (in the form used by ``ape.feaquencer``: tasks come before their targets)
+    """
+    graph = {}
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name in graph:
+            continue
+        graph[name] = []
+        pending.extend(get_dependencies(name))
+    for name in list(graph):
+        for dependency in get_dependencies(name):
+            graph[dependency].append(name)
+
+    if len(topsort(graph)) != len(graph):
+        cycle = detect_cycle(graph)
+        raise CyclicTaskDependency(' -> '.join(cycle) if cycle else 'task dependencies contain a cycle')
+    return graph
+
+
+def get_required_args(task):
+    """
+    Return the names of the arguments a task cannot be called without.
+    :param task: task function
+    :return: list of argument names
+    """
+    from ape import getargspec
+
+    args, _, _, defaults = getargspec(task)
+    return list(args[:len(args) - len(defaults or [])])
+
+
+class CapturedOutput(object):
+    """
+    Stream proxy that sends writes of threads capturing their output into a
+    per-thread buffer; all other writes go to the wrapped stream.
+    Proxies sharing the same ``local`` write into the same buffer.
+    """
+
+    def __init__(self, stream, local=None):
+        self.stream = stream
+        self.local = threading.local() if local is None else local
+
+    def start(self):
+        self.local.chunks = []
+
+    def stop(self):
+        chunks = self.local.chunks
+        self.local.chunks = None
+        return ''.join(chunks)
+
+    def write(self, data):
+        chunks = getattr(self.local, 'chunks', None)
+        if chunks is None:
+            self.stream.write(data)
+        else:
+            if isinstance(data, bytes):
+                data = data.decode('utf-8', 'replace')
+            chunks.append(data)
+
+    def flush(self):
+        if getattr(self.local, 'chunks', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def run_task_graph(graph, run_task, jobs=1, on_finished=None):
+    """
+    Run all tasks of graph; a task is started once all tasks it depends on succeeded.
+    Tasks depending on a failed task are skipped.
+    :param graph: task graph as returned by ``get_task_graph``
+    :param run_task: function running the task for a name
+    :param jobs: maximum number of tasks running concurrently
+    :param on_finished: optional function called with each result in the main thread
+    :return: list of dict(name=..., exit_code=..., duration=..., output=...) in the order
+        the tasks finished; exit_code and duration are None for skipped tasks
+    """
+    from .main import get_exit_code
+
+    order = dict((name, idx) for idx, name in enumerate(topsort(graph)))
+    missing = dict((name, 0) for name in graph)
+    for name in graph:
+        for target in graph[name]:
+            missing[target] += 1
+
+    stdout, stderr = sys.stdout, sys.stderr
+    captured_stdout = CapturedOutput(stdout)
+    captured_stderr = CapturedOutput(stderr, captured_stdout.local)
+
+    def run(name):
+        captured_stdout.start()
+        start = time.time()
+        try:
+            run_task(name)
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = get_exit_code(e)
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        duration = time.time() - start
+        return dict(name=name, exit_code=exit_code, duration=duration, output=captured_stdout.stop())
+
+    finished = queue.Queue()
+    pool = ThreadPool(max(1, int(jobs)))
+    running = 0
+    results = []
+    ready = sorted((name for name in graph if not missing[name]), key=order.get)
+    sys.stdout, sys.stderr = captured_stdout, captured_stderr
+    try:
+        while ready or running:
+            for name in ready:
+                pool.apply_async(run, (name,), callback=finished.put)
+                running += 1
+            ready = []
+
+            result = finished.get()
+            running -= 1
+            results.append(result)
+            if on_finished:
+                on_finished(result)
+            if result['exit_code'] == 0:
+                for target in graph[result['name']]:
+                    missing[target] -= 1
+                    if not missing[target]:
+                        ready.append(target)
+                ready.sort(key=order.get)
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        pool.close()
+        pool.join()
+
+    finished_names = set(result['name'] for result in results)
+    for name in sorted(graph, key=order.get):
+        if name not in finished_names:
+            results.append(dict(name=name, exit_code=None, duration=None, output=''))
+    return results
+
+
+def print_result(result):
+    """
+    Print the captured output of a finished task.
+    :param result: result dict as returned by ``run_task_graph``
+    """
+    status = 'ok' if result['exit_code'] == 0 else 'FAILED(%s)' % result['exit_code']
+    print('==> %s: %s (%.2fs)' % (result['name'], status, result['duration']))
+    if result['output']:
+        print(result['output'].rstrip('\n'))
+    print()
+
+
+def print_report(results):
+    """
+    Print exit code and run time of each task.
+    :param results: as returned by ``run_task_graph``
+    """
+    print('Task graph summary:')
+    print()
+    for result in results:
+        if result['exit_code'] is None:
+            print('   %-10s %7s %s' % ('skipped', '', result['name']))
+        else:
+            status = 'ok' if result['exit_code'] == 0 else 'FAILED(%s)' % result['exit_code']
+            print('   %-10s %6.2fs %s' % (status, result['duration'], result['name']))
+    print()
@@ -0,0 +1,430 @@
+"""
+Static task index.
+
+Task modules are parsed with ``ast`` without executing them. For every module
+the scan records which names it provides to ``ape.tasks``
+(registered tasks and helpers, refinements and introductions) together with
+their signatures and docstrings, and which names of ``ape.tasks`` it uses.
+
+This allows to decide which features need to be composed for a given task
+without importing any of them (see ``ape.plan``). The scans of all features
+of a product are combined into a task index that is stored in the ape cache
+directory. ``ape help`` is served from the index if it is up to date.
+"""
+from __future__ import print_function, unicode_literals
+import ast
+import hashlib
+import inspect
+import io
+from . import cache
+
+# marker for "all names": used if the names cannot be determined statically
+DYNAMIC = '*'
+
+# methods of ape.tasks that give access to arbitrary tasks
+DYNAMIC_ACCESSORS = ('get_task', 'get_tasks', 'help')
+
+# methods of ape.tasks that register the decorated function
+REGISTER_METHODS = dict(
+    register='task',
+    register_helper='helper',
+)
+
+# featuremonkey prefixes for module level transformations
+TRANSFORMATION_PREFIXES = (
+    ('refine_', 'refinement'),
+    ('introduce_', 'introduction'),
+    ('child_', 'child'),
+)
+
+
+class _TasksReferences(object):
+    """
+    Recognizes expressions referring to ``ape.tasks``.
+    """
+
+    def __init__(self, tree):
+        self.names = set()
+        self.ape_names = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and node.module == 'ape':
+                for alias in node.names:
+                    if alias.name == 'tasks':
+                        self.names.add(alias.asname or alias.name)
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name == 'ape' or alias.name.startswith('ape.'):
+                        self.ape_names.add(alias.asname or 'ape')
+
+    def is_tasks(self, node):
+        if isinstance(node, ast.Name):
+            return node.id in self.names
+        return (
+            isinstance(node, ast.Attribute) and node.attr == 'tasks' and
+            isinstance(node.value, ast.Name) and node.value.id in self.ape_names
+        )
+
+
+def _get_register_kind(decorator, refs):
+    if isinstance(decorator, ast.Call):
+        decorator = decorator.func
+    if isinstance(decorator, ast.Attribute) and refs.is_tasks(decorator.value):
+        return REGISTER_METHODS.get(decorator.attr)
+    return None
+
+
+def _collect_uses(nodes, refs, registrations):
+    """
+    Collect the names of ape.tasks used within nodes.
+    A registration that is not used as decorator makes the module opaque.
+    :return: tuple (set of used names, opaque)
+    """
+    uses = set()
+    opaque = False
+    for root in nodes:
+        for node in ast.walk(root):
+            if isinstance(node, ast.Attribute) and refs.is_tasks(node.value):
+                if node.attr in REGISTER_METHODS:
+                    if id(node) not in registrations:
+                        opaque = True
+                elif node.attr in DYNAMIC_ACCESSORS:
+                    uses.add(DYNAMIC)
+                else:
+                    uses.add(node.attr)
+            elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and
+                    node.func.id in ('getattr', 'setattr', 'hasattr') and
+                    node.args and refs.is_tasks(node.args[0])):
+                uses.add(DYNAMIC)
+    return uses, opaque
+
+
+def _is_function(node):
+    return isinstance(node, (ast.FunctionDef, getattr(ast, 'AsyncFunctionDef', ast.FunctionDef)))
+
+
+def _get_arg_name(arg):
+    # python 2 uses Name nodes for arguments
+    return arg.arg if hasattr(arg, 'arg') else arg.id
+
+
+def get_argspec(node):
+    """
+    Extract the argspec of a function definition.
+    :param node: ast.FunctionDef
+    :return: dict(args=..., varargs=..., keywords=..., defaults=[reprs])
+             or None if it cannot be determined statically
+    """
+    arguments = node.args
+    if getattr(arguments, 'kwonlyargs', None):
+        return None
+    try:
+        default_reprs = [repr(ast.literal_eval(default)) for default in arguments.defaults]
+    except ValueError:
+        return None
+    varargs = arguments.vararg
+    keywords = arguments.kwarg
+    return dict(
+        args=[_get_arg_name(arg) for arg in getattr(arguments, 'posonlyargs', []) + arguments.args],
+        varargs=_get_arg_name(varargs) if varargs is not None and not isinstance(varargs, str) else varargs,
+        keywords=_get_arg_name(keywords) if keywords is not None and not isinstance(keywords, str) else keywords,
+        defaults=default_reprs,
+    )
+
+
+def _get_returned_function(node):
+    """
+    Return the nested function returned by a refinement or method introduction.
+    """
+    if not _is_function(node):
+        return None
+    nested = dict((child.name, child) for child in node.body if _is_function(child))
+    for child in node.body:
+        if isinstance(child, ast.Return) and isinstance(child.value, ast.Name):
+            return nested.get(child.value.id)
+    return None
+
+
+def _describe_function(node):
+    if node is None:
+        return dict(function=True, argspec=None, doc=None)
+    return dict(function=True, argspec=get_argspec(node), doc=ast.get_docstring(node))
+
+
+def scan_source(source, filename='<unknown>', plain_functions_are_tasks=False):
+    """
+    Scan the source of a task module.
+
+    The result is a json serializable dict:
+
+    - ``doc``: the module docstring
+    - ``provides``: dict mapping provided names to dict(kind=..., uses=[...], function=...)
+      functions additionally have an ``argspec`` (see ``get_argspec``) and a ``doc``
+    - ``uses``: names used by code that runs on import or by module level helper functions
+    - ``imports``: modules imported by code that runs on import
+    - ``opaque``: True if the provided names could not be determined statically
+
+    :param source: python source code
+    :param filename: filename used in error messages
+    :param plain_functions_are_tasks: if True, undecorated top level functions
+        are considered tasks (this is the case for ``ape._tasks``)
+    :return: dict
+    """
+    tree = ast.parse(source, filename)
+    refs = _TasksReferences(tree)
+    provides = {}
+    registrations = set()
+    function_nodes = []
+
+    for node in tree.body:
+        if _is_function(node):
+            function_nodes.append(node)
+            for decorator in node.decorator_list:
+                kind = _get_register_kind(decorator, refs)
+                if kind:
+                    registrations.add(id(decorator.func if isinstance(decorator, ast.Call) else decorator))
+                    provides[node.name] = dict(kind=kind, node=node)
+            if node.name not in provides and plain_functions_are_tasks:
+                provides[node.name] = dict(kind='task', node=node)
+
+        names = []
+        if _is_function(node) or isinstance(node, ast.ClassDef):
+            names = [node.name]
+        elif isinstance(node, ast.Assign):
+            names = [target.id for target in node.targets if isinstance(target, ast.Name)]
+        for name in names:
+            for prefix, kind in TRANSFORMATION_PREFIXES:
+                if name.startswith(prefix):
+                    provides[name[len(prefix):]] = dict(kind=kind, node=node)
+
+    for info in provides.values():
+        node = info['node']
+        if info['kind'] in REGISTER_METHODS.values():
+            info.update(_describe_function(node))
+        elif info['kind'] in ('refinement', 'introduction') and _is_function(node):
+            # featuremonkey calls the transformation: the returned function ends up in ape.tasks
+            info.update(_describe_function(_get_returned_function(node)))
+        elif info['kind'] == 'refinement':
+            info.update(_describe_function(None))
+        else:
+            info.update(function=False)
+
+    provided_nodes = set(id(info['node']) for info in provides.values())
+    opaque = False
+    for info in provides.values():
+        uses, info_opaque = _collect_uses([info.pop('node')], refs, registrations)
+        info['uses'] = sorted(uses)
+        opaque = opaque or info_opaque
+
+    # code outside of function bodies runs on import (decorators do, too)
+    module_nodes = [node for node in tree.body if not _is_function(node)]
+    module_nodes += [decorator for node in function_nodes for decorator in node.decorator_list]
+    module_uses, module_opaque = _collect_uses(module_nodes, refs, registrations)
+    # plain helper functions may be called by any provided function: their uses count for the module
+    helper_nodes = [node for node in function_nodes if id(node) not in provided_nodes]
+    helper_uses, _ = _collect_uses(helper_nodes, refs, registrations)
+    module_uses |= helper_uses
+    # registrations in function bodies that are not provided at module level
+    _, body_opaque = _collect_uses(function_nodes, refs, registrations)
+
+    # modules imported on import may register tasks themselves
+    imports = []
+    for node in module_nodes:
+        for child in ast.walk(node):
+            if isinstance(child, ast.ImportFrom):
+                imports.append('.' * (child.level or 0) + (child.module or ''))
+            elif isinstance(child, ast.Import):
+                imports.extend(alias.name for alias in child.names)
+
+    return dict(
+        doc=ast.get_docstring(tree),
+        provides=provides,
+        uses=sorted(module_uses),
+        imports=sorted(set(imports)),
+        opaque=opaque or module_opaque or body_opaque,
+    )
+
+
+def read_source(path):
+    """
+    Read a python source file.
+    :param path: path of the python source file
+    :return: tuple (source, sha1 hexdigest of source)
+    """
+    with io.open(path, 'rb') as f:
+        source = f.read()
+    return source, hashlib.sha1(source).hexdigest()
+
+
+def scan_file(path, plain_functions_are_tasks=False):
+    """
+    Scan the task module stored in path, see ``scan_source``.
+    :param path: path of the python source file
+    :return: dict
+    """
+    source, _ = read_source(path)
+    return scan_source(source, path, plain_functions_are_tasks=plain_functions_are_tasks)
+
+
+def scan_file_incrementally(path, previous=None):
+    """
+    Scan the task module stored in path unless its content did not change.
+    :param path: path of the python source file
+    :param previous: dict(sha1=..., scan=...) from an earlier scan of path
+    :return: dict(sha1=..., scan=...)
+    """
+    source, sha1 = read_source(path)
+    if previous and previous.get('sha1') == sha1:
+        return previous
+    return dict(sha1=sha1, scan=scan_source(source, path))
+
+
+def get_base_scan():
+    """
+    Scan ``ape._tasks``, the module containing the global tasks.
+    """
+    from ape import _tasks
+    return scan_file(cache.get_source_file(_tasks), plain_functions_are_tasks=True)
+
+
+class TaskIndex(object):
+    """
+    The tasks of a feature selection, as composed from static scans.
+    """
+
+    def __init__(self, doc, tasks, helper_names, exact=True):
+        """
+        :param doc: docstring of the tasks module
+        :param tasks: dict mapping names to dict(kind=..., function=..., argspec=..., doc=...)
+        :param helper_names: list of names registered as helpers
+        :param exact: False if the index may differ from the composed tasks
+        """
+        self.doc = doc
+        self.tasks = tasks
+        self.helper_names = set(helper_names)
+        self.exact = exact
+
+    @classmethod
+    def from_scans(cls, base_scan, scans):
+        """
+        Combine scans in composition order.
+        :param base_scan: scan of ``ape._tasks``
+        :param scans: list of module scans in composition order
+        :return: TaskIndex
+        """
+        tasks = dict((name, dict(info)) for name, info in base_scan['provides'].items())
+        helper_names = set()
+        exact = True
+
+        for scan in scans:
+            exact = exact and not scan['opaque']
+            for name, info in scan['provides'].items():
+                if info['kind'] == 'helper':
+                    helper_names.add(name)
+                if info['kind'] == 'refinement' and name in tasks:
+                    refined = dict(info)
+                    if not refined.get('doc'):
+                        # featuremonkey rescues the docstring of the original
+                        refined['doc'] = tasks[name].get('doc')
+                    tasks[name] = refined
+                else:
+                    tasks[name] = dict(info)
+                if tasks[name].get('function') and tasks[name].get('argspec') is None:
+                    exact = False
+
+        return cls(base_scan['doc'], tasks, helper_names, exact=exact)
+
+    def to_json(self):
+        return dict(
+            doc=self.doc,
+            tasks=self.tasks,
+            helper_names=sorted(self.helper_names),
+            exact=self.exact
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['doc'], data['tasks'], data['helper_names'], exact=data['exact'])
+
+    def matches(self, composed_tasks):
+        """
+        Check that the index agrees with the actually composed tasks.
+        :param composed_tasks: ``ape.Tasks`` registry with all features composed
+        :return: boolean
+        """
+        from ape import get_signature
+        from ape.exceptions import InvalidTask
+
+        functions = dict(inspect.getmembers(composed_tasks._tasks, inspect.isfunction))
+        indexed = set(name for name, info in self.tasks.items() if info.get('function'))
+        if set(functions) != indexed or set(composed_tasks._helper_names) != self.helper_names:
+            return False
+        for name, func in functions.items():
+            if inspect.getdoc(func) != self.tasks[name].get('doc'):
+                return False
+            try:
+                if get_signature(name, func) != self.get_signature(name):
+                    return False
+            except (InvalidTask, TypeError):
+                return False
+        return True
+
+    def get_tasks(self):
+        """
+        Return tasks as sorted list of (name, info) tuples, like ``ape.tasks.get_tasks``.
+        """
+        return sorted(
+            (name, info) for name, info in self.tasks.items()
+            if info.get('function') and name not in self.helper_names
+        )
+
+    def get_signature(self, name):
+        """
+        Return the signature of the task as ``ape.get_signature`` would.
+        :param name: name of the task
+        :return: string
+        """
+        from ape import format_signature
+        argspec = self.tasks[name]['argspec']
+        return format_signature(name, argspec['args'], argspec['varargs'], argspec['keywords'], argspec['defaults'])
+
+    def print_help(self):
+        """
+        Print the overview of available tasks, like ``ape.tasks.help`` does.
+        """
+        from ape import tasks
+
+        print(inspect.cleandoc(self.doc or ''))
+        print()
+        print('Available tasks:')
+        print()
+        for name, info in self.get_tasks():
+            tasks.print_help_entry(self.get_signature(name), info.get('doc'))
+
+
+def get_index_path(key_parts):
+    return cache.get_cache_path('index', *key_parts)
+
+
+def dump_index(key_parts, index, mtimes):
+    """
+    Store the task index of a feature selection.
+    :param key_parts: key of the feature selection
+    :param index: TaskIndex
+    :param mtimes: dict mapping files the index depends on to their mtimes
+    """
+    cache.dump_json(get_index_path(key_parts), dict(index=index.to_json(), mtimes=mtimes))
+
+
+def load_index(key_parts):
+    """
+    Load the task index of a feature selection.
+    :param key_parts: key of the feature selection
+    :return: TaskIndex or None if there is no up to date index
+    """
+    data = cache.load_json(get_index_path(key_parts))
+    if not data:
+        return None
+    for path, mtime in data['mtimes'].items():
+        if cache.get_mtime(path) != mtime:
+            return None
+    return TaskIndex.from_json(data['index'])
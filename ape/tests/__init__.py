@@ -4,8 +4,25 @@ from ape.tests.test_argparser import TestArgParser
 from ape.tests.test_invokation import TestTaskInvokation
 from ape.tests.test_extract_feature_order import ExtractFeatureOrderTestCase
 from ape.tests.test_feature_order_validator import FeatureOrderValidatorTestCase
-from ape.tests.test_cycledetect import TestCycleDetection, TestTopsort
+from ape.tests.test_cycledetect import TestCycleDetection, TestFindCycles, TestTopsort
 from ape.tests.test_order_validation import OrderValidationTest
+from ape.tests.test_server import ServerProtocolTestCase, WatchedFilesTestCase, ServerIntegrationTestCase
+from ape.tests.test_plan import CompositionPlanTestCase
+from ape.tests.test_taskindex import TaskScanTestCase, TaskIndexTestCase
+from ape.tests.test_complete import CompletionTestCase
+from ape.tests.test_batch import BatchTestCase
+from ape.tests.test_taskgraph import TaskGraphTestCase
+from ape.tests.test_fleet import FleetValidationTestCase
+from ape.tests.test_product_spec_validator import ProductSpecValidatorTestCase
+from ape.tests.test_gitmeta import GitMetadataTestCase
+from ape.tests.test_featureinfo import FeatureInfoTestCase
+from ape.tests.test_registry import ContainerRegistryTestCase
+from ape.tests.test_shellenv import ShellEnvironmentTestCase
+from ape.tests.test_productline import ProductLineTestCase
+from ape.tests.test_featuremodel import FeatureModelTestCase
+from ape.tests.test_feature_model_validator import FeatureModelValidatorTestCase
+from ape.tests.test_graphexport import GraphExportTestCase
+from ape.tests.test_query import FeatureOrderQueryTestCase
 
 
 def suite():
@@ -15,8 +32,29 @@ def suite():
         unittest.TestLoader().loadTestsFromTestCase(ExtractFeatureOrderTestCase),
         unittest.TestLoader().loadTestsFromTestCase(FeatureOrderValidatorTestCase),
         unittest.TestLoader().loadTestsFromTestCase(TestCycleDetection),
+        unittest.TestLoader().loadTestsFromTestCase(TestFindCycles),
         unittest.TestLoader().loadTestsFromTestCase(TestTopsort),
         unittest.TestLoader().loadTestsFromTestCase(OrderValidationTest),
+        unittest.TestLoader().loadTestsFromTestCase(ServerProtocolTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(WatchedFilesTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(ServerIntegrationTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(CompositionPlanTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(TaskScanTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(TaskIndexTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(CompletionTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(BatchTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(TaskGraphTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(FleetValidationTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(ProductSpecValidatorTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(GitMetadataTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(FeatureInfoTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(ContainerRegistryTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(ShellEnvironmentTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(ProductLineTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(FeatureModelTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(FeatureModelValidatorTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(GraphExportTestCase),
+        unittest.TestLoader().loadTestsFromTestCase(FeatureOrderQueryTestCase),
     ])
 
 
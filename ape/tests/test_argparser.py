@@ -83,3 +83,23 @@ class TestArgParser(SilencedTest, unittest.TestCase):
         )
 
         self.assertRaises(SystemExit, parser.parse_args, '1'.split())
+
+    def test_flag(self):
+
+        def flagparams(x, all_products=False, verbose=False):
+            pass
+
+        parser, proxy_args = get_task_parser(flagparams, flags=dict(all_products='all'))
+        self.assertEquals(False, proxy_args)
+
+        parsed_args = parser.parse_args('f --all'.split())
+        self.assertEquals({'x': 'f', 'all_products': True, 'verbose': False}, vars(parsed_args))
+
+        parsed_args = parser.parse_args('f'.split())
+        self.assertEquals({'x': 'f', 'all_products': False, 'verbose': False}, vars(parsed_args))
+
+        self.assertRaises(SystemExit, parser.parse_args, 'f --all 1'.split())
+
+        # keyword args that are not declared as flags take a value, even if they default to False
+        parsed_args = parser.parse_args('f --verbose 1'.split())
+        self.assertEquals({'x': 'f', 'all_products': False, 'verbose': '1'}, vars(parsed_args))
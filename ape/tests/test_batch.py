@@ -0,0 +1,67 @@
+from __future__ import absolute_import, unicode_literals
+import sys
+import unittest
+from ape.batch import parse_script, run_batch
+from ape.exceptions import InvalidBatchScript, TaskNotFound
+from ape.main import expand_args
+from .base import SilencedTest
+
+__all__ = ['BatchTestCase']
+
+SCRIPT = '''
+# a comment
+greet world --greeting "good morning"
+fail 2
+greet   # no argument
+'''
+
+
+class BatchTestCase(SilencedTest, unittest.TestCase):
+
+    def setUp(self):
+        super(BatchTestCase, self).setUp()
+        self.calls = []
+
+        def greet(name, greeting='hello'):
+            self.calls.append((greeting, name))
+
+        def fail(code):
+            self.calls.append(('fail', code))
+            sys.exit(int(code))
+
+        self.tasks = dict(greet=greet, fail=fail)
+
+    def get_task(self, name):
+        try:
+            return self.tasks[name]
+        except KeyError:
+            raise TaskNotFound(name)
+
+    def test_parse_script(self):
+        self.assertEqual([
+            (3, ['greet', 'world', '--greeting', 'good morning']),
+            (4, ['fail', '2']),
+            (5, ['greet']),
+        ], parse_script(SCRIPT.splitlines()))
+
+    def test_parse_error(self):
+        self.assertRaises(InvalidBatchScript, parse_script, ['greet "world'])
+
+    def test_stop_on_error(self):
+        results = run_batch(parse_script(SCRIPT.splitlines()), self.get_task)
+        self.assertEqual([0, 2, None], [result['exit_code'] for result in results])
+        self.assertEqual([('good morning', 'world'), ('fail', '2')], self.calls)
+
+    def test_continue_on_error(self):
+        invocations = parse_script(SCRIPT.splitlines()) + [(6, ['nosuchtask'])]
+        results = run_batch(invocations, self.get_task, on_error='continue')
+        # the last greet is missing its argument: argparse exits with 2
+        self.assertEqual([0, 2, 2, 1], [result['exit_code'] for result in results])
+        self.assertTrue(all(result['duration'] >= 0 for result in results))
+
+    def test_invalid_on_error(self):
+        self.assertRaises(ValueError, run_batch, [], self.get_task, on_error='ignore')
+
+    def test_expand_args(self):
+        self.assertEqual(['ape', 'batch', 'deploy.ape'], expand_args(['ape', '-f', 'deploy.ape']))
+        self.assertEqual(['ape', 'help'], expand_args(['ape', 'help']))
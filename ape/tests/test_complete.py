@@ -0,0 +1,100 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import os
+import shutil
+import tempfile
+import unittest
+from ape import Tasks, complete
+
+__all__ = ['CompletionTestCase']
+
+INDEX = dict(
+    zap=complete.describe_task(['poi'], None, None, None),
+    teleport=complete.describe_task(['poi'], None, None, None),
+    validate=complete.describe_task(['poi', 'level'], None, None, ['1']),
+    check=complete.describe_task(['poi', 'all_products'], None, None, [False], flags=dict(all_products='all')),
+    run=complete.describe_task([], 'args', None, None),
+)
+
+
+class CompletionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        for path in ('sdox/products/dev', 'sdox/products/prod', 'sdox/products/_lib', 'web/products/live', 'notacontainer'):
+            os.makedirs(os.path.join(self.root_dir, path))
+        self.environ = dict(APE_ROOT_DIR=self.root_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def get_completions(self, line):
+        words = line.split()
+        if line[-1].isspace():
+            words.append('')
+        return complete.get_completions(words, INDEX, self.environ)
+
+    def test_task_names(self):
+        self.assertEqual(['check', 'run', 'teleport', 'validate', 'zap'], self.get_completions('ape '))
+        self.assertEqual(['teleport'], self.get_completions('ape te'))
+
+    def test_pois(self):
+        self.assertEqual(['sdox:dev', 'sdox:prod', 'web:live'], self.get_completions('ape zap '))
+        self.assertEqual(['sdox:prod'], self.get_completions('ape zap sdox:p'))
+        self.assertEqual([], self.get_completions('ape zap nosuchcontainer:'))
+
+    def test_active_container_products(self):
+        self.environ['CONTAINER_NAME'] = 'sdox'
+        self.assertEqual(['dev'], self.get_completions('ape zap d'))
+        self.assertEqual(['dev', 'prod', 'sdox:dev', 'sdox:prod', 'web:live'], self.get_completions('ape zap '))
+
+    def test_options(self):
+        self.assertEqual(['--level'], self.get_completions('ape validate --'))
+        self.assertEqual(['--level'], self.get_completions('ape validate sdox:dev '))
+        self.assertEqual([], self.get_completions('ape validate --level 1 sdox:dev '))
+        self.assertEqual([], self.get_completions('ape validate --level '))
+        self.assertEqual(['web:live'], self.get_completions('ape validate --level 1 w'))
+
+    def test_flags(self):
+        self.assertEqual(['--all'], self.get_completions('ape check --'))
+        self.assertEqual(['web:live'], self.get_completions('ape check --all w'))
+        self.assertEqual([], self.get_completions('ape check --all sdox:dev '))
+
+    def test_unknown_task(self):
+        self.assertEqual([], self.get_completions('ape nosuchtask '))
+
+    def test_build_index(self):
+        tasks = Tasks()
+        index = complete.build_index(tasks)
+        self.assertEqual(dict(positional=['task'], options=[], flags=[], varargs=False), index['help'])
+
+        @tasks.register(flags=['verbose'])
+        def check(poi, verbose=False, quiet=False):
+            pass
+
+        index = complete.build_index(tasks)
+        self.assertEqual(
+            dict(positional=['poi'], options=['--verbose', '--quiet'], flags=['--verbose'], varargs=False),
+            index['check']
+        )
+
+    def test_index_is_invalidated(self):
+        cache_dir = os.path.join(self.root_dir, 'cache')
+        watched = os.path.join(self.root_dir, 'tasks.py')
+        with open(watched, 'w') as f:
+            f.write('')
+        old_cache_dir = os.environ.get('APE_CACHE_DIR')
+        os.environ['APE_CACHE_DIR'] = cache_dir
+        try:
+            complete.cache.dump_json(complete.get_index_path(), dict(
+                tasks=INDEX,
+                mtimes={watched: complete.cache.get_mtime(watched)},
+            ))
+            self.assertEqual(INDEX, complete.load_index())
+            os.utime(watched, (0, 0))
+            self.assertIsNone(complete.load_index())
+        finally:
+            if old_cache_dir is None:
+                del os.environ['APE_CACHE_DIR']
+            else:
+                os.environ['APE_CACHE_DIR'] = old_cache_dir
@@ -1,5 +1,5 @@
 from __future__ import absolute_import
-from ape.feaquencer import detect_cycle, topsort
+from ape.feaquencer import detect_cycle, find_cycles, topsort
 try:
     from collections import OrderedDict
 except ImportError:
@@ -58,6 +58,51 @@ class TestCycleDetection(unittest.TestCase):
             )
         )
 
+    def test_cycle_behind_first_edge(self):
+        self.assertEqual(
+            ['c', 'd', 'c'],
+            detect_cycle(
+                OrderedDict([
+                    ('a', ['b', 'c']),
+                    ('b', []),
+                    ('c', ['d']),
+                    ('d', ['c'])
+                ])
+            )
+        )
+
+    def test_long_chain(self):
+        size = 100000
+        graph = dict((idx, [idx + 1]) for idx in range(size))
+        graph[size] = []
+        self.assertIsNone(detect_cycle(graph))
+        graph[size] = [0]
+        self.assertEqual(size + 1, len(find_cycles(graph)[0]))
+
+
+class TestFindCycles(unittest.TestCase):
+
+    def test_no_cycles(self):
+        self.assertEqual([], find_cycles(OrderedDict([('a', ['b', 'c']), ('b', ['c']), ('c', [])])))
+
+    def test_all_cycles(self):
+        graph = OrderedDict([
+            ('a', ['b']),
+            ('b', ['a', 'c']),
+            ('c', ['d']),
+            ('d', ['e']),
+            ('e', ['c', 'e']),
+            ('f', ['f']),
+            ('g', ['a']),
+        ])
+        self.assertEqual(
+            [['c', 'd', 'e'], ['a', 'b'], ['f']],
+            find_cycles(graph)
+        )
+
+    def test_missing_targets(self):
+        self.assertEqual([], find_cycles(dict(a=['b'])))
+
 
 class TestTopsort(unittest.TestCase):
     def setUp(self):
@@ -97,3 +142,29 @@ class TestTopsort(unittest.TestCase):
                 ('a', ['b']),
             ]))
         )
+
+    def test_key(self):
+        graph = OrderedDict([
+            ('c', ['a']),
+            ('b', []),
+            ('a', []),
+        ])
+        self.assertEqual(['b', 'c', 'a'], topsort(graph))
+        priority = dict(a=0, b=2, c=1)
+        self.assertEqual(['c', 'a', 'b'], topsort(graph, key=priority.get))
+
+    def test_ties_follow_graph_order(self):
+        graph = OrderedDict([
+            ('y', []),
+            ('x', []),
+        ])
+        self.assertEqual(['y', 'x'], topsort(graph, key=lambda node: 0))
+
+    def test_independent_of_iteration_order(self):
+        edges = [('e', 'a'), ('d', 'a'), ('b', 'c'), ('e', 'c')]
+        nodes = ['a', 'b', 'c', 'd', 'e', 'f']
+        orders = set()
+        for shuffled in (nodes, list(reversed(nodes)), nodes[3:] + nodes[:3]):
+            graph = OrderedDict((node, [target for source, target in edges if source == node]) for node in shuffled)
+            orders.add(tuple(topsort(graph)))
+        self.assertEqual(set([('b', 'd', 'e', 'a', 'c', 'f')]), orders)
@@ -0,0 +1,83 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import os
+import unittest
+from ape.container_mode import featuremodel
+from ape.container_mode import validators
+
+__all__ = ['FeatureModelValidatorTestCase']
+
+MODEL_XML_PATH = os.path.join(os.path.dirname(__file__), '_data/featuremodel.xml')
+
+
+class FeatureModelValidatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.model = validators.CompiledFeatureModel(featuremodel.parse_model_xml(MODEL_XML_PATH))
+
+    def test_valid(self):
+        self.assertEqual([], self.model.get_violations(['base', 'paypal', 'light']))
+        self.assertEqual([], self.model.get_violations(['base', 'invoice', 'light', 'debug']))
+        self.assertEqual([], self.model.get_violations(['base', 'dark']))
+
+    def test_tree_constraints(self):
+        self.assertEqual([
+            'base is mandatory for shop but not selected.',
+            'theme requires exactly one of light, dark but none is selected.',
+        ], self.model.get_violations([]))
+        self.assertEqual([
+            'theme requires exactly one of light, dark but light, dark are selected.',
+        ], self.model.get_violations(['base', 'light', 'dark']))
+        self.assertEqual(
+            ['unknown is not part of the feature model.'],
+            self.model.get_violations(['base', 'light', 'unknown'])
+        )
+
+    def test_cross_tree_constraints(self):
+        self.assertEqual(['constraint invoice => light is violated.'], self.model.get_violations(['base', 'invoice', 'dark']))
+        self.assertEqual(
+            ['constraint not (debug and paypal) is violated.'],
+            self.model.get_violations(['base', 'paypal', 'debug', 'light'])
+        )
+
+    def test_abstract_features(self):
+        model = validators.CompiledFeatureModel(featuremodel.FeatureModel(
+            features=['root', 'django', 'django__features__debug', 'platform', 'linux', 'docs'],
+            parents=[None, 0, 1, 0, 3, 0],
+            groups=['and', 'and', 'and', 'and', 'and', 'and'],
+            mandatory=[True, True, False, True, True, False],
+            abstract=[True, False, False, True, True, True],
+            constraints=[['eq', ['var', 'docs'], ['or', ['var', 'django__features__debug'], ['not', ['var', 'linux']]]]],
+        ))
+        # platform and linux are implied: there is nothing below them to select
+        self.assertEqual([], model.get_violations(['django']))
+        self.assertEqual([
+            'django is mandatory for root but not selected.',
+            'django.features.debug requires its parent feature django, which is not selected.',
+            'constraint docs <=> (django.features.debug or (not linux)) is violated.',
+        ], model.get_violations(['django__features__debug']))
+        self.assertEqual(
+            ['constraint docs <=> (django.features.debug or (not linux)) is violated.'],
+            model.get_violations(['django', 'django.features.debug'])
+        )
+
+    def test_mandatory_abstract_group_with_optional_children(self):
+        model = validators.CompiledFeatureModel(featuremodel.FeatureModel(
+            features=['root', 'base', 'extras', 'extras__a', 'extras__b'],
+            parents=[None, 0, 0, 2, 2],
+            groups=['and', 'and', 'and', 'and', 'and'],
+            mandatory=[True, True, True, False, False],
+            abstract=[True, False, True, False, False],
+        ))
+        # extras is selected with root, none of its children has to be
+        self.assertEqual([], model.get_violations(['base']))
+        self.assertEqual([], model.get_violations(['base', 'extras.a']))
+
+    def test_validator(self):
+        validator = validators.FeatureModelValidator(['base', 'invoice', 'dark'], self.model)
+        self.assertFalse(validator.check())
+        self.assertTrue(validator.has_errors())
+        self.assertEqual(['constraint invoice => light is violated.'], validator.get_violations())
+
+        validator = validators.FeatureModelValidator(['base', 'light'], featuremodel.parse_model_xml(MODEL_XML_PATH))
+        self.assertTrue(validator.check())
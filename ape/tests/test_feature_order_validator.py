@@ -2,6 +2,7 @@
 from __future__ import unicode_literals, print_function
 import unittest
 from ape.container_mode import validators
+from ape.container_mode.validators.bulk_order_validator import numpy
 
 __all__ = ['FeatureOrderValidatorTestCase']
 
@@ -77,3 +78,58 @@ class FeatureOrderValidatorTestCase(unittest.TestCase):
         validator.check_order()
         self.assertTrue(validator.has_errors())
         self.assertEqual(len(validator.get_violations()), 1)
+
+    def test_messages(self):
+        constraints = dict(
+            a=dict(before=['b'], position=0),
+            b=dict(after=['a']),
+        )
+        validator = validators.FeatureOrderValidator(['b', 'a'], constraints)
+        validator.check_order()
+        self.assertEqual([
+            ('a', 'a (pos 1) must be BEFORE feature b (pos 0) but isn\'t.'),
+            ('a', 'a has a forced position on (0) but is on position 1.'),
+            ('b', 'b (pos 0) must be AFTER feature a (pos 1) but isn\'t.'),
+        ], validator.get_violations())
+
+    def test_duplicate_features(self):
+        constraints = dict(b=dict(after=['a']))
+        validator = validators.FeatureOrderValidator(['b', 'a', 'b'], constraints)
+        self.assertEqual(0, validator.get_feature_position('b'))
+        validator.check_order()
+        self.assertEqual(1, len(validator.get_violations()))
+
+    def test_check_many(self):
+        constraints = dict(
+            b=dict(after=['a']),
+            c=dict(after=['b'], position=2),
+        )
+        feature_lists = [['a', 'b', 'c'], ['b', 'a', 'c'], ['c', 'b']]
+        checked = validators.FeatureOrderValidator.check_many(feature_lists, constraints)
+        for feature_list, validator in zip(feature_lists, checked):
+            single = validators.FeatureOrderValidator(feature_list, constraints)
+            single.check_order()
+            self.assertEqual(single.get_violations(), validator.get_violations())
+        self.assertEqual([0, 1, 2], [len(validator.get_violations()) for validator in checked])
+
+    def check_bulk(self, use_numpy):
+        constraints = dict(
+            a=dict(before=['b'], position=0),
+            b=dict(after=['a']),
+            c=dict(after=['b', 'x'], position=2),
+        )
+        feature_lists = [['a', 'b', 'c'], ['b', 'a', 'c'], ['c', 'b', 'b__x', 'a'], [], ['x']]
+        bulk = validators.BulkOrderValidator(constraints, use_numpy=use_numpy)
+        expected = [
+            validator.get_violations()
+            for validator in validators.FeatureOrderValidator.check_many(feature_lists, constraints)
+        ]
+        self.assertEqual(expected, bulk.get_violations(feature_lists))
+        self.assertEqual([0, 3, 5, 0, 0], [len(violations) for violations in expected])
+
+    def test_bulk(self):
+        self.check_bulk(use_numpy=False)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_bulk_numpy(self):
+        self.check_bulk(use_numpy=True)
@@ -0,0 +1,58 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import json
+import sys
+import unittest
+from ape import featureinfo
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+__all__ = ['FeatureInfoTestCase']
+
+
+class FeatureInfoTestCase(unittest.TestCase):
+
+    def test_get_feature_infos(self):
+        queried = []
+        query_repository = featureinfo._query_repository
+
+        def counting_query_repository(root):
+            queried.append(root)
+            return query_repository(root)
+
+        featureinfo._query_repository = counting_query_repository
+        try:
+            infos = featureinfo.get_feature_infos(
+                ['ape.feaquencer', 'ape.installtools', 'ape.missing_feature', 'ape.container_mode'], jobs=2
+            )
+        finally:
+            featureinfo._query_repository = query_repository
+
+        self.assertEqual(
+            ['ape.feaquencer', 'ape.installtools', 'ape.missing_feature', 'ape.container_mode'],
+            [info['name'] for info in infos]
+        )
+        self.assertIn('unable to import', infos[2]['error'])
+        # all features share the same repository (if any)
+        self.assertEqual(len(set(info['repository'] for info in infos if info['repository'])), len(queried))
+        self.assertLessEqual(len(queried), 1)
+
+    def test_output_formats(self):
+        infos = featureinfo.get_feature_infos(['ape.feaquencer', 'ape.missing_feature'], jobs=1)
+        stdout = sys.stdout
+        try:
+            for output_format in featureinfo.OUTPUT_FORMATS:
+                sys.stdout = StringIO()
+                featureinfo.print_infos(infos, output_format)
+                output = sys.stdout.getvalue()
+                sys.stdout = stdout
+                self.assertIn('ape.feaquencer', output)
+                if output_format == 'json':
+                    self.assertEqual(infos, json.loads(output))
+                elif output_format == 'table':
+                    self.assertEqual(3, len(output.splitlines()))
+        finally:
+            sys.stdout = stdout
+        self.assertRaises(ValueError, featureinfo.print_infos, infos, 'xml')
@@ -0,0 +1,53 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import os
+import shutil
+import tempfile
+import unittest
+from ape.container_mode import featuremodel
+
+__all__ = ['FeatureModelTestCase']
+
+MODEL_XML_PATH = os.path.join(os.path.dirname(__file__), '_data/featuremodel.xml')
+
+
+class FeatureModelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = dict(os.environ)
+        self.cache_dir = tempfile.mkdtemp()
+        os.environ['APE_CACHE_DIR'] = self.cache_dir
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.cache_dir)
+
+    def test_parse(self):
+        model = featuremodel.parse_model_xml(MODEL_XML_PATH)
+        self.assertEqual(
+            ['shop', 'base', 'payment', 'paypal', 'invoice', 'theme', 'light', 'dark', 'debug'],
+            model.features
+        )
+        self.assertEqual([None, 0, 0, 2, 2, 0, 5, 5, 0], model.parents)
+        self.assertEqual(['and', 'and', 'or', 'and', 'and', 'alt', 'and', 'and', 'and'], model.groups)
+        self.assertEqual([True, True, False, False, False, True, False, False, False], model.mandatory)
+        self.assertEqual([0, 2, 5], [idx for idx, abstract in enumerate(model.abstract) if abstract])
+        self.assertEqual([
+            ['imp', ['var', 'invoice'], ['var', 'light']],
+            ['not', ['and', ['var', 'debug'], ['var', 'paypal']]],
+        ], model.constraints)
+        self.assertEqual(['base', 'paypal', 'invoice'], model.feature_order)
+        self.assertEqual([[1, 2, 5, 8], [], [3, 4], [], [], [6, 7], [], [], []], model.get_children())
+
+    def test_cache(self):
+        model = featuremodel.load_model_xml(MODEL_XML_PATH)
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+        parse_model_xml = featuremodel.parse_model_xml
+        featuremodel.parse_model_xml = None
+        try:
+            cached = featuremodel.load_model_xml(MODEL_XML_PATH)
+        finally:
+            featuremodel.parse_model_xml = parse_model_xml
+        self.assertEqual(model.to_dict(), cached.to_dict())
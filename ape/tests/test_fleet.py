@@ -0,0 +1,121 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+from ape.container_mode import fleet
+
+__all__ = ['FleetValidationTestCase']
+
+CONSTRAINTS = dict(
+    feature_b=dict(after=['feature_a']),
+)
+
+MODEL_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<featureModel>
+    <struct>
+        <alt abstract="true" mandatory="true" name="sdox">
+            <feature name="feature_a"/>
+            <feature name="feature_b"/>
+        </alt>
+    </struct>
+</featureModel>
+'''
+
+
+class FleetValidationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.make_file('sdox/_lib/featuremodel/productline/feature_order.json', json.dumps(CONSTRAINTS))
+        self.make_file('sdox/products/dev/product.equation', 'feature_a\nfeature_b\n')
+        self.make_file('sdox/products/prod/product.equation', 'feature_b\nfeature_a\n')
+        os.makedirs(os.path.join(self.root_dir, 'sdox/products/broken'))
+        self.make_file('web/products/live/product.equation', 'feature_a\n')
+        self.containers = [
+            ('sdox', os.path.join(self.root_dir, 'sdox'), ['broken', 'dev', 'prod']),
+            ('web', os.path.join(self.root_dir, 'web'), ['live']),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def make_file(self, rel_path, content):
+        path = os.path.join(self.root_dir, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def check_results(self, results):
+        results = dict((result['poi'], result) for result in results)
+        self.assertEqual(['sdox:broken', 'sdox:dev', 'sdox:prod', 'web:live'], sorted(results))
+        self.assertTrue(fleet.is_valid(results['sdox:dev']))
+        self.assertEqual(1, len(results['sdox:prod']['order_violations']))
+        self.assertIn('product.equation', results['sdox:broken']['error'])
+        self.assertIn('feature order constraints', results['web:live']['error'])
+
+    def test_validate_in_process(self):
+        self.check_results(fleet.validate_products(self.containers, jobs=1))
+
+    def test_validate_in_pool(self):
+        self.check_results(fleet.validate_products(self.containers, jobs=2))
+
+    def test_validate_container(self):
+        sdox = fleet.load_container(os.path.join(self.root_dir, 'sdox'))
+        web = fleet.load_container(os.path.join(self.root_dir, 'web'))
+        self.check_results(
+            fleet.validate_container('sdox', sdox, ['broken', 'dev', 'prod']) +
+            fleet.validate_container('web', web, ['live'])
+        )
+
+    def test_reports(self):
+        results = fleet.validate_products(self.containers, jobs=1)
+
+        report = fleet.to_json(results)
+        self.assertEqual(4, report['products'])
+        self.assertEqual(3, report['failed'])
+        json.dumps(report)
+
+        root = fleet.to_junit(results)
+        self.assertEqual(('4', '1', '2'), (root.get('tests'), root.get('failures'), root.get('errors')))
+        path = os.path.join(self.root_dir, 'report.xml')
+        fleet.write_report(results, path, 'junit')
+        suites = ElementTree.parse(path).getroot().findall('testsuite')
+        self.assertEqual(['sdox', 'web'], [suite.get('name') for suite in suites])
+
+    def test_feature_model(self):
+        self.make_file('sdox/_lib/featuremodel/productline/model.xml', MODEL_XML)
+        self.make_file('sdox/products/broken/product.equation', 'feature_b\n')
+        sdox = fleet.load_container(os.path.join(self.root_dir, 'sdox'))
+        for results in (
+            fleet.validate_products(self.containers[:1], jobs=1),
+            fleet.validate_products(self.containers[:1], jobs=2),
+            fleet.validate_container('sdox', sdox, ['broken', 'dev', 'prod']),
+        ):
+            results = dict((result['product'], result) for result in results)
+            self.assertTrue(results['dev']['model_checked'])
+            self.assertTrue(fleet.is_valid(results['broken']))
+            self.assertFalse(fleet.is_valid(results['dev']))
+            self.assertEqual(
+                ['sdox requires exactly one of feature_a, feature_b but feature_a, feature_b are selected.'],
+                fleet.get_messages(results['dev'])
+            )
+
+        self.make_file('sdox/_lib/featuremodel/productline/model.xml', '<featureModel>')
+        self.assertIn('feature model', fleet.load_container(os.path.join(self.root_dir, 'sdox'))['error'])
+
+    def test_malformed_product_spec(self):
+        sdox_dir = os.path.join(self.root_dir, 'sdox')
+        for args in (['init', '-q'], ['remote', 'add', 'origin', 'https://example.com/sdox.git']):
+            subprocess.check_call(['git'] + args, cwd=sdox_dir)
+        self.make_file('sdox/_lib/featuremodel/productline/products/sdox/product_spec.json', '{')
+        self.assertIn('product spec', fleet.load_container(sdox_dir)['error'])
+        # the other containers are validated anyway
+        results = dict((result['poi'], result) for result in fleet.validate_products(self.containers, jobs=1))
+        self.assertIn('product spec', results['sdox:dev']['error'])
+        self.assertIn('feature order constraints', results['web:live']['error'])
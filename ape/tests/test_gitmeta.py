@@ -0,0 +1,83 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from ape import gitmeta
+from ape.container_mode import utils
+
+__all__ = ['GitMetadataTestCase']
+
+
+class GitMetadataTestCase(unittest.TestCase):
+
+    def setUp(self):
+        gitmeta.clear_cache()
+        self.root_dir = tempfile.mkdtemp()
+        self.repo_dir = os.path.join(self.root_dir, 'container')
+        os.makedirs(os.path.join(self.repo_dir, 'sub'))
+        self.git('init', '-q')
+        self.git('config', 'user.email', 'ape@example.com')
+        self.git('config', 'user.name', 'ape')
+        self.git('remote', 'add', 'origin', 'git@example.com:foo/bar.git')
+        self.commit('readme', 'first')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+        gitmeta.clear_cache()
+
+    def git(self, *args):
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(('git',) + args, cwd=self.repo_dir, stdout=devnull)
+
+    def commit(self, name, content):
+        with open(os.path.join(self.repo_dir, name), 'w') as f:
+            f.write(content)
+        self.git('add', name)
+        self.git('commit', '-q', '-m', content)
+
+    def test_find_repository(self):
+        sub_dir = os.path.join(self.repo_dir, 'sub')
+        self.assertEqual(self.repo_dir, gitmeta.find_repository(sub_dir)[0])
+        self.assertIsNone(gitmeta.find_repository(sub_dir, search_parent_directories=False))
+        self.assertIsNone(gitmeta.find_repository(self.root_dir))
+
+    def test_remote_url(self):
+        self.assertEqual('bar', utils.get_repo_name(self.repo_dir))
+        self.git('remote', 'set-url', 'origin', 'git@example.com:foo/baz.git')
+        self.assertEqual('baz', utils.get_repo_name(self.repo_dir))
+        self.assertRaises(gitmeta.GitError, utils.get_repo_name, os.path.join(self.repo_dir, 'sub'))
+        self.assertRaises(gitmeta.GitError, gitmeta.get_remote_url, self.repo_dir, 'upstream')
+
+    def test_head_rev(self):
+        rev = gitmeta.get_head_rev(os.path.join(self.repo_dir, 'sub'))
+        self.assertEqual(40, len(rev))
+        self.commit('readme', 'second')
+        self.assertNotEqual(rev, gitmeta.get_head_rev(self.repo_dir))
+        self.assertIsNone(gitmeta.get_head_rev(self.root_dir))
+
+    def test_memoized(self):
+        calls = []
+        run_git = gitmeta._run_git
+
+        def counting_run_git(work_tree, args):
+            calls.append(args[0])
+            return run_git(work_tree, args)
+
+        gitmeta._run_git = counting_run_git
+        try:
+            for _ in range(3):
+                gitmeta.get_head_rev(self.repo_dir)
+                gitmeta.get_changed_files(self.repo_dir)
+        finally:
+            gitmeta._run_git = run_git
+        self.assertEqual(['rev-parse', 'diff'], calls)
+
+    def test_changed_files(self):
+        self.assertEqual([], gitmeta.get_changed_files(self.repo_dir))
+        with open(os.path.join(self.repo_dir, 'readme'), 'w') as f:
+            f.write('changed')
+        gitmeta.clear_cache()
+        self.assertEqual(['readme'], gitmeta.get_changed_files(os.path.join(self.repo_dir, 'sub')))
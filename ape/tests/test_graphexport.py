@@ -0,0 +1,73 @@
+# coding: utf-8
+from __future__ import unicode_literals
+import io
+import json
+import unittest
+import xml.etree.ElementTree as ElementTree
+from ape.feaquencer import (
+    get_feature_graph,
+    get_neighborhood,
+    get_reachable,
+    get_reversed_graph,
+    get_subgraph,
+    to_graphviz,
+    write_graph,
+)
+
+__all__ = ['GraphExportTestCase']
+
+FEATURE_DEPENDENCIES = dict(
+    core=dict(first=True),
+    admin=dict(after=['core']),
+    theme=dict(after=['core']),
+    shop=dict(after=['admin', 'theme']),
+    development=dict(last=True),
+)
+
+
+class GraphExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = get_feature_graph(FEATURE_DEPENDENCIES)
+
+    def write(self, graph_format, graph=None):
+        stream = io.StringIO()
+        write_graph(self.graph if graph is None else graph, stream, graph_format)
+        return stream.getvalue()
+
+    def test_feature_graph(self):
+        self.assertEqual(['admin', 'core', 'development', 'shop', 'theme'], list(self.graph))
+        self.assertEqual(['admin', 'theme'], self.graph['core'])
+        self.assertEqual(['shop'], self.graph['admin'])
+        self.assertEqual([], self.graph['development'])
+
+    def test_graphviz(self):
+        dot = to_graphviz(dict(a=['b "quoted"']))
+        self.assertEqual('digraph g {\n  "a";\n  "a" -> "b \\"quoted\\"";\n}\n', dot)
+        self.assertEqual(self.write('dot'), to_graphviz(self.graph))
+
+    def test_graphml(self):
+        ns = '{http://graphml.graphdrawing.org/xmlns}'
+        root = ElementTree.fromstring(self.write('graphml').encode('utf-8'))
+        graph = root.find(ns + 'graph')
+        self.assertEqual(list(self.graph), [node.get('id') for node in graph.findall(ns + 'node')])
+        edges = [(edge.get('source'), edge.get('target')) for edge in graph.findall(ns + 'edge')]
+        self.assertEqual(
+            [('admin', 'shop'), ('core', 'admin'), ('core', 'theme'), ('theme', 'shop')],
+            edges
+        )
+
+    def test_json(self):
+        self.assertEqual(dict(self.graph), json.loads(self.write('json')))
+        self.assertEqual({}, json.loads(self.write('json', {})))
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, self.write, 'svg')
+
+    def test_filters(self):
+        ancestors = get_reachable(get_reversed_graph(self.graph), ['admin'])
+        self.assertEqual(set(['admin', 'core']), ancestors)
+        self.assertEqual(dict(core=['admin'], admin=[]), dict(get_subgraph(self.graph, ancestors)))
+        self.assertEqual(set(['admin', 'core', 'shop']), get_neighborhood(self.graph, 'admin', 1))
+        self.assertEqual(set(['admin', 'core', 'shop', 'theme']), get_neighborhood(self.graph, 'admin', 2))
+        self.assertEqual(set(['development']), get_neighborhood(self.graph, 'development', 3))
@@ -2,8 +2,14 @@ from __future__ import absolute_import, unicode_literals
 import unittest
 
 import copy
+import json
+import os
+import shutil
+import tempfile
 from ape.feaquencer import (
     get_total_order,
+    CompiledFeatureOrder,
+    CyclicDependencyError,
     MultipleFirstConditionsError,
     MultipleLastConditionsError
 )
@@ -81,3 +87,106 @@ class OrderValidationTest(unittest.TestCase):
         fd = copy.deepcopy(feature_dependencies)
         order = get_total_order(feature_selection, fd)
         self.assertTrue(order.index('django_productline.features.development') == len(order) - 1)
+
+    def test_cyclic_conditions(self):
+        fd = copy.deepcopy(feature_dependencies)
+        fd['styler']['after'].append('statics')
+        fd['schnadmin2_sidenav']['after'].append('schnadmin2_sidenav')
+        with self.assertRaises(CyclicDependencyError) as cm:
+            get_total_order(feature_selection, fd)
+        cycles = sorted(sorted(cycle) for cycle in cm.exception.cycles)
+        self.assertEqual([['lessbuilder', 'statics', 'styler'], ['schnadmin2_sidenav']], cycles)
+        conflicts = set(conflict for cycle_conflicts in cm.exception.conflicts for conflict in cycle_conflicts)
+        self.assertEqual(set([
+            ('styler', 'statics'),
+            ('statics', 'lessbuilder'),
+            ('lessbuilder', 'styler'),
+            ('schnadmin2_sidenav', 'schnadmin2_sidenav'),
+        ]), conflicts)
+
+    def test_total_order_is_deterministic(self):
+        expected = [
+            'django_productline',
+            'styler',
+            'django_productline.features.djpladmin',
+            'lessbuilder',
+            'schnadmin2',
+            'schnadmin2_sidenav',
+            'statics',
+            'django_productline.features.development',
+        ]
+        self.assertEqual(expected, get_total_order(feature_selection, feature_dependencies))
+        reversed_dependencies = dict(reversed(list(feature_dependencies.items())))
+        self.assertEqual(expected, get_total_order(feature_selection, reversed_dependencies))
+
+    def test_compiled_order(self):
+        compiled = CompiledFeatureOrder(feature_dependencies)
+        for selection in (feature_selection, feature_selection[::-1], feature_selection[2:], []):
+            self.assertEqual(get_total_order(selection, feature_dependencies), compiled.get_total_order(selection))
+        # features without conditions are ordered by selection
+        self.assertEqual(
+            ['django_productline', 'unknown', 'styler', 'django_productline.features.development'],
+            compiled.get_total_order(['unknown', 'styler', 'django_productline.features.development', 'django_productline'])
+        )
+
+    def test_compiled_order_dump_load(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'feature_order.json')
+            with open(path, 'w') as f:
+                f.write(json.dumps(feature_dependencies))
+            compiled = CompiledFeatureOrder.from_file(path, cache_dir=tmp_dir)
+            cached = [name for name in os.listdir(tmp_dir) if name.endswith('.pickle')]
+            self.assertEqual(1, len(cached))
+            loaded = CompiledFeatureOrder.load(os.path.join(tmp_dir, cached[0]))
+            self.assertEqual(compiled.get_total_order(feature_selection), loaded.get_total_order(feature_selection))
+            self.assertEqual(
+                get_total_order(feature_selection, feature_dependencies),
+                CompiledFeatureOrder.from_file(path, cache_dir=tmp_dir).get_total_order(feature_selection)
+            )
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_update_order(self):
+        compiled = CompiledFeatureOrder(feature_dependencies)
+        previous = compiled.get_total_order([feature for feature in feature_selection if feature != 'schnadmin2'])
+        order, moved = compiled.update_order(previous, added=['schnadmin2'], removed=['statics'])
+        self.assertEqual([], moved)
+        self.assertEqual([feature for feature in previous if feature != 'statics'],
+                         [feature for feature in order if feature != 'schnadmin2'])
+        self.assertLess(order.index('schnadmin2'), order.index('schnadmin2_sidenav'))
+        self.assertEqual(set(feature_selection) - set(['statics']), set(order))
+
+    def test_update_order_repairs_region(self):
+        compiled = CompiledFeatureOrder(dict(
+            middle=dict(after=['a']),
+            b=dict(after=['middle']),
+        ))
+        # a and b are in the wrong order for middle; c and d are not affected
+        order, moved = compiled.update_order(['c', 'b', 'd', 'a'], added=['middle'])
+        self.assertEqual(['c', 'a', 'd', 'middle', 'b'], order)
+        self.assertEqual(['a', 'b'], moved)
+
+    def test_update_invalid_order(self):
+        compiled = CompiledFeatureOrder(dict(b=dict(after=['a'])))
+        self.assertFalse(compiled.is_valid_order(['b', 'a']))
+        self.assertEqual((['a', 'b'], ['a']), compiled.update_order(['b', 'a']))
+        order, moved = compiled.update_order(['c', 'b', 'd', 'a'], added=['e'], removed=['c'])
+        self.assertEqual(['d', 'a', 'b', 'e'], order)
+        self.assertEqual(['b'], moved)
+        # the last feature has to be at the end
+        compiled = CompiledFeatureOrder(dict(z=dict(last=True)))
+        self.assertFalse(compiled.is_valid_order(['z', 'a']))
+        self.assertEqual((['a', 'z'], ['a']), compiled.update_order(['z', 'a']))
+
+    def test_cycles_outside_of_selection(self):
+        fd = copy.deepcopy(feature_dependencies)
+        fd['unused_a'] = dict(after=['unused_b'])
+        fd['unused_b'] = dict(after=['unused_a', 'styler'])
+        # only the conditions of the selected features and the features they come after are checked
+        self.assertEqual(
+            get_total_order(feature_selection, feature_dependencies),
+            get_total_order(feature_selection, fd)
+        )
+        self.assertRaises(CyclicDependencyError, get_total_order, feature_selection + ['unused_a'], fd)
+        self.assertRaises(CyclicDependencyError, CompiledFeatureOrder, fd)
@@ -0,0 +1,192 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import importlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from ape import cache, plan
+from ape.exceptions import FeatureNotFound
+
+__all__ = ['CompositionPlanTestCase']
+
+TASKS_D = '''
+from ape import tasks
+
+def refine_explain_features(original):
+    def explain_features(output_format='text', jobs=8):
+        tasks.helper_d()
+        original(output_format, jobs)
+    return explain_features
+'''
+
+TASKS_E = '''
+from ape import tasks
+
+@tasks.register
+def hello():
+    print('hello')
+'''
+
+TASKS_F = '''
+from ape import tasks
+
+def refine_hello(original):
+    def hello():
+        original()
+        print('refined')
+    return hello
+
+@tasks.register
+def other():
+    print('other')
+'''
+
+TASKS_G = '''
+from ape import tasks
+
+@tasks.register
+def collect():
+    print('collected')
+'''
+
+TASKS_H = '''
+from ape import tasks
+
+def _collect():
+    tasks.collect()
+
+@tasks.register
+def deploy():
+    _collect()
+'''
+
+
+def invalidate_import_caches():
+    # importlib.invalidate_caches is not available on python 2
+    getattr(importlib, 'invalidate_caches', lambda: None)()
+
+
+class CompositionPlanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.old_cache_dir = os.environ.get('APE_CACHE_DIR')
+        os.environ['APE_CACHE_DIR'] = self.cache_dir
+        sys.path.insert(0, self.tmp_dir)
+        self.make_module('plan_feature_a/__init__.py')
+        self.make_module('plan_feature_a/tasks.py')
+        self.make_module('plan_feature_b/__init__.py')
+        self.make_module('plan_feature_c/__init__.py')
+        self.make_module('plan_feature_c/apetasks.py')
+        self.make_module('plan_feature_d/__init__.py')
+        self.make_module('plan_feature_d/tasks.py', TASKS_D)
+        self.make_module('plan_feature_e/__init__.py')
+        self.make_module('plan_feature_e/tasks.py', TASKS_E)
+        self.make_module('plan_feature_f/__init__.py')
+        self.make_module('plan_feature_f/tasks.py', TASKS_F)
+        self.make_module('plan_feature_g/__init__.py')
+        self.make_module('plan_feature_g/tasks.py', TASKS_G)
+        self.make_module('plan_feature_h/__init__.py')
+        self.make_module('plan_feature_h/tasks.py', TASKS_H)
+        invalidate_import_caches()
+
+    def tearDown(self):
+        sys.path.remove(self.tmp_dir)
+        for name in list(sys.modules):
+            if name.startswith('plan_feature_'):
+                del sys.modules[name]
+        if self.old_cache_dir is None:
+            del os.environ['APE_CACHE_DIR']
+        else:
+            os.environ['APE_CACHE_DIR'] = self.old_cache_dir
+        shutil.rmtree(self.tmp_dir)
+
+    def make_module(self, rel_path, source=''):
+        path = os.path.join(self.tmp_dir, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(source)
+
+    def get_module_names(self, features):
+        return [module.__name__ for module in plan.iter_task_modules(features)]
+
+    def test_plan_is_stored(self):
+        features = ['plan_feature_a', 'plan_feature_b', 'plan_feature_c']
+        self.assertEqual(['plan_feature_a.tasks', 'plan_feature_c.apetasks'], self.get_module_names(features))
+
+        planned = plan.load_plan(plan.get_plan_path(features))
+        self.assertEqual(set(features), set(planned))
+        self.assertEqual([], planned['plan_feature_b']['modules'])
+
+        # cached plan yields the same modules
+        self.assertEqual(['plan_feature_a.tasks', 'plan_feature_c.apetasks'], self.get_module_names(features))
+
+    def test_new_tasks_module_invalidates_entry(self):
+        features = ['plan_feature_b']
+        self.assertEqual([], self.get_module_names(features))
+
+        self.make_module('plan_feature_b/tasks.py')
+        package_dir = os.path.join(self.tmp_dir, 'plan_feature_b')
+        mtime = cache.get_mtime(package_dir)
+        os.utime(package_dir, (mtime + 10, mtime + 10))
+        invalidate_import_caches()
+
+        self.assertEqual({}, plan.load_plan(plan.get_plan_path(features)))
+        self.assertEqual(['plan_feature_b.tasks'], self.get_module_names(features))
+
+    def test_feature_not_found(self):
+        self.assertRaises(FeatureNotFound, self.get_module_names, ['plan_feature_missing'])
+
+    def test_lazy_selection(self):
+        features = ['plan_feature_a', 'plan_feature_b', 'plan_feature_c', 'plan_feature_d']
+        self.assertIsNone(plan.select_features(features, {}, 'explain_features'))
+        self.get_module_names(features)
+
+        planned = plan.load_plan(plan.get_plan_path(features))
+        # explain_features is a global task refined by feature d
+        self.assertEqual(set(['plan_feature_d']), plan.select_features(features, planned, 'explain_features'))
+        self.assertEqual(set(), plan.select_features(features, planned, 'selftest'))
+        self.assertIsNone(plan.select_features(features, planned, 'help'))
+        self.assertEqual(['plan_feature_d.tasks'], [
+            module.__name__ for module in plan.iter_task_modules(features, taskname='explain_features')
+        ])
+
+    def test_lazy_selection_includes_refined_base(self):
+        features = ['plan_feature_a', 'plan_feature_e', 'plan_feature_f']
+        self.get_module_names(features)
+        planned = plan.load_plan(plan.get_plan_path(features))
+        # feature f provides other, but its task module also refines hello of feature e
+        self.assertEqual(set(['plan_feature_e', 'plan_feature_f']), plan.select_features(features, planned, 'other'))
+        self.assertEqual(set(['plan_feature_e', 'plan_feature_f']), plan.select_features(features, planned, 'hello'))
+
+    def run_lazily(self, product_equation, taskname):
+        env = dict(os.environ)
+        env.update(
+            APE_LAZY_COMPOSITION='1',
+            PRODUCT_EQUATION=product_equation,
+            PYTHONPATH=os.pathsep.join([
+                self.tmp_dir, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            ]),
+        )
+        env.pop('APE_PREPEND_FEATURES', None)
+        output = subprocess.check_output([sys.executable, '-m', 'ape.main', taskname], env=env, cwd=self.tmp_dir)
+        return output.decode('utf-8').strip()
+
+    def test_lazy_run_refining_across_features(self):
+        # the first run composes everything and stores the plan, the second one composes lazily
+        for _ in range(2):
+            self.assertEqual('other', self.run_lazily('plan_feature_e plan_feature_f', 'other'))
+
+    def test_lazy_selection_through_helper_function(self):
+        features = ['plan_feature_a', 'plan_feature_g', 'plan_feature_h']
+        self.get_module_names(features)
+        planned = plan.load_plan(plan.get_plan_path(features))
+        # deploy of feature h uses collect of feature g through a plain module function
+        self.assertEqual(set(['plan_feature_g', 'plan_feature_h']), plan.select_features(features, planned, 'deploy'))
+        for _ in range(2):
+            self.assertEqual('collected', self.run_lazily('plan_feature_g plan_feature_h', 'deploy'))
@@ -0,0 +1,38 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import unittest
+from ape.container_mode import validators
+
+__all__ = ['ProductSpecValidatorTestCase']
+
+SPEC = [
+    dict(products=['dev', 'prod'], mandatory=['feature_a', 'feature_a__sub'], never=['feature_debug']),
+    dict(products=['prod'], mandatory=['feature_b'], never=['feature_a__sub']),
+    dict(products=['live'], mandatory=[], never=[]),
+]
+
+
+class ProductSpecValidatorTestCase(unittest.TestCase):
+
+    def test_validator(self):
+        validator = validators.ProductSpecValidator(None, 'dev', ['feature_a', 'feature_debug'], spec_entries=SPEC)
+        self.assertFalse(validator.is_valid())
+        self.assertEqual(['feature_a__sub'], validator.get_errors_mandatory())
+        self.assertEqual(['feature_debug'], validator.get_errors_never())
+
+        validator = validators.ProductSpecValidator(None, 'dev', ['feature_a', 'feature_a.sub'], spec_entries=SPEC)
+        self.assertTrue(validator.is_valid())
+
+    def test_index(self):
+        index = validators.ProductSpecIndex(SPEC)
+        self.assertEqual(
+            (['feature_a', 'feature_b'], ['feature_a__sub']),
+            index.get_errors('prod', ['feature_a.sub'])
+        )
+        self.assertEqual(([], []), index.get_errors('live', ['feature_debug']))
+        self.assertEqual(([], []), index.get_errors('unknown', []))
+
+        validator = validators.ProductSpecValidator(None, 'prod', ['feature_a', 'feature_b'], spec_index=index)
+        self.assertFalse(validator.is_valid())
+        self.assertEqual(['feature_a__sub'], validator.get_errors_mandatory())
+        self.assertEqual([], validator.get_errors_never())
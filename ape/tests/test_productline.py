@@ -0,0 +1,95 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from ape.container_mode import productline
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+__all__ = ['ProductLineTestCase']
+
+PRODUCTLINE_DIR = 'sdox/_lib/featuremodel/productline'
+MODEL_XML_PATH = os.path.join(os.path.dirname(__file__), '_data/featuremodel.xml')
+
+
+class ProductLineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.make_file(PRODUCTLINE_DIR + '/feature_order.json', json.dumps(dict(feature_b=dict(after=['feature_a']))))
+        self.make_file(PRODUCTLINE_DIR + '/products/sdox/dev/product.equation.config', (
+            'feature_b\n'
+            'abstract_feature\n'
+            '\n'
+            'feature_a\n'
+            'feature_a__features__sub\n'
+        ))
+        self.make_file(PRODUCTLINE_DIR + '/products/sdox/prod/product.equation.config', 'feature_a\n')
+        self.make_file(PRODUCTLINE_DIR + '/products/sdox/product_spec.json', json.dumps([
+            dict(products=['dev'], mandatory=['feature_c'], never=[]),
+        ]))
+        self.container_dir = os.path.join(self.root_dir, 'sdox')
+        self.productline = productline.ProductLine(self.container_dir, repo_name='sdox')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def make_file(self, rel_path, content):
+        path = os.path.join(self.root_dir, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_read_config(self):
+        path = self.productline.get_paths('dev').config_file_path
+        self.assertEqual(['feature_b', 'feature_a', 'feature_a.features.sub'], list(productline.read_config(path)))
+
+    def test_write_if_changed(self):
+        path = os.path.join(self.root_dir, 'product.equation')
+        self.assertTrue(productline.write_if_changed(path, ['feature_a', 'feature_b']))
+        self.assertFalse(productline.write_if_changed(path, ['feature_a', 'feature_b']))
+        self.assertTrue(productline.write_if_changed(path, ['feature_a']))
+        with open(path) as f:
+            self.assertEqual('feature_a\n', f.read())
+
+    def test_productline(self):
+        self.assertEqual(['dev', 'prod'], self.productline.get_configured_products())
+        self.assertEqual(['feature_a', 'feature_b'], self.productline.feature_order.get_total_order(['feature_b', 'feature_a']))
+        self.assertEqual(['feature_b'], [entry[0] for entry in self.productline.constraints.entries])
+        self.assertIs(self.productline.spec_index, self.productline.spec_index)
+
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.assertTrue(self.productline.print_validation('prod', ['feature_a', 'feature_b']))
+            self.assertFalse(self.productline.print_validation('prod', ['feature_b', 'feature_a']))
+            self.assertFalse(self.productline.print_validation('dev', ['feature_a', 'feature_b']))
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertIn('must be AFTER feature feature_a', output)
+        self.assertIn("missing ['feature_c']", output)
+
+    def test_feature_model(self):
+        self.assertIsNone(self.productline.model)
+        with open(MODEL_XML_PATH) as f:
+            self.make_file(PRODUCTLINE_DIR + '/model.xml', f.read())
+        self.productline = productline.ProductLine(self.container_dir, repo_name='sdox')
+        self.assertEqual('shop', self.productline.model.names[0])
+
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.assertTrue(self.productline.print_validation('prod', ['base', 'paypal', 'light']))
+            self.assertFalse(self.productline.print_validation('prod', ['base', 'invoice', 'dark']))
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertIn('constraint invoice => light is violated.', output)
@@ -0,0 +1,68 @@
+# coding: utf-8
+from __future__ import unicode_literals
+import unittest
+from ape.feaquencer import (
+    CompiledFeatureOrder,
+    FeatureOrderQuery,
+    UnknownConstraintError,
+    UnknownFeatureError,
+)
+from ape.tests.test_order_validation import feature_dependencies, feature_selection
+
+__all__ = ['FeatureOrderQueryTestCase']
+
+
+class FeatureOrderQueryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.query = FeatureOrderQuery(CompiledFeatureOrder(feature_dependencies))
+
+    def test_is_before(self):
+        self.assertTrue(self.query.is_before('styler', 'schnadmin2_sidenav'))
+        self.assertFalse(self.query.is_before('schnadmin2_sidenav', 'styler'))
+        self.assertFalse(self.query.is_before('statics', 'schnadmin2'))
+        self.assertFalse(self.query.is_before('schnadmin2', 'statics'))
+        self.assertRaises(UnknownFeatureError, self.query.is_before, 'styler', 'unknown')
+
+    def test_explain(self):
+        self.assertEqual([
+            ('styler', 'lessbuilder', 'after'),
+            ('lessbuilder', 'schnadmin2', 'after'),
+            ('schnadmin2', 'schnadmin2_sidenav', 'after'),
+        ], self.query.explain('styler', 'schnadmin2_sidenav'))
+        self.assertEqual(
+            [('statics', 'django_productline.features.development', 'last')],
+            self.query.explain('statics', 'django_productline.features.development')
+        )
+        self.assertEqual(
+            [('django_productline', 'statics', 'first')],
+            self.query.explain('django_productline', 'statics')
+        )
+        self.assertIsNone(self.query.explain('statics', 'schnadmin2'))
+
+    def test_before_and_after(self):
+        self.assertEqual(
+            ['django_productline', 'django_productline.features.djpladmin', 'lessbuilder', 'styler'],
+            self.query.get_before('schnadmin2')
+        )
+        self.assertEqual(
+            ['django_productline.features.development', 'schnadmin2_sidenav'],
+            self.query.get_after('schnadmin2')
+        )
+
+    def test_impact(self):
+        self.assertEqual([
+            ('lessbuilder', ['schnadmin2', 'schnadmin2_sidenav']),
+            ('styler', ['schnadmin2', 'schnadmin2_sidenav']),
+        ], self.query.get_impact('schnadmin2', 'lessbuilder'))
+        # still ordered by the implicit conditions of the first feature
+        self.assertEqual([], self.query.get_impact('styler', 'django_productline'))
+        self.assertRaises(UnknownConstraintError, self.query.get_impact, 'styler', 'lessbuilder')
+
+    def test_moved(self):
+        selection = ['schnadmin2', 'statics', 'lessbuilder', 'styler']
+        order, new_order, moved = self.query.get_moved('lessbuilder', 'styler', selection)
+        self.assertEqual(['styler', 'lessbuilder', 'statics', 'schnadmin2'], order)
+        self.assertEqual(['lessbuilder', 'statics', 'styler', 'schnadmin2'], new_order)
+        self.assertEqual(['lessbuilder', 'statics', 'styler'], moved)
+        self.assertEqual([], self.query.get_moved('statics', 'lessbuilder', feature_selection)[2])
@@ -0,0 +1,101 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import os
+import shutil
+import tempfile
+import unittest
+from ape import registry
+
+__all__ = ['ContainerRegistryTestCase']
+
+
+class ContainerRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ['APE_CACHE_DIR'] = self.cache_dir
+        for path in ('sdox/products/dev', 'sdox/products/_lib', 'web/products/live', 'notacontainer'):
+            os.makedirs(os.path.join(self.root_dir, path))
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.root_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def touch_later(self, path):
+        # make sure the modification time changes on file systems with coarse timestamps
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    def test_lookups(self):
+        containers = registry.ContainerRegistry(self.root_dir)
+        self.assertEqual(['sdox', 'web'], containers.get_containers())
+        self.assertEqual(['dev'], containers.get_products('sdox'))
+        self.assertIsNone(containers.get_products('notacontainer'))
+        self.assertTrue(containers.has_container('web'))
+        self.assertFalse(containers.has_container('notacontainer'))
+        self.assertFalse(containers.has_container('missing'))
+        self.assertTrue(containers.has_product('sdox', 'dev'))
+        self.assertFalse(containers.has_product('sdox', '_lib'))
+        self.assertEqual(frozenset(['dev']), containers.get_product_set('sdox'))
+        self.assertIsNone(containers.get_product_set('notacontainer'))
+
+    def test_changes(self):
+        containers = registry.ContainerRegistry(self.root_dir)
+        containers.get_containers()
+        self.assertFalse(containers.has_product('sdox', 'prod'))
+
+        os.makedirs(os.path.join(self.root_dir, 'sdox/products/prod'))
+        self.touch_later(os.path.join(self.root_dir, 'sdox/products'))
+        self.assertTrue(containers.has_product('sdox', 'prod'))
+        self.assertEqual(['dev', 'prod'], containers.get_products('sdox'))
+
+        os.makedirs(os.path.join(self.root_dir, 'notacontainer/products/live'))
+        self.touch_later(os.path.join(self.root_dir, 'notacontainer'))
+        self.assertEqual(['notacontainer', 'sdox', 'web'], containers.get_containers())
+
+        shutil.rmtree(os.path.join(self.root_dir, 'web'))
+        self.touch_later(self.root_dir)
+        self.assertEqual(['notacontainer', 'sdox'], containers.get_containers())
+        self.assertFalse(containers.has_container('web'))
+
+    def test_snapshot(self):
+        registry.ContainerRegistry(self.root_dir).get_containers()
+
+        scanned = []
+        scan_entry = registry.ContainerRegistry._scan_entry
+
+        def counting_scan_entry(self, name):
+            scanned.append(name)
+            return scan_entry(self, name)
+
+        registry.ContainerRegistry._scan_entry = counting_scan_entry
+        try:
+            containers = registry.ContainerRegistry(self.root_dir)
+            self.assertEqual(['sdox', 'web'], containers.get_containers())
+            self.assertEqual([], scanned)
+
+            os.makedirs(os.path.join(self.root_dir, 'shop/products/live'))
+            self.touch_later(self.root_dir)
+            self.assertEqual(['sdox', 'shop', 'web'], containers.get_containers())
+            self.assertEqual(['shop'], scanned)
+        finally:
+            registry.ContainerRegistry._scan_entry = scan_entry
+
+    def test_get_container_dir(self):
+        # containers kept in a src directory of each entry of the root directory
+        os.makedirs(os.path.join(self.root_dir, 'shop/src/products/live'))
+        containers = registry.ContainerRegistry(
+            self.root_dir, get_container_dir=lambda name: os.path.join(self.root_dir, name, 'src')
+        )
+        self.assertEqual(['shop'], containers.get_containers())
+        self.assertEqual(['live'], containers.get_products('shop'))
+        self.assertIsNone(containers.get_products('sdox'))
+
+        # the snapshot of another layout is not reused
+        containers = registry.ContainerRegistry(self.root_dir)
+        self.assertEqual(['sdox', 'web'], containers.get_containers())
+        self.assertIsNone(containers.get_products('shop'))
@@ -0,0 +1,152 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from ape import server
+
+__all__ = ['ServerProtocolTestCase', 'WatchedFilesTestCase', 'ServerIntegrationTestCase']
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TASKS = '''
+from ape import tasks
+
+@tasks.register
+def hello(name):
+    print('hello %s' % name)
+'''
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'requires unix domain sockets')
+class ServerProtocolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.left, self.right = socket.socketpair()
+
+    def tearDown(self):
+        self.left.close()
+        self.right.close()
+
+    def test_roundtrip(self):
+        server.send_message(self.left, server.MSG_STDOUT, b'hello')
+        server.send_message(self.left, server.MSG_EXIT, b'0')
+        self.assertEqual((server.MSG_STDOUT, b'hello'), server.recv_message(self.right))
+        self.assertEqual((server.MSG_EXIT, b'0'), server.recv_message(self.right))
+
+    def test_closed_connection(self):
+        self.left.close()
+        self.assertRaises(EOFError, server.recv_message, self.right)
+
+    def test_socket_path_depends_on_selection(self):
+        path_a = server.get_socket_path(dict(PRODUCT_EQUATION_FILENAME='/a/product.equation'))
+        path_b = server.get_socket_path(dict(PRODUCT_EQUATION_FILENAME='/b/product.equation'))
+        self.assertNotEqual(path_a, path_b)
+        self.assertEqual(path_a, server.get_socket_path(dict(PRODUCT_EQUATION_FILENAME='/a/product.equation')))
+
+
+class WatchedFilesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'product.equation')
+        with open(self.path, 'w') as f:
+            f.write('feature\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_unchanged(self):
+        watched = server.WatchedFiles([self.path])
+        self.assertFalse(watched.is_stale())
+
+    def test_modified(self):
+        watched = server.WatchedFiles([self.path])
+        mtime = os.stat(self.path).st_mtime
+        os.utime(self.path, (time.time(), mtime + 10))
+        self.assertTrue(watched.is_stale())
+
+    def test_created(self):
+        new_path = os.path.join(self.tmp_dir, 'tasks.py')
+        watched = server.WatchedFiles([new_path])
+        open(new_path, 'w').close()
+        self.assertTrue(watched.is_stale())
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'requires unix domain sockets')
+class ServerIntegrationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tasks_path = os.path.join(self.tmp_dir, 'server_feature', 'tasks.py')
+        os.makedirs(os.path.dirname(self.tasks_path))
+        open(os.path.join(self.tmp_dir, 'server_feature', '__init__.py'), 'w').close()
+        with open(self.tasks_path, 'w') as f:
+            f.write(TASKS)
+        self.env = dict(os.environ)
+        for name in ('PRODUCT_EQUATION_FILENAME', 'APE_PREPEND_FEATURES', 'APE_LAZY_COMPOSITION'):
+            self.env.pop(name, None)
+        self.env.update(
+            PRODUCT_EQUATION='server_feature',
+            PYTHONPATH=os.pathsep.join([self.tmp_dir, PACKAGE_ROOT]),
+            APE_SERVER_DIR=self.tmp_dir,
+            APE_CACHE_DIR=os.path.join(self.tmp_dir, 'cache'),
+            APE_SERVER_IDLE_TIMEOUT='60',
+        )
+        self.socket_path = server.get_socket_path(self.env)
+
+    def tearDown(self):
+        self.run_client('--stop-server')
+        shutil.rmtree(self.tmp_dir)
+
+    def run_client(self, *args):
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'ape.client'] + list(args),
+            env=self.env, cwd=self.tmp_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        stdout, stderr = process.communicate()
+        return process.returncode, stdout.decode('utf-8'), stderr.decode('utf-8')
+
+    def test_execute_and_restart(self):
+        self.assertEqual((0, 'hello world\n', ''), self.run_client('hello', 'world'))
+        self.assertTrue(server.is_server_running(self.socket_path))
+        self.assertEqual((0, 'hello again\n', ''), self.run_client('hello', 'again'))
+
+        # the server restarts itself as the task module changed
+        mtime = os.stat(self.tasks_path).st_mtime
+        os.utime(self.tasks_path, (mtime + 10, mtime + 10))
+        self.assertEqual((0, 'hello restarted\n', ''), self.run_client('hello', 'restarted'))
+
+        exit_code, _, stderr = self.run_client('hello')
+        self.assertEqual(2, exit_code)
+        self.assertIn('usage: ape hello', stderr)
+
+    def test_connection_lost(self):
+        # a server that goes away right after accepting the connection and comes back, like one restarting itself
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+        listener.listen(1)
+
+        def accept_and_restart():
+            conn, _ = listener.accept()
+            listener.close()
+            os.unlink(self.socket_path)
+            conn.close()
+            with open(os.devnull, 'w') as devnull:
+                subprocess.Popen(
+                    [sys.executable, '-m', 'ape.server'], env=self.env, cwd=self.tmp_dir, stdout=devnull, stderr=devnull
+                )
+
+        thread = threading.Thread(target=accept_and_restart)
+        thread.start()
+        try:
+            self.assertEqual((0, 'hello world\n', ''), self.run_client('hello', 'world'))
+        finally:
+            thread.join()
+        self.assertTrue(server.is_server_running(self.socket_path))
@@ -0,0 +1,81 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from ape.container_mode import shellenv
+
+__all__ = ['ShellEnvironmentTestCase']
+
+HEADER = '#please execute the following in your shell:\n'
+
+
+class ShellEnvironmentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        for path in ('sdox/products/dev', 'sdox/_lib/venv/bin', 'web/products/live'):
+            os.makedirs(os.path.join(self.root_dir, path))
+        self.make_file('sdox/_lib/venv/bin/activate', '')
+        self.make_file('sdox/_lib/paths.json', json.dumps(['/site-packages', '/lib/a', '/global']))
+        self.make_file('web/initenv', '')
+        self.environ = dict(APE_GLOBAL_PYTHONPATH='/global', PYTHONPATH='/global:/previous')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def make_file(self, rel_path, content):
+        with open(os.path.join(self.root_dir, rel_path), 'w') as f:
+            f.write(content)
+
+    def get_environment(self, container_name, product_name, environ):
+        container_dir = os.path.join(self.root_dir, container_name)
+        product_dir = os.path.join(container_dir, 'products', product_name)
+        return shellenv.get_environment(container_name, product_name, container_dir, product_dir, environ)
+
+    def test_environment(self):
+        environment = self.get_environment('sdox', 'dev', self.environ)
+        sdox = os.path.join(self.root_dir, 'sdox')
+        self.assertEqual('sdox:dev', environment['variables']['APE_ENVIRONMENT'])
+        self.assertEqual('/lib/a' + shellenv.PATH_SEPARATOR + '/global', environment['variables']['APE_EXTRA_PYTHONPATH'])
+        self.assertEqual(
+            ['/global', os.path.join(sdox, 'products'), os.path.join(sdox, 'features'), '/lib/a'],
+            environment['pythonpath'].split(shellenv.PATH_SEPARATOR)
+        )
+        self.assertEqual(os.path.join(sdox, '_lib', 'venv'), environment['venv'])
+        self.assertIsNone(environment['initenv'])
+
+        environment = self.get_environment('web', 'live', self.environ)
+        self.assertIsNone(environment['venv'])
+        self.assertEqual('', environment['variables']['APE_EXTRA_PYTHONPATH'])
+        self.assertEqual(os.path.join(self.root_dir, 'web', 'initenv'), environment['initenv'])
+
+    def test_payload(self):
+        sdox = self.get_environment('sdox', 'dev', self.environ)
+        payload = shellenv.render_payload(sdox, HEADER, self.environ).splitlines()
+        self.assertEqual(HEADER.strip(), payload[0])
+        self.assertIn('export PRODUCT_NAME=dev', payload)
+        self.assertIn('export APE_CONTAINER_VENV=%s' % sdox['venv'], payload)
+        self.assertEqual(['set_prompt', 'cd %s' % sdox['product_dir']], payload[-2:])
+
+        # already in the virtualenv of the container
+        environ = dict(self.environ, APE_CONTAINER_VENV=sdox['venv'])
+        self.assertNotIn('deactivate', shellenv.render_payload(sdox, HEADER, environ).splitlines())
+
+        # back to the global virtualenv
+        web = self.get_environment('web', 'live', environ)
+        payload = shellenv.render_payload(web, HEADER, environ).splitlines()
+        self.assertIn('export APE_CONTAINER_VENV=""', payload)
+        self.assertIn('source %s' % web['initenv'], payload)
+
+        # switch leaves the working directory alone
+        payload = shellenv.render_payload(web, HEADER, environ, cd=False).splitlines()
+        self.assertEqual('set_prompt', payload[-1])
+
+    def test_payload_starts_no_process(self):
+        web = self.get_environment('web', 'live', self.environ)
+        payload = shellenv.render_payload(web, HEADER, self.environ)
+        self.assertNotIn('python', payload)
+        self.assertNotIn('ape ', payload)
@@ -0,0 +1,116 @@
+from __future__ import absolute_import, print_function, unicode_literals
+import sys
+import threading
+import types
+import unittest
+from ape import Tasks, _tasks, tasks
+from ape.exceptions import CyclicTaskDependency
+from ape.taskgraph import get_required_args, get_task_graph, run_task_graph
+from .base import SilencedTest
+
+__all__ = ['TaskGraphTestCase']
+
+DEPENDENCIES = dict(
+    deploy=['assets_a', 'assets_b'],
+    assets_a=['clean'],
+    assets_b=['clean'],
+)
+
+
+class TaskGraphTestCase(SilencedTest, unittest.TestCase):
+
+    def get_graph(self, targets, dependencies=DEPENDENCIES):
+        return get_task_graph(targets, lambda name: dependencies.get(name, []))
+
+    def test_register_dependencies(self):
+        registry = Tasks()
+        registry._tasks = types.ModuleType(str('graph_tasks'))
+
+        @registry.register(depends=['clean'])
+        def build():
+            pass
+
+        @registry.register
+        def clean():
+            pass
+
+        self.assertEqual(['clean'], registry.get_dependencies('build'))
+        self.assertEqual([], registry.get_dependencies('clean'))
+        self.assertTrue(hasattr(registry._tasks, 'build'))
+
+    def test_graph(self):
+        self.assertEqual(dict(
+            deploy=[],
+            assets_a=['deploy'],
+            assets_b=['deploy'],
+            clean=['assets_a', 'assets_b'],
+        ), dict((name, sorted(targets)) for name, targets in self.get_graph(['deploy']).items()))
+        self.assertEqual(dict(clean=['assets_a'], assets_a=[]), self.get_graph(['assets_a']))
+
+    def test_cycle(self):
+        self.assertRaises(CyclicTaskDependency, self.get_graph, ['a'], dict(a=['b'], b=['a']))
+
+    def test_run(self):
+        barrier = threading.Event()
+
+        def run_task(name):
+            print('running', name)
+            if name == 'assets_a':
+                # assets_b has to run concurrently, or this blocks
+                barrier.wait(5)
+            elif name == 'assets_b':
+                barrier.set()
+
+        results = run_task_graph(self.get_graph(['deploy']), run_task, jobs=2)
+        self.assertEqual('clean', results[0]['name'])
+        self.assertEqual('deploy', results[-1]['name'])
+        self.assertTrue(barrier.is_set())
+        for result in results:
+            self.assertEqual(0, result['exit_code'])
+            self.assertEqual('running %s\n' % result['name'], result['output'])
+
+    def test_failure_skips_dependents(self):
+
+        def run_task(name):
+            if name == 'assets_b':
+                print('broken', file=sys.stderr)
+                sys.exit(3)
+
+        results = dict((result['name'], result) for result in run_task_graph(self.get_graph(['deploy']), run_task))
+        self.assertEqual(0, results['assets_a']['exit_code'])
+        self.assertEqual(3, results['assets_b']['exit_code'])
+        self.assertEqual('broken\n', results['assets_b']['output'])
+        self.assertIsNone(results['deploy']['exit_code'])
+
+    def test_required_args(self):
+
+        def task(a, b, c=None):
+            pass
+
+        def varargs_task(*args):
+            pass
+
+        self.assertEqual(['a', 'b'], get_required_args(task))
+        self.assertEqual([], get_required_args(varargs_task))
+
+    def test_run_graph_rejects_required_args(self):
+        # explain_feature needs a feature name
+        with self.assertRaises(SystemExit) as cm:
+            _tasks.run_graph('selftest,explain_feature')
+        self.assertEqual(1, cm.exception.code)
+        self.assertIn('Task "explain_feature" requires the arguments featurename', sys.stdout.getvalue())
+
+    def test_run_graph_rejects_unknown_tasks(self):
+        def graph_helper():
+            pass
+
+        tasks.register_helper(graph_helper)
+        try:
+            for name in ('no_such_task', 'graph_helper'):
+                with self.assertRaises(SystemExit) as cm:
+                    _tasks.run_graph('selftest,%s' % name)
+                self.assertEqual(1, cm.exception.code)
+                self.assertIn('Task "%s" is not a registered task' % name, sys.stdout.getvalue())
+        finally:
+            delattr(tasks._tasks, 'graph_helper')
+            tasks._helper_names.discard('graph_helper')
@@ -0,0 +1,200 @@
+# coding: utf-8
+from __future__ import unicode_literals, print_function
+import textwrap
+import types
+import unittest
+from ape import taskindex
+
+__all__ = ['TaskScanTestCase', 'TaskIndexTestCase']
+
+
+def scan(source, **kws):
+    return taskindex.scan_source(textwrap.dedent(source), **kws)
+
+
+class TaskScanTestCase(unittest.TestCase):
+
+    def test_registered_tasks(self):
+        result = scan('''
+            from ape import tasks
+
+            @tasks.register
+            def build():
+                tasks.clean()
+
+            @tasks.register_helper
+            def clean():
+                pass
+
+            def not_a_task():
+                pass
+        ''')
+        self.assertEqual(set(['build', 'clean']), set(result['provides']))
+        self.assertEqual('task', result['provides']['build']['kind'])
+        self.assertEqual(['clean'], result['provides']['build']['uses'])
+        self.assertEqual('helper', result['provides']['clean']['kind'])
+        self.assertFalse(result['opaque'])
+
+    def test_transformations(self):
+        result = scan('''
+            import ape.tasks
+
+            introduce_conf = dict()
+
+            def refine_build(original):
+                def build():
+                    ape.tasks.deploy()
+                    original()
+                return build
+        ''')
+        self.assertEqual('introduction', result['provides']['conf']['kind'])
+        self.assertEqual('refinement', result['provides']['build']['kind'])
+        self.assertEqual(['deploy'], result['provides']['build']['uses'])
+
+    def test_module_level_uses(self):
+        result = scan('''
+            from ape import tasks as t
+            PATH = t.get_container_dir('x')
+        ''')
+        self.assertEqual(['get_container_dir'], result['uses'])
+
+    def test_helper_function_uses(self):
+        result = scan('''
+            from ape import tasks
+
+            def _collect():
+                tasks.collect()
+
+            @tasks.register
+            def deploy():
+                _collect()
+        ''')
+        self.assertEqual([], result['provides']['deploy']['uses'])
+        self.assertEqual(['collect'], result['uses'])
+
+    def test_dynamic_access(self):
+        result = scan('''
+            from ape import tasks
+
+            @tasks.register
+            def run_all():
+                for name, task in tasks.get_tasks():
+                    task()
+        ''')
+        self.assertEqual([taskindex.DYNAMIC], result['provides']['run_all']['uses'])
+
+    def test_opaque_registration(self):
+        result = scan('''
+            from ape import tasks
+
+            def make(name):
+                def task():
+                    pass
+                task.__name__ = name
+                tasks.register(task)
+
+            make('generated')
+        ''')
+        self.assertTrue(result['opaque'])
+
+    def test_plain_functions(self):
+        result = scan('''
+            def help(task):
+                from ape import tasks
+                tasks.help(taskname=task)
+
+            FEATURE_SELECTION = []
+        ''', plain_functions_are_tasks=True)
+        self.assertEqual(['help'], list(result['provides']))
+
+
+BASE = '''
+"""
+base tasks
+"""
+
+def help(task):
+    """print help on specific task"""
+'''
+
+FEATURE = '''
+from ape import tasks
+
+@tasks.register
+def build(target, mode='dev', jobs=2):
+    """build target"""
+
+@tasks.register_helper
+def get_target_dir(target):
+    pass
+
+@tasks.register
+def touch(*paths):
+    pass
+'''
+
+REFINEMENT = '''
+def refine_build(original):
+    def build(target, mode='prod', jobs=2):
+        original(target, mode=mode, jobs=jobs)
+    return build
+'''
+
+
+class TaskIndexTestCase(unittest.TestCase):
+
+    def get_index(self, *sources):
+        return taskindex.TaskIndex.from_scans(
+            scan(BASE, plain_functions_are_tasks=True),
+            [scan(source) for source in sources]
+        )
+
+    def test_signatures(self):
+        index = self.get_index(FEATURE)
+        self.assertTrue(index.exact)
+        self.assertEqual("build(target, mode='dev', jobs=2)", index.get_signature('build'))
+        self.assertEqual('touch(*paths)', index.get_signature('touch'))
+        self.assertEqual(['build', 'help', 'touch'], [name for name, info in index.get_tasks()])
+
+    def test_refinement(self):
+        index = self.get_index(FEATURE, REFINEMENT)
+        self.assertEqual("build(target, mode='prod', jobs=2)", index.get_signature('build'))
+        # the docstring of the original is kept
+        self.assertEqual('build target', index.tasks['build']['doc'])
+
+    def test_unknown_default(self):
+        index = self.get_index('''
+            from ape import tasks
+
+            @tasks.register
+            def deploy(host=DEFAULT_HOST):
+                pass
+        ''')
+        self.assertFalse(index.exact)
+
+    def test_matches(self):
+        module = types.ModuleType('composed')
+
+        def build(target, mode='dev', jobs=2):
+            """build target"""
+
+        def help(task):
+            """print help on specific task"""
+
+        module.build = build
+        module.help = help
+        composed = types.ModuleType('tasks')
+        composed._tasks = module
+        composed._helper_names = set()
+
+        index = self.get_index('''
+            from ape import tasks
+
+            @tasks.register
+            def build(target, mode='dev', jobs=2):
+                """build target"""
+        ''')
+        self.assertTrue(index.matches(composed))
+
+        module.extra = build
+        self.assertFalse(index.matches(composed))
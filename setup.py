@@ -2,7 +2,7 @@
 
 from setuptools import setup, find_packages
 
-DEPS = ['featuremonkey>=0.2.2', 'gitpython']
+DEPS = ['featuremonkey>=0.2.2']
 try:
     # bundled with python since v2.7
     import importlib